@@ -0,0 +1,301 @@
+"""
+Hierarchical crop -> disease cascade for Krishi Sahayak.
+
+Serves the models produced by scripts/train_crop_detector.py and the per-crop
+train_*_disease_detector.py scripts, chained the way notebooks/testing.ipynb does by
+hand: the crop detector picks the crop, then only that crop's disease model runs.
+Each image is decoded and preprocessed once and the same tensor feeds both stages.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+
+import numpy as np # type: ignore
+from PIL import Image # type: ignore
+
+from ml_utils import (
+    load_ml_model, load_labels, get_model_input_size, run_model_inference, run_model_outputs, build_prediction_result
+)
+from config import (
+    FAST_STARTUP, CASCADE_MODEL_DIRS, CASCADE_SHARED_BACKBONE, CROP_LABEL_PATHS, DISEASE_LABELS_PATTERN, CONFIDENCE_THRESHOLD
+)
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_MODEL_NAME = 'crop_detector_model'
+DISEASE_MODEL_PATTERN = '{crop}_disease_detector_model'
+# Single graph with one shared backbone and named crop/disease heads, written by
+# scripts/export_shared_backbone.py together with a .json description of its outputs
+SHARED_BACKBONE_MODEL_NAME = 'crop_disease_multihead'
+
+def find_model_file(model_dirs, name):
+    """First existing <dir>/<name>.h5/.keras/.tflite; .tflite is preferred in fast-startup mode."""
+    extensions = ('.tflite', '.h5', '.keras') if FAST_STARTUP else ('.h5', '.keras', '.tflite')
+    for model_dir in model_dirs:
+        for extension in extensions:
+            path = os.path.join(model_dir, name + extension)
+            if os.path.exists(path):
+                return path
+    return None
+
+def resize_batch(batch, size):
+    """Resample a preprocessed [0, 1] float batch to another (width, height) input size."""
+    resized = np.empty((len(batch), size[1], size[0], 3), dtype=batch.dtype)
+    for i, image_array in enumerate(batch):
+        image = Image.fromarray(np.clip(image_array * 255.0, 0, 255).astype(np.uint8))
+        np.multiply(np.asarray(image.resize(size), dtype=np.uint8), batch.dtype.type(1.0 / 255.0), out=resized[i], casting='unsafe')
+    return resized
+
+class CascadeStage:
+    """One model of the cascade with its labels and latency counters."""
+
+    def __init__(self, name, crop, model_path, labels):
+        model, is_tflite, is_multitask, version = load_ml_model([model_path])
+        if model is None:
+            raise RuntimeError(f"Could not load {name} model from {model_path}")
+        self.name = name
+        self.crop = crop
+        self.model = model
+        self.is_tflite = is_tflite
+        self.is_multitask = is_multitask
+        self.version = version
+        self.labels = labels
+        self.input_size = get_model_input_size(model, is_tflite)
+        self.stats_lock = threading.Lock()
+        self.calls = 0
+        self.images = 0
+        self.seconds = 0.0
+
+    def run(self, batch, on_run=None):
+        """Batched inference returning (class_predictions, reg_predictions).
+
+        ``on_run(stage, images, seconds)``, if given, is called with the inference time,
+        e.g. metrics.ServerMetrics.observe_cascade_stage.
+        """
+        return self._timed(on_run, run_model_inference, batch, self.is_multitask)
+
+    def run_outputs(self, batch, on_run=None):
+        """Batched inference returning every model output (see run_model_outputs)."""
+        return self._timed(on_run, run_model_outputs, batch)
+
+    def _timed(self, on_run, inference_fn, batch, *args):
+        # The batch is only resampled if this model's input size differs
+        if batch.shape[1:3] != (self.input_size[1], self.input_size[0]):
+            batch = resize_batch(batch, self.input_size)
+        start = time.perf_counter()
+        outputs = inference_fn(self.model, batch, self.is_tflite, *args)
+        elapsed = time.perf_counter() - start
+        with self.stats_lock:
+            self.calls += 1
+            self.images += len(batch)
+            self.seconds += elapsed
+        if on_run:
+            on_run(self, len(batch), elapsed)
+        return outputs
+
+    def get_stats(self):
+        with self.stats_lock:
+            return {
+                'stage': self.name,
+                'crop': self.crop,
+                'version': self.version,
+                'input_size': list(self.input_size),
+                'calls': self.calls,
+                'images': self.images,
+                'seconds_total': self.seconds,
+                'avg_ms_per_call': 1000 * self.seconds / self.calls if self.calls else 0.0
+            }
+
+class CascadeEngine:
+    """Crop detector followed by the matching per-crop disease model.
+
+    Exposes the same ``version``/``input_size``/``pool_size`` attributes the model
+    registry and batch scheduler use for a single model.
+    """
+
+    def __init__(self, detector, disease_stages):
+        self.detector = detector
+        self.disease_stages = disease_stages  # crop label -> CascadeStage, or None if missing
+        disease_labels = {crop: stage.labels if stage is not None else None for crop, stage in disease_stages.items()}
+        stage_versions = [detector.version] + [stage.version for stage in disease_stages.values() if stage is not None]
+        self.init_labels(detector.labels, disease_labels, 'cascade@' + hashlib.sha256('|'.join(stage_versions).encode()).hexdigest()[:12])
+        self.input_size = detector.input_size
+        self.is_tflite = detector.is_tflite
+        self.pool_size = getattr(detector.model, 'pool_size', 1)
+
+    def init_labels(self, crop_labels, disease_labels, version):
+        self.crop_labels = crop_labels
+        self.disease_labels = disease_labels  # crop label -> disease labels, or None if no disease model
+        self.version = version
+
+        # Flat label list (per-crop disease labels in crop order, which matches labels.txt)
+        # so prediction_class keeps meaning the same thing as with the flat model
+        self.labels = []
+        self.label_offsets = {}
+        for crop in crop_labels:
+            self.label_offsets[crop] = len(self.labels)
+            self.labels.extend(disease_labels.get(crop) or [])
+
+    def get_stages(self):
+        return [self.detector] + [stage for stage in self.disease_stages.values() if stage is not None]
+
+    def predict_batch(self, image_arrays, on_stage_run=None):
+        """Run the cascade over preprocessed (1, H, W, 3) images and return one result per image.
+
+        ``on_stage_run`` is passed to every stage run (see CascadeStage.run).
+        """
+        batch = np.concatenate(image_arrays, axis=0)
+        crop_predictions, _ = self.detector.run(batch, on_stage_run)
+
+        def run_disease_model(crop, indexes):
+            # One batched call per detected crop, on rows of the already preprocessed tensor
+            stage = self.disease_stages[crop]
+            class_predictions, reg_predictions = stage.run(batch[indexes], on_stage_run)
+            return class_predictions, reg_predictions, stage.is_multitask
+
+        return self.build_results(crop_predictions, run_disease_model)
+
+    def build_results(self, crop_predictions, run_disease_model):
+        """Turn crop scores plus per-crop disease scores into one response dict per image.
+
+        ``run_disease_model(crop, indexes)`` returns (class_predictions, reg_predictions,
+        is_multitask) for the given rows of the batch.
+        """
+        results = [None] * len(crop_predictions)
+        by_crop = {}
+        for index, crop_scores in enumerate(crop_predictions):
+            crop_idx = int(np.argmax(crop_scores))
+            crop_confidence = float(crop_scores[crop_idx])
+            crop = self.crop_labels[crop_idx] if crop_idx < len(self.crop_labels) else None
+            if crop is None or crop_confidence < CONFIDENCE_THRESHOLD or not self.disease_labels.get(crop):
+                # Uncertain crop or no disease model for it: no disease prediction
+                results[index] = {
+                    'prediction_class': -1,
+                    'crop_type': 'Unknown',
+                    'confidence': crop_confidence,
+                    'is_healthy': False,
+                    'all_predictions': [],
+                    'crop': crop if crop_confidence >= CONFIDENCE_THRESHOLD else None,
+                    'crop_confidence': crop_confidence,
+                    'crop_predictions': crop_scores.tolist(),
+                    'model_type': 'cascade'
+                }
+            else:
+                by_crop.setdefault(crop, []).append(index)
+
+        for crop, indexes in by_crop.items():
+            class_predictions, reg_predictions, is_multitask = run_disease_model(crop, indexes)
+            for row, index in enumerate(indexes):
+                reg_score = reg_predictions[row][0] if reg_predictions is not None else None
+                result = build_prediction_result(class_predictions[row], reg_score, self.disease_labels[crop], is_multitask)
+                if result['prediction_class'] >= 0:
+                    result['prediction_class'] += self.label_offsets[crop]
+                crop_scores = crop_predictions[index]
+                result['crop'] = crop
+                result['crop_confidence'] = float(np.max(crop_scores))
+                result['crop_predictions'] = crop_scores.tolist()
+                result['model_type'] = 'cascade'
+                results[index] = result
+        return results
+
+    def get_stats(self):
+        return {
+            'version': self.version,
+            'stages': [stage.get_stats() for stage in self.get_stages()],
+            'missing_disease_models': [crop for crop, labels in self.disease_labels.items() if not labels]
+        }
+
+def head_output_name(crop):
+    """Output name of a crop's disease head in the shared-backbone model."""
+    return f"disease_{crop.lower()}"
+
+class SharedBackboneEngine(CascadeEngine):
+    """Cascade served from one multi-head graph: a single backbone pass yields the
+    crop scores and every crop's disease scores, so no second model call is needed."""
+
+    def __init__(self, stage, description):
+        self.stage = stage
+        self.output_index = description['outputs']  # output name -> TFLite output index
+        self.init_labels(description['crop_labels'], description['disease_labels'], f"shared@{stage.version.split('@')[-1]}")
+        self.input_size = stage.input_size
+        self.is_tflite = stage.is_tflite
+        self.pool_size = getattr(stage.model, 'pool_size', 1)
+
+    def get_stages(self):
+        return [self.stage]
+
+    def predict_batch(self, image_arrays, on_stage_run=None):
+        batch = np.concatenate(image_arrays, axis=0)
+        outputs = self.stage.run_outputs(batch, on_stage_run)
+        if self.is_tflite:
+            outputs = {name: outputs[index] for name, index in self.output_index.items()}
+        return self.build_results(
+            np.asarray(outputs['crop']),
+            lambda crop, indexes: (np.asarray(outputs[head_output_name(crop)])[indexes], None, False)
+        )
+
+def load_shared_backbone_model(model_dirs):
+    """Load the exported multi-head model if one exists; returns a SharedBackboneEngine or None."""
+    model_path = find_model_file(model_dirs, SHARED_BACKBONE_MODEL_NAME)
+    if model_path is None:
+        return None
+    description_path = os.path.splitext(model_path)[0] + '.json'
+    with open(description_path, 'r', encoding='utf-8') as f:
+        description = json.load(f)
+    stage = CascadeStage('shared_backbone', None, model_path, description['crop_labels'])
+    engine = SharedBackboneEngine(stage, description)
+    logger.info(f"✅ Shared-backbone cascade loaded from {model_path} ({engine.version})")
+    return engine
+
+def load_separate_models(model_dirs):
+    """Load the crop detector and every per-crop disease model as a CascadeEngine (None on failure)."""
+    crop_labels = load_labels(CROP_LABEL_PATHS)
+    detector_path = find_model_file(model_dirs, DETECTOR_MODEL_NAME)
+    if detector_path is None or not crop_labels:
+        logger.error(f"❌ No crop detector model or crop labels found in {model_dirs}")
+        return None
+
+    try:
+        detector = CascadeStage('crop_detector', None, detector_path, crop_labels)
+        disease_stages = {}
+        for crop in crop_labels:
+            disease_path = find_model_file(model_dirs, DISEASE_MODEL_PATTERN.format(crop=crop.lower()))
+            disease_labels = load_labels([DISEASE_LABELS_PATTERN.format(crop=crop.lower())])
+            if disease_path is None or not disease_labels:
+                logger.warning(f"⚠️ No disease model for {crop}; the cascade will only report the crop")
+                disease_stages[crop] = None
+                continue
+            disease_stages[crop] = CascadeStage('disease', crop, disease_path, disease_labels)
+    except Exception as e:
+        logger.error(f"❌ Failed to load cascade models: {e}")
+        return None
+
+    engine = CascadeEngine(detector, disease_stages)
+    loaded = [crop for crop, stage in disease_stages.items() if stage is not None]
+    logger.info(f"✅ Cascade loaded: crop detector {detector.version} + disease models for {loaded} ({engine.version})")
+    return engine
+
+def load_cascade_model(model_paths=None, shared_backbone=CASCADE_SHARED_BACKBONE):
+    """Load the cascade: with ``shared_backbone``, the exported shared-backbone model if
+    present, otherwise the crop detector and every per-crop disease model.
+
+    ``model_paths`` optionally lists directories to search instead of CASCADE_MODEL_DIRS.
+    Returns (engine, is_tflite, is_multitask, version) like load_ml_model, with a None
+    engine if the crop detector cannot be loaded.
+    """
+    model_dirs = model_paths or CASCADE_MODEL_DIRS
+    engine = None
+    if shared_backbone:
+        try:
+            engine = load_shared_backbone_model(model_dirs)
+        except Exception as e:
+            logger.error(f"❌ Failed to load shared-backbone model, falling back to separate models: {e}")
+    if engine is None:
+        engine = load_separate_models(model_dirs)
+    if engine is None:
+        return None, False, False, None
+    return engine, engine.is_tflite, False, engine.version
@@ -3,10 +3,37 @@ import os
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
+# Per-label enrichment (Gemini analysis + translation) cache
+ENRICHMENT_TTL = int(os.getenv('ENRICHMENT_TTL', '86400'))  # serve without refreshing for 1 day
+ENRICHMENT_STALE_TTL = int(os.getenv('ENRICHMENT_STALE_TTL', '604800'))  # serve stale while refreshing for up to 7 days
+ENRICHMENT_FAILURE_BACKOFF = float(os.getenv('ENRICHMENT_FAILURE_BACKOFF', '60'))  # seconds before retrying a failed load
+ENRICHMENT_LANGUAGES = [lang.strip() for lang in os.getenv('ENRICHMENT_LANGUAGES', 'en,hi').split(',') if lang.strip()]
+# Gemini analysis is an optional extra on top of the local knowledge base (enabled when an API key is set)
+GEMINI_ENRICHMENT_ENABLED = os.getenv('GEMINI_ENRICHMENT_ENABLED', 'true' if GEMINI_API_KEY else 'false').lower() == 'true'
+
+# Translation of enrichment text (development server main.py)
+TRANSLATION_MODEL = os.getenv('TRANSLATION_MODEL', 'Helsinki-NLP/opus-mt-en-hi')
+TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', '10000'))  # cached sentences
+TRANSLATION_BATCH_SIZE = int(os.getenv('TRANSLATION_BATCH_SIZE', '16'))  # sentences per model call
+TRANSLATION_WARMUP = os.getenv('TRANSLATION_WARMUP', 'true').lower() == 'true'  # load the model in the background at startup
+
 # Rate limiting configuration
 RATE_LIMIT_REQUESTS = int(os.getenv('RATE_LIMIT_REQUESTS', '100'))  # requests per window
 RATE_LIMIT_WINDOW = int(os.getenv('RATE_LIMIT_WINDOW', '3600'))  # 1 hour in seconds
+RATE_LIMIT_EVICT_INTERVAL = float(os.getenv('RATE_LIMIT_EVICT_INTERVAL', '60'))  # seconds between sweeps of idle users
+RATE_LIMIT_SHARDS = int(os.getenv('RATE_LIMIT_SHARDS', '32'))  # independently locked parts of the local limiter
+# Where limiter state lives (rate_limit.py): 'local' (per process), 'shared_memory' (all
+# workers on a host) or 'redis' (all pods)
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'local').lower()
+RATE_LIMIT_SHM_PATH = os.getenv('RATE_LIMIT_SHM_PATH', '/dev/shm/krishi_rate_limit' if os.path.isdir('/dev/shm') else '/tmp/krishi_rate_limit')
+RATE_LIMIT_SHM_SLOTS = int(os.getenv('RATE_LIMIT_SHM_SLOTS', '1048576'))  # users tracked per host, 16 bytes each
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+RATE_LIMIT_REDIS_PREFIX = os.getenv('RATE_LIMIT_REDIS_PREFIX', 'krishi:ratelimit:')
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv('RATE_LIMIT_REDIS_TIMEOUT', '0.05'))  # seconds per pipeline
+RATE_LIMIT_FAIL_OPEN = os.getenv('RATE_LIMIT_FAIL_OPEN', 'true').lower() == 'true'  # allow requests if the store is down
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', '10485760'))  # 10MB
+# Content types accepted as a raw image request body on /analyze_crop (no base64/JSON wrapping)
+RAW_UPLOAD_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'application/octet-stream')
 
 # Model and Label Paths
 MODEL_PATHS = [
@@ -19,18 +46,98 @@ MODEL_PATHS = [
     "model/mobilenetv2_model.h5"
 ]
 
+# Fast startup: prefer TFLite models, loaded through an interpreter-only runtime
+# (tflite_runtime / ai_edge_litert) so the full TensorFlow package is never imported.
+FAST_STARTUP = os.getenv('FAST_STARTUP', 'false').lower() == 'true'
+TFLITE_MODEL_PATHS = [
+    "saved_models/multitask_model.tflite",
+    "saved_models/best_model.tflite",
+    "model/crop_health_model.tflite",
+    "notebooks/model/mobilenetv2_quant.tflite"
+]
+
+# Model registry: versions kept loaded side by side (active + previous for instant rollback)
+MODEL_REGISTRY_MAX_VERSIONS = int(os.getenv('MODEL_REGISTRY_MAX_VERSIONS', '2'))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # enables the /admin endpoints; unset disables them
+
+# Request tracing: requests carrying this header get a per-stage timing breakdown
+# (Server-Timing header and a 'trace' field); empty disables it
+REQUEST_TRACE_HEADER = os.getenv('REQUEST_TRACE_HEADER', 'X-Debug-Trace')
+PROFILER_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILER_SAMPLE_INTERVAL_MS', '5'))  # /admin/profile sampling interval
+PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', '60'))  # longest /admin/profile run
+
+# Inference mode: 'flat' serves one model over all 17 labels; 'cascade' runs the crop
+# detector (scripts/train_crop_detector.py) and then the matching per-crop disease model
+INFERENCE_MODE = os.getenv('INFERENCE_MODE', 'flat').lower()
+CASCADE_MODEL_DIRS = ["saved_models", "notebooks/saved_models"]  # searched for *_detector_model.{tflite,h5}
+# Serve crop_disease_multihead (scripts/export_shared_backbone.py) instead of the separate
+# cascade models; off by default since the exact-prefix export can be slower than the cascade
+CASCADE_SHARED_BACKBONE = os.getenv('CASCADE_SHARED_BACKBONE', 'false').lower() == 'true'
+CROP_LABEL_PATHS = ["model/crop_type_labels.txt"]
+DISEASE_LABELS_PATTERN = "model/{crop}_disease_labels.txt"
+
 LABEL_PATHS = ["labels.txt", "notebooks/model/labels.txt", "model/labels.txt"]
 
+# Bilingual disease guidance (disease_kb table built by notebooks/disease.ipynb)
+KNOWLEDGE_BASE_PATHS = ["crop_diseases_rag.db", "notebooks/crop_diseases_rag.db", "model/crop_diseases_rag.db"]
+
 # System Health Thresholds
 MEMORY_HEALTH_THRESHOLD = 90
 CPU_HEALTH_THRESHOLD = int(os.getenv('CPU_HEALTH_THRESHOLD', '95')) # Unified threshold, can be overridden by environment variable.
+SYSTEM_MONITOR_INTERVAL = float(os.getenv('SYSTEM_MONITOR_INTERVAL', '1.0'))  # seconds between background resource samples
 
 # Image Preprocessing
 IMAGE_SIZE = (224, 224) # Standard for MobileNetV2
+PREPROCESS_DRAFT_MODE = os.getenv('PREPROCESS_DRAFT_MODE', 'true').lower() == 'true'  # reduced-resolution JPEG decode
 
 # Prediction Confidence Threshold
 CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD', '0.7')) # Default to 70%
 
+# Dynamic micro-batching for /analyze_crop
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '8'))  # max requests per batched inference
+BATCH_WINDOW_MS = float(os.getenv('BATCH_WINDOW_MS', '5'))  # how long to wait for more requests to join a batch
+BATCH_RESULT_TIMEOUT = float(os.getenv('BATCH_RESULT_TIMEOUT', '30'))  # seconds a request waits for its batch
+# Admission control for the inference queue of each worker: a request is rejected with 503
+# when the queue is full or its estimated wait (queue depth / measured service rate) is too long
+QUEUE_MAX_SIZE = int(os.getenv('QUEUE_MAX_SIZE', '32'))  # 0 = unbounded
+QUEUE_MAX_WAIT_SECONDS = float(os.getenv('QUEUE_MAX_WAIT_SECONDS', '5'))  # 0 = no wait limit
+# Priority lanes of the inference queue and their weighted fair queueing shares: while
+# both lanes have requests waiting, 'interactive' gets 8 batch slots for every 1 of
+# 'background'; an idle lane's share goes to the others. The first lane is the default.
+QUEUE_LANE_WEIGHTS = {
+    lane.strip(): float(weight)
+    for lane, weight in (entry.split(':') for entry in os.getenv('QUEUE_LANE_WEIGHTS', 'interactive:8,background:1').split(',') if entry.strip())
+}
+# Requests of a lane a worker handles at once, from admission to result (decode and
+# preprocessing run on the request thread, outside the fair queue), enforced only while
+# another lane has requests in flight; lanes not listed are unlimited
+QUEUE_LANE_MAX_IN_FLIGHT = {
+    lane.strip(): int(limit)
+    for lane, limit in (entry.split(':') for entry in os.getenv('QUEUE_LANE_MAX_IN_FLIGHT', 'background:2').split(',') if entry.strip())
+}
+PRIORITY_HEADER = os.getenv('PRIORITY_HEADER', 'X-Priority')  # request header naming the lane
+
+# TFLite interpreter pool (one interpreter per concurrent inference)
+INTERPRETER_POOL_SIZE = int(os.getenv('INTERPRETER_POOL_SIZE', '2'))
+INTERPRETER_NUM_THREADS = int(os.getenv('INTERPRETER_NUM_THREADS', '2'))  # num_threads per interpreter
+# Batch sizes each pooled interpreter is allocated for; a batch is zero-padded to the next
+# one, so at most this many tensor arenas per interpreter. BATCH_MAX_SIZE is always included.
+INTERPRETER_BATCH_SIZES = sorted(
+    {int(size) for size in os.getenv('INTERPRETER_BATCH_SIZES', '1,4').split(',') if size.strip() and 0 < int(size) < BATCH_MAX_SIZE}
+    | {max(1, BATCH_MAX_SIZE)}
+)
+
+# Prediction cache keyed on image content hash + model version
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '1024'))  # in-memory LRU entries, 0 disables
+PREDICTION_CACHE_DIR = os.getenv('PREDICTION_CACHE_DIR')  # optional on-disk tier shared across worker restarts
+PREDICTION_CACHE_DISK_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_DISK_MAX_ENTRIES', '100000'))
+
+# Logging: records are formatted and written by a background thread (structured_logging)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # 'text' or 'json' (one object per line)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))  # fraction of requests logging verbose diagnostics
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # records buffered before new ones are dropped
+
 # Server Configuration
 FLASK_PORT = int(os.getenv('PORT', 5000)) # Default to 5000 for production, 5001 for development
 FLASK_HOST = '0.0.0.0'
\ No newline at end of file
@@ -6,12 +6,15 @@ This script takes the existing best_model.h5 and adds a regression head
 
 import os
 import sys
+import argparse
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.models import Model
-from tensorflow.keras.layers import Dense, Lambda
+from tensorflow.keras.layers import Dense, Rescaling
 from tensorflow.keras.regularizers import l2
 
+from tflite_conversion import DEFAULT_CONVERSION_MODE, convert_keras_model, add_conversion_arguments, conversion_options, describe_ops
+
 def convert_to_multitask():
     """Convert existing single-task model to multitask model"""
     print("🔄 Converting existing model to multitask...")
@@ -61,11 +64,12 @@ def convert_to_multitask():
         reg_output_raw = Dense(
             1,
             activation='sigmoid',
+            name='reg_dense',
             kernel_regularizer=l2(0.001)
         )(features)
         
-        # Scale to 0-100 range
-        reg_output = Lambda(lambda t: t * 100, name='reg_output')(reg_output_raw)
+        # Scale to 0-100 range (a builtin layer, so TFLite needs no Flex ops)
+        reg_output = Rescaling(100.0, name='reg_output')(reg_output_raw)
         
         # Create the multitask model
         multitask_model = Model(
@@ -91,7 +95,7 @@ def convert_to_multitask():
         
         # Initialize regression head with small random weights
         print("🔄 Initializing regression head...")
-        reg_layer = multitask_model.get_layer('reg_output')
+        reg_layer = multitask_model.get_layer('reg_dense')
         reg_layer.set_weights([
             np.random.normal(0, 0.01, reg_layer.get_weights()[0].shape),
             np.random.normal(0, 0.01, reg_layer.get_weights()[1].shape)
@@ -129,6 +133,7 @@ def convert_to_multitask():
         print(f"✅ Multitask model saved successfully!")
         print(f"📁 Path: {multitask_path}")
         print(f"📊 Size: {file_size:.2f} MB")
+        print(f"🧮 Ops: {describe_ops(tflite_model)}")
         
         # Test the model
         print("🧪 Testing multitask model...")
@@ -146,7 +151,7 @@ def convert_to_multitask():
         print(f"❌ Error during conversion: {e}")
         return False
 
-def convert_to_tflite():
+def convert_to_tflite(**conversion_kwargs):
     """Convert the multitask model to TFLite format"""
     try:
         print("🔄 Converting multitask model to TFLite...")
@@ -160,20 +165,9 @@ def convert_to_tflite():
         print(f"📥 Loading multitask model from {model_path}...")
         model = tf.keras.models.load_model(model_path)
         
-        # Create TFLite converter
-        converter = tf.lite.TFLiteConverter.from_keras_model(model)
-        
-        # Add optimizations for mobile
-        converter.optimizations = [tf.lite.Optimize.DEFAULT]
-        converter.target_spec.supported_types = [tf.float16]
-        converter.target_spec.supported_ops = [
-            tf.lite.OpsSet.TFLITE_BUILTINS,
-            tf.lite.OpsSet.SELECT_TF_OPS
-        ]
-        
         # Convert
-        print("🔄 Converting to TFLite...")
-        tflite_model = converter.convert()
+        print(f"🔄 Converting to TFLite ({conversion_kwargs.get('mode', DEFAULT_CONVERSION_MODE)})...")
+        tflite_model = convert_keras_model(model, **conversion_kwargs)
         
         # Save TFLite model
         tflite_path = 'saved_models/multitask_model.tflite'
@@ -193,6 +187,8 @@ def convert_to_tflite():
         return False
 
 if __name__ == "__main__":
+    args = add_conversion_arguments(argparse.ArgumentParser(description=__doc__)).parse_args()
+
     print("🌾 Krishi Sahayak Model Conversion to Multitask")
     print("=" * 60)
     
@@ -200,7 +196,7 @@ if __name__ == "__main__":
         # Convert to multitask
         if convert_to_multitask():
             print("\n🎯 Converting to TFLite...")
-            if convert_to_tflite():
+            if convert_to_tflite(**conversion_options(args)):
                 print("\n🎉 Multitask model conversion completed successfully!")
                 print("You can now use the model in your server and Flutter app.")
             else:
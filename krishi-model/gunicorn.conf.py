@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration for the production ML server.
+
+Gunicorn reads ./gunicorn.conf.py automatically, so these hooks apply both to the
+Dockerfile CMD and to `python main_production.py`.
+"""
+
+import os
+import shutil
+
+# Workers write their Prometheus metrics here so /metrics reports the sum over all of
+# them (see metrics.py). Set before any worker imports prometheus_client.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/krishi_ml_metrics')
+
+def on_starting(server):
+    """Start with an empty metrics directory; files left by a previous run would be summed in."""
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+def post_worker_init(worker):
+    """Load the model in each worker once main_production:app has been imported."""
+    import main_production
+    if not main_production.model_loaded:
+        main_production.initialize_production_model_and_labels()
+
+def child_exit(server, worker):
+    """Drop the gauge files of a dead worker; its counters and histograms are kept."""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,80 @@
+"""
+Disease knowledge base for Krishi Sahayak.
+
+Loads the bilingual ``disease_kb`` table built by notebooks/disease.ipynb
+(crop_diseases_rag.db) into memory once at startup, so each predicted label can be
+joined to its why/precautions/remedies guidance in English and Hindi without any
+network call on the request path.
+"""
+
+import os
+import re
+import sqlite3
+import logging
+
+from config import KNOWLEDGE_BASE_PATHS
+
+logger = logging.getLogger(__name__)
+
+GUIDANCE_FIELDS = ('why', 'precautions', 'remedies')
+GUIDANCE_HEADINGS = {
+    'en': {'why': 'Why it happens', 'precautions': 'Precautions', 'remedies': 'Remedies'},
+    'hi': {'why': 'कारण', 'precautions': 'सावधानियाँ', 'remedies': 'उपचार'},
+}
+
+def normalize_label(label):
+    """Model labels and KB labels differ in separators (e.g. 'Sugarcane_Red Rot' vs 'Sugarcane_Red_Rot')."""
+    return re.sub(r'[\s_]+', '_', label.strip()).lower()
+
+class DiseaseKnowledgeBase:
+    """In-memory view of disease_kb, keyed by normalized label"""
+
+    def __init__(self, db_paths=KNOWLEDGE_BASE_PATHS):
+        self.db_paths = db_paths
+        self.entries = {}
+        self.source = None
+
+    def load(self):
+        """Load every disease_kb row from the first database found. Returns the number of entries."""
+        for path in self.db_paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+                    rows = conn.execute(
+                        'SELECT label, crop, disease, why_en, precautions_en, remedies_en, '
+                        'why_hi, precautions_hi, remedies_hi FROM disease_kb'
+                    ).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Error loading knowledge base from {path}: {e}")
+                continue
+
+            self.entries = {}
+            for label, crop, disease, *texts in rows:
+                self.entries[normalize_label(label)] = {
+                    'label': label,
+                    'crop': crop,
+                    'disease': disease,
+                    'en': dict(zip(GUIDANCE_FIELDS, texts[:3])),
+                    'hi': dict(zip(GUIDANCE_FIELDS, texts[3:])),
+                }
+            self.source = path
+            logger.info(f"✅ Loaded {len(self.entries)} knowledge base entries from {path}")
+            return len(self.entries)
+
+        logger.warning("No disease knowledge base found. Guidance will not be available.")
+        return 0
+
+    def get_guidance(self, label):
+        """Guidance for a predicted label, or None for 'Unknown' and labels missing from the KB"""
+        if not label:
+            return None
+        return self.entries.get(normalize_label(label))
+
+    def format_guidance(self, guidance, language='en'):
+        """Render guidance as plain text in the given language ('en' or 'hi')"""
+        if guidance is None or language not in GUIDANCE_HEADINGS:
+            return None
+        headings = GUIDANCE_HEADINGS[language]
+        return "\n\n".join(f"{headings[field]}: {guidance[language][field]}"
+                           for field in GUIDANCE_FIELDS if guidance[language].get(field))
@@ -1,29 +1,24 @@
 import os
+import math
 import time
 import logging
-from flask import Flask, request, jsonify # type: ignore
+from flask import Flask, request, jsonify, g # type: ignore
 from flask_cors import CORS # type: ignore
 from werkzeug.exceptions import RequestEntityTooLarge # type: ignore
 from PIL import Image # type: ignore
-from transformers import pipeline # type: ignore
 
 # Import utilities from ml_utils and config
 import ml_utils
-from ml_utils import load_labels, preprocess_image, analyze_crop_prediction, load_ml_model, RateLimiter, SystemMonitor, MLQueueManager, get_gemini_crop_analysis
-from config import RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, FLASK_PORT, FLASK_HOST, MEMORY_HEALTH_THRESHOLD, CPU_HEALTH_THRESHOLD, MAX_FILE_SIZE
+import tracing
+import structured_logging
+from knowledge_base import DiseaseKnowledgeBase
+from translation_service import TranslationService
+from rate_limit import create_rate_limiter
+from ml_utils import load_labels, preprocess_image, analyze_crop_prediction, log_prediction, load_ml_model, SystemMonitor, MLQueueManager, EnrichmentCache, fetch_gemini_crop_analysis
+from config import RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, FLASK_PORT, FLASK_HOST, MEMORY_HEALTH_THRESHOLD, CPU_HEALTH_THRESHOLD, MAX_FILE_SIZE, ENRICHMENT_LANGUAGES, GEMINI_ENRICHMENT_ENABLED, TRANSLATION_WARMUP, REQUEST_TRACE_HEADER
 
-# Import existing training utilities
-from utils.dataloader import get_generators
-from utils.train import train_model
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: formatting and output run on a background thread (see structured_logging)
+structured_logging.configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
@@ -39,17 +34,43 @@ def handle_file_too_large(e):
         'status': 'error'
     }), 413
 
+@app.before_request
+def start_request_trace():
+    g.request_started = time.perf_counter()
+    traced = bool(REQUEST_TRACE_HEADER and request.headers.get(REQUEST_TRACE_HEADER))
+    if traced:
+        tracing.start_trace()
+    structured_logging.start_request(force_verbose=traced)
+
+@app.after_request
+def add_server_timing(response):
+    trace = tracing.current_trace()
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing()
+    # The one summary record per request; endpoints add their fields to g.log_fields
+    structured_logging.log_event(
+        logger, 'request', method=request.method, path=request.path, status=response.status_code,
+        duration_ms=round((time.perf_counter() - g.get('request_started', time.perf_counter())) * 1000, 1),
+        **g.get('log_fields', {}))
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    tracing.end_trace()
+    structured_logging.end_request()
+
 # Initialize components
-rate_limiter = RateLimiter()
+rate_limiter = create_rate_limiter()  # RATE_LIMIT_BACKEND
 system_monitor = SystemMonitor()
 ml_queue_manager = MLQueueManager()
+knowledge_base = DiseaseKnowledgeBase()
 
 # Global variable to store the trained model and labels
 model = None
 labels = []
 
-# Initialize the translation pipeline globally
-translator_pipeline = pipeline("translation", model="Helsinki-NLP/opus-mt-en-hi")
+# Translation model is loaded lazily (or by a background warm-up), not at import time
+translation_service = TranslationService()
 
 # Record start time
 start_time = time.time()
@@ -60,31 +81,47 @@ def translate_text(text: str, target_language: str = 'hi') -> str:
     Translates the input English text to the target language (default: Hindi).
     """
     if target_language == 'hi':
-        result = translator_pipeline(text)
-        hindi_translation = result[0]['translation_text']
-        return hindi_translation
+        return translation_service.translate(text)
     else:
         # For now, only Hindi is supported. Can be extended later.
         logger.warning(f"Translation to {target_language} is not supported yet. Returning original text.")
         return text
 
+# --- Enrichment Cache ---
+def load_enrichment(label: str, language: str) -> str:
+    """
+    Loader for the enrichment cache: Gemini analysis in English, translated for other languages.
+    """
+    english = enrichment_cache.peek(label, 'en')
+    if language == 'en' or english is None:
+        english = fetch_gemini_crop_analysis(label)
+    if language == 'en':
+        return english
+    return translate_text(english, language)
+
+# Gemini analysis and its translation only depend on the label, so they are computed
+# per (label, language) in the background instead of on every request
+enrichment_cache = EnrichmentCache(load_enrichment)
+
 @app.route('/analyze_crop', methods=['POST'])
-async def analyze_crop_endpoint():
+def analyze_crop_endpoint():
     """Endpoint to analyze crop health from image"""
     global model, labels
     try:
-        logger.info("=== NEW CROP ANALYSIS REQUEST ===")
         user_id = request.headers.get('X-User-ID', request.remote_addr)
+        g.log_fields = {'user_id': user_id}
         
-        if not rate_limiter.is_allowed(user_id):
-            remaining = rate_limiter.get_remaining_requests(user_id)
+        rate_limit = rate_limiter.check(user_id)
+        if not rate_limit.allowed:
+            remaining = rate_limit.remaining
+            retry_after = math.ceil(rate_limit.retry_after)
             logger.warning(f"Rate limit exceeded for user {user_id}")
             return jsonify({
                 'error': 'Rate limit exceeded',
                 'message': f'Maximum {RATE_LIMIT_REQUESTS} requests per minute allowed',
                 'remaining_requests': remaining,
-                'retry_after': RATE_LIMIT_WINDOW
-            }), 429
+                'retry_after': retry_after
+            }), 429, {'Retry-After': str(retry_after)}
         
         if not system_monitor.is_system_healthy():
             logger.warning("System resources unhealthy, rejecting request")
@@ -101,7 +138,8 @@ async def analyze_crop_endpoint():
             image_file = request.files['image']
             if image_file.filename != '':
                 try:
-                    image_data_input = Image.open(image_file.stream)
+                    with tracing.span('open'):
+                        image_data_input = Image.open(image_file.stream)
                 except Exception as e:
                     logger.error(f"File upload processing error: {e}")
                     return jsonify({
@@ -132,26 +170,40 @@ async def analyze_crop_endpoint():
             }), 500
         
         with ml_queue_manager.processing_lock:
-            model_or_interpreter, is_tflite_model = model # Unpack the model and its type
-            result = analyze_crop_prediction(model_or_interpreter, image_data, labels, is_tflite_model)
-            logger.info("=== CROP ANALYSIS COMPLETED ===")
+            model_or_interpreter, is_tflite_model, is_multitask_model, _ = model # Unpack the model and its type
+            result = analyze_crop_prediction(model_or_interpreter, image_data, labels, is_tflite_model, is_multitask_model)
+            g.log_fields.update(label=result['crop_type'], confidence=round(result['confidence'], 4))
+            log_prediction(result)
             
-            # Fetch Gemini analysis
+            # Bilingual guidance comes from the local knowledge base; the text fields keep
+            # the names the Flutter and web clients already read
             disease_label = result.get('crop_type', 'Unknown')
-            gemini_analysis_english = await get_gemini_crop_analysis(disease_label)
-            
-            # Translate Gemini analysis to Hindi
-            gemini_analysis_hindi = translate_text(gemini_analysis_english, 'hi')
+            with tracing.span('enrichment'):
+                guidance = knowledge_base.get_guidance(disease_label)
+                result['guidance'] = guidance
+                result['gemini_analysis_english'] = knowledge_base.format_guidance(guidance, 'en')
+                result['gemini_analysis_hindi'] = knowledge_base.format_guidance(guidance, 'hi')
+                result['analysis_source'] = 'knowledge_base' if guidance else None
             
-            result['gemini_analysis_english'] = gemini_analysis_english
-            result['gemini_analysis_hindi'] = gemini_analysis_hindi
+            # Gemini is an optional extra: use it only when already cached, never wait for it
+            if GEMINI_ENRICHMENT_ENABLED:
+                with tracing.span('gemini'):
+                    gemini_analysis_english = enrichment_cache.get(disease_label, 'en', wait=False)
+                    gemini_analysis_hindi = enrichment_cache.get(disease_label, 'hi', wait=False)
+                if gemini_analysis_english and gemini_analysis_hindi:
+                    result['gemini_analysis_english'] = gemini_analysis_english
+                    result['gemini_analysis_hindi'] = gemini_analysis_hindi
+                    result['analysis_source'] = 'gemini'
             
             result['system_info'] = {
                 'memory_usage': system_monitor.get_memory_usage()['used_percent'],
                 'cpu_usage': system_monitor.get_cpu_usage(),
-                'remaining_requests': rate_limiter.get_remaining_requests(user_id)
+                'remaining_requests': rate_limit.remaining
             }
             result['status'] = 'success'
+            trace = tracing.current_trace()
+            if trace is not None:
+                result['trace'] = trace.to_dict()
             
             return jsonify(result)
         
@@ -167,7 +219,6 @@ async def analyze_crop_endpoint():
 def health_check():
     """Enhanced health check endpoint"""
     global model, labels
-    logger.info("Health check requested")
     
     system_healthy = system_monitor.is_system_healthy()
     memory_usage = system_monitor.get_memory_usage()['used_percent']
@@ -195,7 +246,7 @@ def health_check():
         },
         'rate_limiting': {
             'requests_per_minute': RATE_LIMIT_REQUESTS,
-            'active_users': len(rate_limiter.user_requests)
+            'active_users': rate_limiter.active_users()
         }
     })
 
@@ -213,12 +264,15 @@ def train_endpoint():
                 'status': 'error'
             }), 400
         
+        from utils.dataloader import get_generators # training utilities pull in TensorFlow
+        from utils.train import train_model
         train_gen, val_gen, num_classes = get_generators("Data", "labels.txt")
-        model, history = train_model(train_gen, val_gen, num_classes)
+        trained_model, history = train_model(train_gen, val_gen, num_classes)
         
         # Save the trained model
         os.makedirs("model", exist_ok=True)
-        model.save("model/mobilenetv2_model.h5")
+        trained_model.save("model/mobilenetv2_model.h5")
+        model = (trained_model, False, True, 'trained')
         
         # Reload labels in case they changed during training
         labels = load_labels()
@@ -237,19 +291,17 @@ def train_endpoint():
 @app.route('/labels', methods=['GET'])
 def get_labels():
     """Get available crop labels"""
-    logger.info("Labels requested")
     return jsonify({'labels': labels, 'status': 'success'})
 
 @app.route('/status', methods=['GET'])
 def get_status():
     """Get detailed server status"""
     global model, labels
-    logger.info("Status requested")
     
     memory_usage = system_monitor.get_memory_usage()['used_percent']
     cpu_usage = system_monitor.get_cpu_usage()
     
-    active_users = len(rate_limiter.user_requests)
+    active_users = rate_limiter.active_users()
     
     queue_size = ml_queue_manager.get_queue_size()
     
@@ -274,7 +326,9 @@ def get_status():
         'queue': {
             'size': queue_size,
             'processing': ml_queue_manager.is_processing_locked()
-        }
+        },
+        'enrichment_cache': enrichment_cache.get_stats(),
+        'translation': translation_service.get_stats()
     })
 
 def initialize_model_and_labels():
@@ -285,9 +339,17 @@ def initialize_model_and_labels():
     labels = load_labels()
     logger.info(f"Loaded {len(labels)} labels: {labels}")
     
+    knowledge_base.load()
+    
+    # Start filling the optional Gemini enrichment cache for every label (plus "Unknown") while the model loads
+    if GEMINI_ENRICHMENT_ENABLED:
+        if TRANSLATION_WARMUP:
+            translation_service.start_warm_up()
+        enrichment_cache.warm(labels + ['Unknown'], ENRICHMENT_LANGUAGES)
+    
     model = load_ml_model()
     
-    if model is None:
+    if model[0] is None:
         logger.info("No existing model found. Attempting to train new model...")
         try:
             if not os.path.exists("Data"):
@@ -296,11 +358,14 @@ def initialize_model_and_labels():
                 return False
                 
             logger.info("Training data found, starting training process...")
+            from utils.dataloader import get_generators # training utilities pull in TensorFlow
+            from utils.train import train_model
             train_gen, val_gen, num_classes = get_generators("Data", "labels.txt")
-            model, history = train_model(train_gen, val_gen, num_classes)
+            trained_model, history = train_model(train_gen, val_gen, num_classes)
             
             os.makedirs("model", exist_ok=True)
-            model.save("model/mobilenetv2_model.h5")
+            trained_model.save("model/mobilenetv2_model.h5")
+            model = (trained_model, False, True, 'trained')
             logger.info("New model trained and saved successfully")
             return True
         except Exception as e:
@@ -7,35 +7,49 @@ Optimized for Kubernetes deployment with proper logging and monitoring
 import os
 import sys
 import time
+import_started = time.perf_counter()
+import hmac
+import math
+import binascii
 import logging
 from datetime import datetime
-from flask import Flask, request, jsonify
-from werkzeug.exceptions import RequestEntityTooLarge
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import numpy as np # type: ignore
+from flask import Flask, request, jsonify, g
+from PIL import Image, UnidentifiedImageError
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 
 # Import utilities from ml_utils and config
 import ml_utils
-from ml_utils import load_labels, preprocess_image, analyze_crop_prediction, load_ml_model, RateLimiter, SystemMonitor, MLQueueManager
+import tracing
+import structured_logging
+from knowledge_base import DiseaseKnowledgeBase
+from model_registry import ModelRegistry
+from metrics import ServerMetrics
+from tracing import SamplingProfiler
+from rate_limit import create_rate_limiter
+from cascade import CascadeEngine, load_cascade_model
+from ml_utils import (
+    load_labels, preprocess_image, predict_batch, load_ml_model, decode_base64_image, log_prediction,
+    SystemMonitor, MLQueueManager, QueueFullError, InterpreterPool, PredictionCache, StartupTimer
+)
 from config import (
     RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, MAX_FILE_SIZE, IMAGE_SIZE,
-    MEMORY_HEALTH_THRESHOLD, CPU_HEALTH_THRESHOLD, FLASK_PORT, FLASK_HOST
+    MEMORY_HEALTH_THRESHOLD, CPU_HEALTH_THRESHOLD, FLASK_PORT, FLASK_HOST,
+    BATCH_RESULT_TIMEOUT, RAW_UPLOAD_CONTENT_TYPES, ADMIN_TOKEN, INFERENCE_MODE,
+    REQUEST_TRACE_HEADER, PROFILER_SAMPLE_INTERVAL_MS, PROFILER_MAX_SECONDS, PRIORITY_HEADER
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: formatting and output run on a background thread (see structured_logging)
+structured_logging.configure_logging()
 logger = logging.getLogger(__name__)
 
+startup_timer = StartupTimer()
+startup_timer.record('imports', time.perf_counter() - import_started)
+
 # Global variables for model and labels
-model = None
 labels = []
 model_loaded = False
-is_tflite_model = False # New flag to indicate if the loaded model is TFLite
-is_multitask_model = False # New flag to indicate if the loaded model is multitask
 start_time = time.time()
 
 # Initialize Flask app
@@ -43,30 +57,122 @@ app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
 # Initialize components
-rate_limiter = RateLimiter()
+rate_limiter = create_rate_limiter()  # RATE_LIMIT_BACKEND
 system_monitor = SystemMonitor()
 ml_queue_manager = MLQueueManager()
+prediction_cache = PredictionCache()
+def on_model_activated(handle):
+    """Serve ``handle``, also after a failed startup load, with one scheduler worker per pooled interpreter."""
+    global model_loaded
+    model_loaded = True
+    num_workers = handle.model.pool_size if isinstance(handle.model, (InterpreterPool, CascadeEngine)) else 1
+    ml_queue_manager.set_workers(num_workers)
+    logger.info(f"Batch scheduler sized to {num_workers} workers for model version {handle.version}")
+
+# Loaded model versions; the active one serves new requests. In cascade mode a "version"
+# is the crop detector plus all per-crop disease models.
+model_registry = ModelRegistry(loader=load_cascade_model if INFERENCE_MODE == 'cascade' else load_ml_model,
+                               on_activate=on_model_activated)
+knowledge_base = DiseaseKnowledgeBase()
+# Counters and histograms, aggregated across gunicorn workers (see metrics.py)
+server_metrics = ServerMetrics()
+profiler = SamplingProfiler(interval=PROFILER_SAMPLE_INTERVAL_MS / 1000.0)
 
 def initialize_production_model_and_labels():
     """Initialize model and labels for production server."""
-    global model, labels, model_loaded, is_tflite_model, is_multitask_model
+    global labels, model_loaded
     logger.info("=== PRODUCTION MODEL LOADING PROCESS ===")
+    server_metrics.start()
     
-    labels = load_labels()
+    with startup_timer.phase('load_labels'):
+        labels = load_labels()
     logger.info(f"Loaded {len(labels)} labels: {labels}")
+    with startup_timer.phase('load_knowledge_base'):
+        knowledge_base.load()
+    # Started before any model so a version loaded later through /admin/models/reload is
+    # served too; activating a version resizes it to that version's pool
+    with startup_timer.phase('start_batching'):
+        ml_queue_manager.start(run_prediction_batch, on_queue_change=server_metrics.observe_queue)
     
-    loaded_model, tflite_flag, multitask_flag = load_ml_model()
-    model = loaded_model
-    is_tflite_model = tflite_flag
-    is_multitask_model = multitask_flag
-    model_loaded = (model is not None)
+    with startup_timer.phase('load_model'):
+        handle = model_registry.load()
+    model_loaded = (handle is not None)
     
     if not model_loaded:
         logger.error("❌ Failed to load model for production. Server will not start.")
     else:
-        logger.info(f"✅ Model loaded successfully - TFLite: {is_tflite_model}, Multitask: {is_multitask_model}")
+        logger.info(f"✅ Model loaded successfully - TFLite: {handle.is_tflite}, Multitask: {handle.is_multitask}, Version: {handle.version}")
+        startup_timer.mark_ready()
     return model_loaded
 
+def run_prediction_batch(items):
+    """Batch function for the queue manager: one batched inference per model version.
+
+    Each item is (model handle, preprocessed image, request trace or None). Requests that
+    started before a hot reload still carry the old handle, so a batch spanning a swap is
+    split by version. Batch timings are added to the trace of every traced request in it.
+    """
+    by_handle = {}
+    for index, (handle, _, _) in enumerate(items):
+        by_handle.setdefault(handle, []).append(index)
+
+    results = [None] * len(items)
+    for handle, indexes in by_handle.items():
+        image_arrays = [items[index][1] for index in indexes]
+        traces = [items[index][2] for index in indexes if items[index][2] is not None]
+        server_metrics.observe_batch(len(image_arrays))
+        for trace in traces:
+            trace.attributes['batch_size'] = len(image_arrays)
+        if isinstance(handle.model, CascadeEngine):
+            with server_metrics.time_stage('invoke', traces):
+                version_results = handle.model.predict_batch(image_arrays, on_stage_run=server_metrics.observe_cascade_stage)
+        else:
+            version_results = predict_batch(handle.model, image_arrays, labels, handle.is_tflite, handle.is_multitask,
+                                            stage_timer=lambda stage: server_metrics.time_stage(stage, traces))
+        for index, result in zip(indexes, version_results):
+            results[index] = result
+    return results
+
+def check_admin_token():
+    """Return an error response unless the request carries ADMIN_TOKEN, else None."""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints disabled', 'status': 'error'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Unauthorized', 'status': 'error'}), 401
+    return None
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    traced = bool(REQUEST_TRACE_HEADER and request.headers.get(REQUEST_TRACE_HEADER))
+    if traced:
+        tracing.start_trace()
+    structured_logging.start_request(force_verbose=traced)
+
+@app.after_request
+def record_request_metrics(response):
+    # The URL rule rather than the path keeps the endpoint label bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    server_metrics.count_request(endpoint, response.status_code, elapsed, request.content_length or 0)
+    if 'lane' in g:
+        server_metrics.observe_lane_request(g.lane, response.status_code, elapsed)
+    # The one summary record per request; endpoints add their fields to g.log_fields
+    structured_logging.log_event(
+        logger, 'request', method=request.method, endpoint=endpoint, status=response.status_code,
+        duration_ms=round(elapsed * 1000, 1), bytes_in=request.content_length, **g.get('log_fields', {}))
+    trace = tracing.current_trace()
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    if g.get('queue_entered'):
+        ml_queue_manager.leave(g.lane)
+    tracing.end_trace()
+    structured_logging.end_request()
+
 @app.errorhandler(RequestEntityTooLarge)
 def handle_file_too_large(e):
     return jsonify({
@@ -75,6 +181,26 @@ def handle_file_too_large(e):
         'status': 'error'
     }), 413
 
+def queue_full_response(error):
+    """503 for a request not admitted to the inference queue, with Retry-After from its estimated wait."""
+    server_metrics.count_queue_rejection(g.lane)
+    retry_after = max(1, math.ceil(error.retry_after))
+    g.log_fields['rejected'] = 'queue_full'
+    return jsonify({
+        'error': 'Server overloaded',
+        'message': f'Too many images are waiting for analysis. Try again in {retry_after} seconds.',
+        'retry_after': retry_after,
+        'status': 'error'
+    }), 503, {'Retry-After': str(retry_after)}
+
+def read_raw_image_body():
+    """Read a raw image request body (no multipart/base64 wrapping), enforcing MAX_FILE_SIZE."""
+    # Werkzeug rejects a Content-Length above MAX_CONTENT_LENGTH up front; this also covers chunked bodies
+    body = request.get_data(cache=False)
+    if len(body) > MAX_FILE_SIZE:
+        raise RequestEntityTooLarge()
+    return body or None
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Enhanced health check endpoint"""
@@ -113,14 +239,13 @@ def detailed_status():
     """Detailed server status for monitoring"""
     global model_loaded
     try:
-        memory = system_monitor.get_memory_usage()
-        cpu = system_monitor.get_cpu_usage()
+        snapshot = system_monitor.get_snapshot()
+        memory = snapshot['memory']
+        cpu = snapshot['cpu_percent']
         uptime = time.time() - start_time
         
         queue_size = ml_queue_manager.get_queue_size()
-        
-        with rate_limiter.lock: # Use rate_limiter's internal lock
-            active_users = len(rate_limiter.user_requests)
+        active_model = model_registry.get_active()
         
         return jsonify({
             'server': {
@@ -129,23 +254,40 @@ def detailed_status():
                 'uptime_human': f"{int(uptime // 3600)}h {int((uptime % 3600) // 60)}m {int(uptime % 60)}s",
                 'start_time': datetime.fromtimestamp(start_time).isoformat()
             },
+            'startup': startup_timer.get_report(),
+            'knowledge_base': {
+                'entries': len(knowledge_base.entries),
+                'source': knowledge_base.source
+            },
             'model': {
                 'loaded': model_loaded,
-                'status': 'ready' if model_loaded else 'error'
+                'status': 'ready' if model_loaded else 'error',
+                'version': active_model.version if active_model else None,
+                'inference_mode': INFERENCE_MODE,
+                'cascade': active_model.model.get_stats() if active_model and isinstance(active_model.model, CascadeEngine) else None,
+                'interpreter_pool': active_model.model.get_stats() if active_model and isinstance(active_model.model, InterpreterPool) else None,
+                'registry': model_registry.get_stats()
             },
             'system': {
                 'memory': memory,
                 'cpu_percent': cpu,
-                'healthy': system_monitor.is_system_healthy()
+                'healthy': system_monitor.is_system_healthy(),
+                'source': snapshot['source'],
+                'sample_age_seconds': snapshot['age_seconds']
             },
             'rate_limiting': {
                 'max_requests_per_hour': RATE_LIMIT_REQUESTS,
-                'window_seconds': RATE_LIMIT_WINDOW,
-                'active_users': active_users
+                **rate_limiter.get_stats()
             },
             'queue': {
                 'size': queue_size,
-                'processing': ml_queue_manager.is_processing_locked()
+                'processing': ml_queue_manager.is_processing_locked(),
+                'batching': ml_queue_manager.get_batch_stats(),
+                'admission': ml_queue_manager.get_admission_stats()
+            },
+            'prediction_cache': prediction_cache.get_stats(),
+            'logging': {
+                'dropped_records': structured_logging.get_dropped_records()
             }
         })
     except Exception as e:
@@ -153,13 +295,21 @@ def detailed_status():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/analyze_crop', methods=['POST'])
-def analyze_crop_endpoint():
-    """Analyze crop image for disease detection"""
-    global model, labels, model_loaded
+@app.route('/analyze_crop/background', methods=['POST'], defaults={'priority': 'background'})
+def analyze_crop_endpoint(priority=None):
+    """Analyze crop image for disease detection.
+
+    The request waits for inference in the lane named by the route or PRIORITY_HEADER
+    (e.g. 'background' for bulk uploads from the app's sync), by default 'interactive'.
+    """
+    global labels, model_loaded
     start_time_req = time.time()
+    g.lane = ml_queue_manager.lane_for(priority or request.headers.get(PRIORITY_HEADER, '').strip().lower())
+    if tracing.current_trace() is not None:
+        tracing.current_trace().attributes['lane'] = g.lane
     
     try:
-        if not model_loaded or model is None:
+        if not model_loaded or model_registry.get_active() is None:
             logger.error("Model not loaded, cannot process request.")
             return jsonify({
                 'error': 'Model not available',
@@ -167,65 +317,142 @@ def analyze_crop_endpoint():
                 'status': 'error'
             }), 500
 
-        if not system_monitor.is_system_healthy():
+        # Load is shed by queue admission control below; CPU saturation alone is not an overload
+        if not system_monitor.is_memory_healthy():
             return jsonify({
                 'error': 'Server overloaded',
                 'message': 'Server is currently under heavy load. Please try again later.',
                 'status': 'error'
-            }), 503
+            }), 503, {'Retry-After': '5'}
         
         user_id = request.headers.get('X-User-ID', request.remote_addr)
+        g.log_fields = {'user_id': user_id, 'lane': g.lane}
         
-        if not rate_limiter.is_allowed(user_id):
-            remaining = rate_limiter.get_remaining_requests(user_id)
+        # One call (one round trip for shared backends) decides and reports the user's state
+        rate_limit = rate_limiter.check(user_id)
+        if not rate_limit.allowed:
+            retry_after = math.ceil(rate_limit.retry_after)
             return jsonify({
                 'error': 'Rate limit exceeded',
-                'message': f'Too many requests. Try again in {RATE_LIMIT_WINDOW // 60} minutes.',
-                'remaining_requests': remaining,
+                'message': f'Too many requests. Try again in {retry_after} seconds.',
+                'remaining_requests': rate_limit.remaining,
+                'retry_after': retry_after,
                 'status': 'error'
-            }), 429
+            }), 429, {'Retry-After': str(retry_after)}
+        
+        try:
+            ml_queue_manager.enter(g.lane)
+        except QueueFullError as e:
+            return queue_full_response(e)
+        g.queue_entered = True  # left in end_request_trace, however the request ends
         
-        image_data_input = None
+        image_bytes = None
         
-        if 'image' in request.files:
-            image_file = request.files['image']
-            if image_file.filename != '':
+        with server_metrics.time_stage('decode'):
+            if request.mimetype in RAW_UPLOAD_CONTENT_TYPES:
+                # Raw body: the bytes are handed to the JPEG decoder without intermediate copies
+                image_bytes = read_raw_image_body()
+            
+            elif 'image' in request.files:
+                image_file = request.files['image']
+                if image_file.filename != '':
+                    image_bytes = image_file.read() or None
+            
+            elif request.is_json and 'image' in request.get_json():
                 try:
-                    image_data_input = Image.open(image_file.stream)
-                except Exception as e:
-                    logger.error(f"File upload processing error: {e}")
+                    with tracing.span('base64'):
+                        image_bytes = decode_base64_image(request.get_json()['image'])
+                except (binascii.Error, ValueError) as e:
+                    logger.error(f"Base64 image decoding error: {e}")
                     return jsonify({
-                        'error': 'Invalid image file',
-                        'message': 'Could not process the uploaded image file',
+                        'error': 'Invalid image data',
+                        'message': 'Could not decode the base64 image data',
                         'status': 'error'
                     }), 400
         
-        elif request.is_json and 'image' in request.get_json():
-            image_data_input = request.get_json()['image']
-        
-        if image_data_input is None:
+        if image_bytes is None:
             return jsonify({
                 'error': 'No image provided',
-                'message': 'Please provide an image file or base64 image data',
+                'message': 'Please provide an image file, base64 image data or a raw image/jpeg body',
                 'status': 'error'
             }), 400
+        server_metrics.observe_image_bytes(len(image_bytes))
         
-        # Use the shared analysis function, passing the tflite and multitask flags
-        result = analyze_crop_prediction(model, image_data_input, labels, is_tflite_model, is_multitask_model)
+        # The request holds one model version from here on, even if a reload swaps in a new one
+        with model_registry.acquire() as model_handle:
+            def run_inference():
+                # Preprocess on the request thread, then hand the tensor to the batch scheduler. It
+                # goes into a fresh array rather than this thread's reusable buffer: after a timeout
+                # the worker may still read it while the thread's next request preprocesses.
+                width, height = model_handle.input_size
+                with server_metrics.time_stage('preprocess'):
+                    try:
+                        processed_image = preprocess_image(image_bytes, size=model_handle.input_size,
+                                                           out=np.empty((1, height, width, 3), dtype=np.float32))
+                    except (OSError, Image.DecompressionBombError) as e:
+                        # Truncated, corrupt or oversized uploads are as invalid as an unknown format
+                        raise UnidentifiedImageError(f"Could not decode the uploaded image: {e}") from e
+                future = ml_queue_manager.submit((model_handle, processed_image, tracing.current_trace()), lane=g.lane)
+                try:
+                    # The batch worker records invoke and postprocess under this span
+                    with tracing.span('batch_wait'):
+                        return future.result(timeout=BATCH_RESULT_TIMEOUT)
+                except FutureTimeoutError:
+                    future.cancel()  # drop it from the queue if no batch has taken it yet
+                    raise
+            
+            # Retries and re-synced uploads of the same photo are served from the cache, and
+            # identical requests in flight at the same time share a single inference
+            cache_key = prediction_cache.make_key(image_bytes, model_handle.version)
+            try:
+                result, cache_source = prediction_cache.get_or_compute(cache_key, run_inference, timeout=BATCH_RESULT_TIMEOUT)
+                server_metrics.count_cache_result(cache_source)
+            except UnidentifiedImageError:
+                return jsonify({
+                    'error': 'Invalid image file',
+                    'message': 'Could not decode the uploaded image',
+                    'status': 'error'
+                }), 400
+            except QueueFullError as e:
+                return queue_full_response(e)
+            except FutureTimeoutError:
+                logger.error(f"Timed out after {BATCH_RESULT_TIMEOUT}s waiting for batched inference")
+                return jsonify({
+                    'error': 'Inference timeout',
+                    'message': 'The server took too long to process the image. Please try again later.',
+                    'status': 'error'
+                }), 503
         
         processing_time = time.time() - start_time_req
+        g.log_fields.update(label=result['crop_type'], confidence=round(result['confidence'], 4),
+                            cache=cache_source, model_version=model_handle.version)
+        log_prediction(result)
         
-        logger.info(f"Crop analysis completed for user {user_id} in {processing_time:.2f}s")
+        # Join the label to its bilingual guidance from the local knowledge base; the text
+        # fields keep the names the Flutter and web clients already read
+        with server_metrics.time_stage('enrichment'):
+            guidance = knowledge_base.get_guidance(result['crop_type'])
+            result['guidance'] = guidance
+            result['gemini_analysis_english'] = knowledge_base.format_guidance(guidance, 'en')
+            result['gemini_analysis_hindi'] = knowledge_base.format_guidance(guidance, 'hi')
+            result['analysis_source'] = 'knowledge_base' if guidance else None
         
+        result['model_version'] = model_handle.version
         result['processing_time_seconds'] = processing_time
+        result['cache'] = cache_source
         result['system_info'] = {
             'memory_usage_percent': system_monitor.get_memory_usage()['used_percent'],
             'cpu_usage_percent': system_monitor.get_cpu_usage()
         }
         result['status'] = 'success'
+        trace = tracing.current_trace()
+        if trace is not None:
+            result['trace'] = trace.to_dict()
         
         return jsonify(result)
         
+    except HTTPException:
+        raise  # e.g. 413 from the request body limit, handled by the error handlers
     except Exception as e:
         logger.error(f"Unexpected error in analyze_crop_endpoint: {e}")
         return jsonify({
@@ -234,14 +461,107 @@ def analyze_crop_endpoint():
             'status': 'error'
         }), 500
 
+@app.route('/admin/models/reload', methods=['POST'])
+def reload_model_endpoint():
+    """Load a model artifact in the background and swap it in once warmed up."""
+    error = check_admin_token()
+    if error:
+        return error
+
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Invalid request', 'message': 'Body must be a JSON object', 'status': 'error'}), 400
+    model_path = payload.get('path')
+    activate = payload.get('activate', True)
+    if model_path is not None and not isinstance(model_path, str):
+        return jsonify({
+            'error': 'Invalid model path',
+            'message': f'path must be a string, got {type(model_path).__name__}',
+            'status': 'error'
+        }), 400
+    if INFERENCE_MODE == 'cascade':
+        # A cascade version is a directory holding the crop detector and disease models
+        valid_path = os.path.isdir(model_path) if model_path else True
+    else:
+        valid_path = model_path.endswith(('.tflite', '.h5', '.keras')) and os.path.isfile(model_path) if model_path else True
+    if not valid_path:
+        return jsonify({
+            'error': 'Invalid model path',
+            'message': f'{model_path} is not a model {"directory" if INFERENCE_MODE == "cascade" else ".tflite/.h5/.keras file"} on this server',
+            'status': 'error'
+        }), 400
+    if model_registry.load_async(model_path, activate=activate) is None:
+        return jsonify({
+            'error': 'Reload in progress',
+            'message': f'Still loading {model_registry.loading}',
+            'status': 'error'
+        }), 409
+    logger.info(f"🔄 Model reload requested: {model_path or 'configured paths'} (activate={activate})")
+    return jsonify({
+        'status': 'loading',
+        'path': model_path,
+        'active_version': model_registry.get_active().version if model_registry.get_active() else None
+    }), 202
+
+@app.route('/admin/models/activate', methods=['POST'])
+def activate_model_endpoint():
+    """Switch to an already loaded version, e.g. to roll back."""
+    error = check_admin_token()
+    if error:
+        return error
+
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Invalid request', 'message': 'Body must be a JSON object', 'status': 'error'}), 400
+    version = payload.get('version')
+    if not isinstance(version, str):
+        return jsonify({
+            'error': 'Invalid model version',
+            'message': f'version must be a string, got {type(version).__name__}',
+            'status': 'error'
+        }), 400
+    try:
+        handle = model_registry.activate(version)
+    except KeyError:
+        return jsonify({
+            'error': 'Unknown model version',
+            'message': f'{version} is not loaded',
+            'status': 'error'
+        }), 404
+    return jsonify({'status': 'success', 'active_version': handle.version})
+
+@app.route('/admin/profile', methods=['POST'])
+def profile_endpoint():
+    """Sample this worker's Python stacks for ?seconds=N and return the hottest stacks."""
+    error = check_admin_token()
+    if error:
+        return error
+
+    seconds = request.args.get('seconds', 10.0, type=float)
+    if not 0 < seconds <= PROFILER_MAX_SECONDS:
+        return jsonify({
+            'error': 'Invalid duration',
+            'message': f'seconds must be between 0 and {PROFILER_MAX_SECONDS:g}',
+            'status': 'error'
+        }), 400
+    include_idle = request.args.get('include_idle', 'false').lower() == 'true'
+    try:
+        report = profiler.profile(seconds, include_idle=include_idle, top=request.args.get('top', 25, type=int))
+    except RuntimeError as e:
+        return jsonify({'error': 'Profile in progress', 'message': str(e), 'status': 'error'}), 409
+    report['pid'] = os.getpid()
+    report['status'] = 'success'
+    return jsonify(report)
+
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    """Prometheus-style metrics endpoint"""
+    """Prometheus metrics: request, stage and batch metrics summed over all workers, plus this worker's gauges"""
     global model_loaded
     try:
         memory = system_monitor.get_memory_usage()
         cpu = system_monitor.get_cpu_usage()
         uptime = time.time() - start_time
+        active_model = model_registry.get_active()
         
         metrics_data = f"""# HELP ml_server_uptime_seconds Server uptime in seconds
 # TYPE ml_server_uptime_seconds counter
@@ -259,25 +579,32 @@ ml_server_cpu_usage_percent {cpu}
 # TYPE ml_server_model_loaded gauge
 ml_server_model_loaded {1 if model_loaded else 0}
  
-# HELP ml_server_requests_total Total number of requests
-# TYPE ml_server_requests_total counter
-ml_server_requests_total {sum(len(requests) for requests in rate_limiter.user_requests.values())}
+# HELP ml_server_model_info Active model version
+# TYPE ml_server_model_info gauge
+ml_server_model_info{{version="{active_model.version if active_model else ''}"}} {1 if active_model else 0}
 """
+        metrics_data += server_metrics.generate()
         
-        return metrics_data, 200, {'Content-Type': 'text/plain'}
+        return metrics_data, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
     except Exception as e:
         logger.error(f"Metrics error: {e}")
         return f"# ERROR: {e}", 500, {'Content-Type': 'text/plain'}
 
 if __name__ == '__main__':
-    if initialize_production_model_and_labels():
+    try:
+        import gunicorn.app.wsgiapp as wsgi
+    except ImportError:
+        wsgi = None
+
+    # Under gunicorn each worker loads the model itself (see gunicorn.conf.py), so the
+    # master skips it rather than holding an unused copy and delaying the first fork.
+    if wsgi is not None or initialize_production_model_and_labels():
         logger.info("🚀 Starting Krishi Sahayak ML Server...")
         logger.info(f"📊 Rate limit: {RATE_LIMIT_REQUESTS} requests per {RATE_LIMIT_WINDOW} seconds")
         logger.info(f"📁 Max file size: {MAX_FILE_SIZE / 1024 / 1024:.1f}MB")
         logger.info(f"🌐 Starting server on port {FLASK_PORT}")
         
-        try:
-            import gunicorn.app.wsgiapp as wsgi
+        if wsgi is not None:
             logger.info("🚀 Starting with Gunicorn WSGI server...")
             num_workers = int(os.getenv('GUNICORN_WORKERS', '2'))
             # For memory limits, typically configured via container orchestration (e.g., Kubernetes resource limits)
@@ -291,7 +618,7 @@ if __name__ == '__main__':
             # Tune num_workers based on CPU cores: (2 * num_cores) + 1 is a common starting point for CPU-bound tasks.
             sys.argv = ['gunicorn', '--bind', f'{FLASK_HOST}:{FLASK_PORT}', '--workers', str(num_workers), '--timeout', '120', '--keep-alive', '5', '--max-requests', '1000', '--max-requests-jitter', '100', 'main_production:app']
             wsgi.run()
-        except ImportError:
+        else:
             logger.warning("⚠️ Gunicorn not available, falling back to Flask development server")
             logger.warning("⚠️ This is not recommended for production!")
             app.run(
@@ -301,4 +628,4 @@ if __name__ == '__main__':
                 threaded=True
             )
     else:
-        logger.error("❌ Failed to initialize model. Server not started.")
\ No newline at end of file
+        logger.error("❌ Failed to initialize model. Server not started.")
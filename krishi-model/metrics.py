@@ -0,0 +1,167 @@
+"""
+Prometheus metrics for the production ML server.
+
+Counters and histograms are kept with prometheus_client. Under gunicorn,
+gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR, so every worker writes its values
+to files in that directory and /metrics, whichever worker serves it, reports the sum
+over all workers (gauges: the sum over live workers). prometheus_client picks its storage when it is first imported, so
+it is only imported in ServerMetrics.start(), which runs in each worker after the fork.
+"""
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 2 * 1024 * 1024, 5 * 1024 * 1024, 10 * 1024 * 1024)
+BATCH_SIZE_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+class ServerMetrics:
+    """Request, stage and batch metrics; every method is a no-op until start() is called."""
+
+    def __init__(self):
+        self.started = False
+        self.multiprocess_dir = None
+
+    def start(self):
+        if self.started:
+            return
+        import prometheus_client # type: ignore
+
+        self.multiprocess_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+        if self.multiprocess_dir:
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+        self.prometheus_client = prometheus_client
+        # Own registry rather than the global one, which also carries per-process
+        # collectors that are meaningless when summed across workers
+        self.registry = prometheus_client.CollectorRegistry()
+
+        self.requests = prometheus_client.Counter(
+            'ml_server_requests_total', 'HTTP requests by endpoint and status code',
+            ['endpoint', 'status'], registry=self.registry)
+        self.request_seconds = prometheus_client.Histogram(
+            'ml_server_request_duration_seconds', 'HTTP request duration by endpoint',
+            ['endpoint'], buckets=REQUEST_BUCKETS, registry=self.registry)
+        self.received_bytes = prometheus_client.Counter(
+            'ml_server_received_bytes', 'Request body bytes received by endpoint',
+            ['endpoint'], registry=self.registry)
+        self.image_bytes = prometheus_client.Histogram(
+            'ml_server_image_bytes', 'Size of decoded image uploads in bytes',
+            buckets=BYTES_BUCKETS, registry=self.registry)
+        # decode, preprocess and enrichment are observed per request, invoke and postprocess per batch
+        self.stage_seconds = prometheus_client.Histogram(
+            'ml_server_stage_duration_seconds',
+            'Time per processing stage (invoke and postprocess are observed once per batch)',
+            ['stage'], buckets=STAGE_BUCKETS, registry=self.registry)
+        self.batch_size = prometheus_client.Histogram(
+            'ml_server_batch_size', 'Requests per batched inference',
+            buckets=BATCH_SIZE_BUCKETS, registry=self.registry)
+        # Per priority lane of the inference queue; the HPA scales on the interactive
+        # lane's depth per pod (k8s/hpa.yaml)
+        self.queue_depth = prometheus_client.Gauge(
+            'ml_server_queue_depth', 'Requests waiting in the inference queue by lane',
+            ['lane'], multiprocess_mode='livesum', registry=self.registry)
+        self.queue_wait_seconds = prometheus_client.Histogram(
+            'ml_server_queue_wait_seconds', 'Time requests waited in the inference queue before their batch started',
+            ['lane'], buckets=STAGE_BUCKETS, registry=self.registry)
+        self.queue_rejections = prometheus_client.Counter(
+            'ml_server_queue_rejections', 'Requests rejected by inference queue admission control by lane',
+            ['lane'], registry=self.registry)
+        self.lane_request_seconds = prometheus_client.Histogram(
+            'ml_server_lane_request_duration_seconds', 'Duration of /analyze_crop requests by lane and status',
+            ['lane', 'status'], buckets=REQUEST_BUCKETS, registry=self.registry)
+        # One observation per stage call, i.e. per batch (the disease stage once per detected crop)
+        self.cascade_stage_seconds = prometheus_client.Histogram(
+            'ml_server_cascade_stage_seconds', 'Batched inference time per cascade stage',
+            ['stage', 'crop'], buckets=STAGE_BUCKETS, registry=self.registry)
+        self.cascade_stage_images = prometheus_client.Counter(
+            'ml_server_cascade_stage_images', 'Images processed per cascade stage',
+            ['stage', 'crop'], registry=self.registry)
+        self.cache_results = prometheus_client.Counter(
+            'ml_server_prediction_cache_results', 'Prediction results by source (model, memory, disk, coalesced)',
+            ['source'], registry=self.registry)
+        self.started = True
+        logger.info(f"📈 Prometheus metrics enabled ({'multiprocess: ' + self.multiprocess_dir if self.multiprocess_dir else 'single process'})")
+
+    def count_request(self, endpoint, status, seconds, received_bytes=0):
+        if not self.started:
+            return
+        self.requests.labels(endpoint=endpoint, status=str(status)).inc()
+        self.request_seconds.labels(endpoint=endpoint).observe(seconds)
+        if received_bytes:
+            self.received_bytes.labels(endpoint=endpoint).inc(received_bytes)
+
+    def observe_image_bytes(self, size):
+        if self.started:
+            self.image_bytes.observe(size)
+
+    def observe_stage(self, stage, seconds):
+        if self.started:
+            self.stage_seconds.labels(stage=stage).observe(seconds)
+
+    @contextmanager
+    def time_stage(self, stage, traces=()):
+        """Observe the duration of the ``with`` block as ``stage``.
+
+        The stage is also recorded in the current request's trace and in ``traces``, the
+        traces of the requests in a batch that runs on a worker thread (see tracing).
+        """
+        start = time.perf_counter()
+        try:
+            with tracing.span(stage):
+                yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe_stage(stage, seconds)
+            for trace in traces:
+                trace.record(stage, seconds)
+
+    def observe_batch(self, size):
+        if self.started:
+            self.batch_size.observe(size)
+
+    def observe_queue(self, depths, waits=()):
+        """MLQueueManager on_queue_change callback: depth per lane and the (lane, seconds) waits of dequeued requests."""
+        if not self.started:
+            return
+        for lane, depth in depths.items():
+            self.queue_depth.labels(lane=lane).set(depth)
+        for lane, seconds in waits:
+            self.queue_wait_seconds.labels(lane=lane).observe(seconds)
+
+    def count_queue_rejection(self, lane):
+        if self.started:
+            self.queue_rejections.labels(lane=lane).inc()
+
+    def observe_lane_request(self, lane, status, seconds):
+        if self.started:
+            self.lane_request_seconds.labels(lane=lane, status=str(status)).observe(seconds)
+
+    def observe_cascade_stage(self, stage, images, seconds):
+        """CascadeStage on_run callback: one batched call of a cascade stage."""
+        if not self.started:
+            return
+        labels = {'stage': stage.name, 'crop': stage.crop or ''}
+        self.cascade_stage_seconds.labels(**labels).observe(seconds)
+        self.cascade_stage_images.labels(**labels).inc(images)
+
+    def count_cache_result(self, source):
+        if self.started:
+            self.cache_results.labels(source=source).inc()
+
+    def generate(self):
+        """Prometheus text exposition of every worker's metrics (or this process's outside gunicorn)."""
+        if not self.started:
+            return ''
+        registry = self.registry
+        if self.multiprocess_dir:
+            from prometheus_client import multiprocess # type: ignore
+            registry = self.prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, path=self.multiprocess_dir)
+        return self.prometheus_client.generate_latest(registry).decode('utf-8')
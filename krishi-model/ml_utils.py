@@ -3,31 +3,124 @@ import base64
 import io
 import time
 import threading
-from collections import defaultdict, deque
+import hashlib
+import json
+import sqlite3
+import queue
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque, OrderedDict
 import numpy as np # type: ignore
 from PIL import Image # type: ignore
-import tensorflow as tf # type: ignore
-import tensorflow.lite as tflite # type: ignore
 import logging
-import psutil
-import google.generativeai as genai # Import the Gemini API library
-import asyncio # For asynchronous API calls
+import importlib
+
+import tracing
+import structured_logging
 
 from config import (
-    RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, MODEL_PATHS, LABEL_PATHS,
-    MEMORY_HEALTH_THRESHOLD, CPU_HEALTH_THRESHOLD, IMAGE_SIZE, MAX_FILE_SIZE,
-    GEMINI_API_KEY, CONFIDENCE_THRESHOLD # Import the Gemini API key and CONFIDENCE_THRESHOLD
+    MODEL_PATHS, LABEL_PATHS,
+    MEMORY_HEALTH_THRESHOLD, CPU_HEALTH_THRESHOLD, IMAGE_SIZE,
+    GEMINI_API_KEY, CONFIDENCE_THRESHOLD, # Import the Gemini API key and CONFIDENCE_THRESHOLD
+    BATCH_MAX_SIZE, BATCH_WINDOW_MS, QUEUE_MAX_SIZE, QUEUE_MAX_WAIT_SECONDS,
+    QUEUE_LANE_WEIGHTS, QUEUE_LANE_MAX_IN_FLIGHT,
+    INTERPRETER_POOL_SIZE, INTERPRETER_NUM_THREADS, INTERPRETER_BATCH_SIZES,
+    SYSTEM_MONITOR_INTERVAL, PREPROCESS_DRAFT_MODE,
+    PREDICTION_CACHE_SIZE, PREDICTION_CACHE_DIR, PREDICTION_CACHE_DISK_MAX_ENTRIES,
+    ENRICHMENT_TTL, ENRICHMENT_STALE_TTL, ENRICHMENT_FAILURE_BACKOFF, FAST_STARTUP, TFLITE_MODEL_PATHS
 )
 
 logger = logging.getLogger(__name__)
 
-# Configure Gemini API
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    logger.info("Gemini API configured successfully.")
-else:
+# tensorflow, google.generativeai and psutil are imported on first use so that a
+# TFLite-only server starts without paying for them.
+TFLITE_RUNTIMES = (  # (name, module, attribute path of the Interpreter class)
+    ('tflite_runtime', 'tflite_runtime.interpreter', 'Interpreter'),
+    ('ai_edge_litert', 'ai_edge_litert.interpreter', 'Interpreter'),
+    ('tensorflow', 'tensorflow', 'lite.Interpreter'),
+)
+tflite_interpreter_class = None
+tflite_runtime_name = None
+genai_module = None
+
+if not GEMINI_API_KEY:
     logger.warning("GEMINI_API_KEY not found. Gemini analysis will not be available.")
 
+def get_tflite_interpreter_class():
+    """Return the TFLite Interpreter class, preferring the interpreter-only runtimes."""
+    global tflite_interpreter_class, tflite_runtime_name
+    if tflite_interpreter_class is None:
+        for name, module_name, attribute_path in TFLITE_RUNTIMES:
+            try:
+                interpreter_class = importlib.import_module(module_name)
+            except ImportError:
+                continue
+            for attribute in attribute_path.split('.'):
+                interpreter_class = getattr(interpreter_class, attribute)
+            tflite_interpreter_class, tflite_runtime_name = interpreter_class, name
+            logger.info(f"Using TFLite interpreter from {name}")
+            break
+        else:
+            raise ImportError("No TFLite runtime found; install tflite-runtime, ai-edge-litert or tensorflow")
+    return tflite_interpreter_class
+
+def get_genai():
+    """Import and configure the Gemini client on first use."""
+    global genai_module
+    if genai_module is None:
+        import google.generativeai as genai # type: ignore
+        genai.configure(api_key=GEMINI_API_KEY)
+        logger.info("Gemini API configured successfully.")
+        genai_module = genai
+    return genai_module
+
+class StartupTimer:
+    """Wall-clock duration of each startup phase, reported on /status."""
+
+    def __init__(self):
+        self.created = time.time()
+        self.phases = OrderedDict()
+        self.ready_at = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.phases[name] = seconds
+        logger.info(f"⏱️ Startup phase '{name}' took {seconds:.2f}s")
+
+    def mark_ready(self):
+        self.ready_at = time.time()
+
+    def get_report(self):
+        try:
+            import psutil
+            process_started = psutil.Process().create_time()
+        except Exception:
+            process_started = self.created
+        return {
+            'fast_startup': FAST_STARTUP,
+            'tflite_runtime': tflite_runtime_name,
+            'phases_seconds': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            'ready': self.ready_at is not None,
+            'time_to_ready_seconds': round(self.ready_at - process_started, 3) if self.ready_at else None
+        }
+
+def build_gemini_prompt(disease_label: str) -> str:
+    return (
+        f"You are a professional crop analyst. Provide a detailed analysis for the crop disease "
+        f"'{disease_label}'. Your analysis should cover the following aspects:\n\n"
+        f"1. Why the disease is caused.\n"
+        f"2. Precautions to take to prevent or manage the disease.\n"
+        f"3. How to get rid of the disease (treatment methods).\n\n"
+        f"Please provide the information in clear, concise English."
+    )
+
 async def get_gemini_crop_analysis(disease_label: str) -> str:
     """
     Fetches detailed crop disease analysis from the Gemini API.
@@ -36,15 +129,8 @@ async def get_gemini_crop_analysis(disease_label: str) -> str:
         return "Gemini API key not configured. Detailed analysis not available."
 
     try:
-        model = genai.GenerativeModel('gemini-pro')
-        prompt = (
-            f"You are a professional crop analyst. Provide a detailed analysis for the crop disease "
-            f"'{disease_label}'. Your analysis should cover the following aspects:\n\n"
-            f"1. Why the disease is caused.\n"
-            f"2. Precautions to take to prevent or manage the disease.\n"
-            f"3. How to get rid of the disease (treatment methods).\n\n"
-            f"Please provide the information in clear, concise English."
-        )
+        model = get_genai().GenerativeModel('gemini-pro')
+        prompt = build_gemini_prompt(disease_label)
         
         logger.info(f"Sending prompt to Gemini for disease: {disease_label}")
         response = await model.generate_content_async(prompt)
@@ -61,54 +147,220 @@ async def get_gemini_crop_analysis(disease_label: str) -> str:
         logger.error(f"Error fetching Gemini analysis for '{disease_label}': {e}")
         return f"Error fetching detailed analysis: {e}"
 
-class RateLimiter:
-    """Simple rate limiter for user requests"""
-    
-    def __init__(self):
-        self.user_requests = defaultdict(deque)
+def fetch_gemini_crop_analysis(disease_label: str) -> str:
+    """
+    Blocking variant of get_gemini_crop_analysis for background refreshes.
+    API errors are raised instead of returned as text so they are not cached.
+    """
+    if not GEMINI_API_KEY:
+        return "Gemini API key not configured. Detailed analysis not available."
+
+    model = get_genai().GenerativeModel('gemini-pro')
+    logger.info(f"Sending prompt to Gemini for disease: {disease_label}")
+    response = model.generate_content(build_gemini_prompt(disease_label))
+
+    if response and response.candidates:
+        logger.info(f"Received Gemini analysis for {disease_label}")
+        return response.candidates[0].content.parts[0].text
+    logger.warning(f"No content received from Gemini for disease: {disease_label}")
+    return "No detailed analysis available from Gemini for this disease."
+
+class EnrichmentCache:
+    """Per-(label, language) cache for slow, almost static enrichment text.
+
+    Entries younger than ``ttl`` are served directly. Older entries are still served
+    until ``stale_ttl`` while a background refresh runs (stale-while-revalidate). Only a
+    missing or fully expired entry makes the caller wait, and concurrent waiters share
+    one load. ``loader(label, language)`` runs on a small thread pool. After a load
+    fails, the key is not loaded again for ``failure_backoff`` seconds: callers get the
+    old value if there is one, else the failure, so a failing source is not called at
+    the request rate.
+    """
+    def __init__(self, loader, ttl=ENRICHMENT_TTL, stale_ttl=ENRICHMENT_STALE_TTL, max_workers=2,
+                 failure_backoff=ENRICHMENT_FAILURE_BACKOFF):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.failure_backoff = failure_backoff
+        self.entries = {}  # (label, language) -> (value, loaded_at)
+        self.refreshing = {}  # (label, language) -> Future
+        self.failures = {}  # (label, language) -> (exception, failed_at) of the last failed load
         self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='enrichment')
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_failures = 0
+        self.backed_off = 0
 
-    def is_allowed(self, user_id):
-        """Check if user is within rate limit"""
-        current_time = time.time()
-        
+    def peek(self, label, language):
+        """Return the cached value regardless of age, without triggering a refresh."""
         with self.lock:
-            # Clean old requests
-            while self.user_requests[user_id] and self.user_requests[user_id][0] < current_time - RATE_LIMIT_WINDOW:
-                self.user_requests[user_id].popleft()
-            
-            # Check if under limit
-            if len(self.user_requests[user_id]) >= RATE_LIMIT_REQUESTS:
-                return False
-            
-            # Add current request
-            self.user_requests[user_id].append(current_time)
-            return True
-    
-    def get_remaining_requests(self, user_id):
-        """Get remaining requests for user"""
-        current_time = time.time()
-        
+            entry = self.entries.get((label, language))
+        return entry[0] if entry else None
+
+    def get(self, label, language, timeout=None, wait=True):
+        """Return the value for (label, language).
+
+        With wait=False a missing or expired entry returns None immediately (a refresh
+        is still scheduled), so the caller never blocks on the loader.
+        """
+        key = (label, language)
+        now = time.monotonic()
         with self.lock:
-            # Clean old requests
-            while self.user_requests[user_id] and self.user_requests[user_id][0] < current_time - RATE_LIMIT_WINDOW:
-                self.user_requests[user_id].popleft()
-            
-            return max(0, RATE_LIMIT_REQUESTS - len(self.user_requests[user_id]))
+            entry = self.entries.get(key)
+            age = now - entry[1] if entry else None
+            if entry and age < self.ttl:
+                self.hits += 1
+                return entry[0]
+            failure = self.failures.get(key)
+            if failure and now - failure[1] < self.failure_backoff:
+                self.backed_off += 1
+                if entry:
+                    return entry[0]
+                if not wait:
+                    return None
+                raise failure[0]
+            future = self._schedule_refresh(key)
+            if entry and age < self.stale_ttl:
+                self.stale_hits += 1
+                return entry[0]
+            self.misses += 1
+
+        if not wait:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            if entry:
+                return entry[0]  # expired, but better than nothing while the source is failing
+            raise
+
+    def warm(self, labels, languages):
+        """Fill the cache in the background. Languages load in order, so later ones can reuse earlier ones."""
+        for label in labels:
+            self.executor.submit(self._warm_label, label, list(languages))
+
+    def _warm_label(self, label, languages):
+        for language in languages:
+            key = (label, language)
+            with self.lock:
+                if key in self.entries or key in self.refreshing:
+                    continue
+                future = self.refreshing[key] = Future()
+            self._load(key, future)
+
+    def _schedule_refresh(self, key):
+        # Caller holds self.lock
+        future = self.refreshing.get(key)
+        if future is None:
+            future = self.refreshing[key] = Future()
+            self.executor.submit(self._load, key, future)
+        return future
+
+    def _load(self, key, future):
+        try:
+            value = self.loader(*key)
+            with self.lock:
+                self.entries[key] = (value, time.monotonic())
+                self.refreshing.pop(key, None)
+                self.failures.pop(key, None)
+            future.set_result(value)
+        except Exception as e:
+            logger.warning(f"Enrichment refresh failed for {key}: {e}")
+            with self.lock:
+                self.refresh_failures += 1
+                self.refreshing.pop(key, None)
+                self.failures[key] = (e, time.monotonic())
+            future.set_exception(e)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'refreshing': len(self.refreshing),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refresh_failures': self.refresh_failures,
+                'backed_off': self.backed_off,
+                'failure_backoff_seconds': self.failure_backoff,
+                'ttl_seconds': self.ttl,
+                'stale_ttl_seconds': self.stale_ttl
+            }
+
+class QueueFullError(Exception):
+    """A request was not admitted to the inference queue; retry_after is in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 class MLQueueManager:
-    """Manages the request queue and processing lock for ML tasks."""
-    def __init__(self):
-        self.request_queue = deque()
+    """Manages the request queue and processing lock for ML tasks.
+
+    Once started with a batch function, a scheduler thread drains the queue in
+    micro-batches: it waits for the first request, keeps gathering for up to
+    ``batch_window`` seconds or ``max_batch_size`` requests, runs the batch function
+    once and resolves each caller's future with its own result.
+
+    Requests wait in priority lanes (``lane_weights``, the first lane is the default)
+    served by start-time fair queueing: each request is tagged with the virtual time
+    at which its lane may start it, ``1 / weight`` after the lane's previous request,
+    and batches take the smallest tags first. Backlogged lanes share the batch slots in
+    proportion to their weights, and a lane alone gets all of them.
+
+    Each lane is bounded: submit() raises QueueFullError when ``max_queue_size``
+    requests are waiting in it, or when its estimated wait, from its depth, its share
+    and an EWMA of the time per processed request, exceeds ``max_wait`` seconds.
+    Requests are admitted with enter() before their image is decoded, which also caps
+    the requests of a lane in flight at once (``max_in_flight``) while another lane has
+    requests in flight, so that e.g. bulk uploads cannot take the CPU that decoding
+    interactive requests needs but still use all of an otherwise idle server.
+    """
+    SERVICE_TIME_ALPHA = 0.2  # weight of the newest batch in the per-request service time
+
+    def __init__(self, max_batch_size=BATCH_MAX_SIZE, batch_window=BATCH_WINDOW_MS / 1000.0,
+                 max_queue_size=QUEUE_MAX_SIZE, max_wait=QUEUE_MAX_WAIT_SECONDS, lane_weights=QUEUE_LANE_WEIGHTS,
+                 max_in_flight=QUEUE_LANE_MAX_IN_FLIGHT):
+        self.lane_weights = dict(lane_weights) or {'interactive': 1.0}
+        self.default_lane = next(iter(self.lane_weights))
+        self.lanes = {lane: deque() for lane in self.lane_weights}
+        self.lane_finish = dict.fromkeys(self.lane_weights, 0.0)  # virtual finish tag of each lane's last request
+        self.virtual_time = 0.0
+        self.queued = 0
         self.queue_lock = threading.Lock()
+        self.queue_not_empty = threading.Condition(self.queue_lock)
         self.processing_lock = threading.Lock()
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = max(0.0, batch_window)
+        self.max_queue_size = max(0, max_queue_size)
+        self.max_wait = max(0.0, max_wait)
+        self.batch_fn = None
+        self.on_queue_change = None
+        self.workers = []
+        self.num_workers = 0
+        self.workers_started = 0
+        self.active_batches = 0
+        self.batches_processed = 0
+        self.items_processed = 0
+        self.item_seconds = None  # EWMA of batch time / batch size
+        self.rejected = dict.fromkeys(self.lane_weights, 0)
+        self.max_in_flight = {lane: limit for lane, limit in max_in_flight.items() if lane in self.lanes and limit > 0}
+        self.in_flight = dict.fromkeys(self.lane_weights, 0)
+
+    def lane_for(self, priority):
+        """The lane for a requested priority; unknown or missing values get the default lane."""
+        return priority if priority in self.lanes else self.default_lane
 
     def get_queue_size(self):
         with self.queue_lock:
-            return len(self.request_queue)
+            return self.queued
 
     def is_processing_locked(self):
-        return self.processing_lock.locked()
+        with self.queue_lock:
+            active_batches = self.active_batches
+        return self.processing_lock.locked() or active_batches > 0
 
     def acquire_processing_lock(self):
         return self.processing_lock.acquire()
@@ -116,44 +368,612 @@ class MLQueueManager:
     def release_processing_lock(self):
         self.processing_lock.release()
 
-class SystemMonitor:
-    """Monitor system resources"""
-    
+    def start(self, batch_fn, num_workers=1, on_queue_change=None):
+        """Start the batching scheduler. batch_fn maps a list of inputs to a list of results.
+
+        With num_workers > 1 several batches run concurrently, e.g. one per pooled interpreter.
+        on_queue_change(depths, waits) is called after every submit and dequeue with the depth
+        of each lane and the (lane, seconds) waits of the dequeued requests, e.g. to export
+        them as metrics.
+        """
+        with self.queue_lock:
+            self.batch_fn = batch_fn
+            self.on_queue_change = on_queue_change
+        self.set_workers(num_workers)
+        logger.info(f"Batch scheduler started: workers={len(self.workers)}, max_batch_size={self.max_batch_size}, "
+                    f"window={self.batch_window * 1000:.1f}ms, lanes={self.lane_weights}")
+
+    def set_workers(self, num_workers):
+        """Run up to ``num_workers`` batches concurrently, e.g. after activating a model with a different pool size.
+
+        New workers start at once; surplus ones exit before taking their next batch.
+        """
+        with self.queue_lock:
+            self.num_workers = max(1, num_workers)
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            while len(self.workers) < self.num_workers:
+                worker = threading.Thread(target=self._run, name=f'ml-batch-scheduler-{self.workers_started}', daemon=True)
+                self.workers_started += 1
+                worker.start()
+                self.workers.append(worker)
+            self.queue_not_empty.notify_all()  # wake idle workers so surplus ones exit
+
+    def estimate_wait(self, lane, depth):
+        """Seconds for ``lane`` to process ``depth`` requests at the measured rate, or None before the first batch.
+
+        The lane gets its weight's share of the rate among the lanes that have requests waiting.
+        """
+        if self.item_seconds is None:
+            return None
+        weights = sum(weight for other, weight in self.lane_weights.items() if other == lane or self.lanes[other])
+        share = self.lane_weights[lane] / weights if weights else 1.0
+        return depth * self.item_seconds / max(1, len(self.workers)) / share
+
+    def _admission_error(self, lane):
+        """QueueFullError if a request for ``lane`` is not admitted now, else None. Call under queue_lock."""
+        depth = len(self.lanes[lane])
+        wait = self.estimate_wait(lane, depth + 1)
+        if ((not self.max_queue_size or depth < self.max_queue_size) and
+                (not self.max_wait or wait is None or wait <= self.max_wait)):
+            return None
+        self.rejected[lane] += 1
+        # Until a batch has been timed there is no rate to go by; one second is a guess
+        return QueueFullError(f"Inference queue '{lane}' full ({depth} waiting)",
+                              retry_after=wait if wait is not None else 1.0)
+
+    def enter(self, lane=None):
+        """Admit a request to ``lane`` before any work is spent on it; every admitted request must leave().
+
+        Raises QueueFullError if the lane's queue is full, or if its in-flight limit is
+        reached while requests of other lanes are in flight.
+        """
+        lane = self.lane_for(lane)
+        with self.queue_lock:
+            error = self._admission_error(lane)
+            limit = self.max_in_flight.get(lane)
+            contended = any(count for other, count in self.in_flight.items() if other != lane)
+            if error is None and limit is not None and contended and self.in_flight[lane] >= limit:
+                self.rejected[lane] += 1
+                wait = self.estimate_wait(lane, self.in_flight[lane])
+                error = QueueFullError(f"Too many '{lane}' requests in progress ({limit})",
+                                       retry_after=wait if wait is not None else 1.0)
+            if error is None:
+                self.in_flight[lane] += 1
+        if error:
+            raise error
+
+    def leave(self, lane=None):
+        with self.queue_lock:
+            self.in_flight[self.lane_for(lane)] -= 1
+
+    def submit(self, item, lane=None):
+        """Queue an input for batched processing in ``lane`` and return a Future for its result.
+
+        Raises QueueFullError if the request is not admitted.
+        """
+        lane = self.lane_for(lane)
+        future = Future()
+        with self.queue_not_empty:
+            error = self._admission_error(lane)
+            if error is None:
+                start_tag = max(self.virtual_time, self.lane_finish[lane])
+                self.lane_finish[lane] = start_tag + 1.0 / self.lane_weights[lane]
+                self.lanes[lane].append((item, future, time.monotonic(), lane, start_tag))
+                self.queued += 1
+                self.queue_not_empty.notify()
+                depths = {name: len(queue) for name, queue in self.lanes.items()}
+        if error:
+            raise error
+        if self.on_queue_change:
+            self.on_queue_change(depths, ())
+        return future
+
+    def get_admission_stats(self):
+        with self.queue_lock:
+            item_seconds = self.item_seconds
+            lanes = {
+                lane: {
+                    'weight': weight,
+                    'size': len(self.lanes[lane]),
+                    'in_flight': self.in_flight[lane],
+                    'max_in_flight': self.max_in_flight.get(lane),
+                    'estimated_wait_seconds': self.estimate_wait(lane, len(self.lanes[lane])),
+                    'rejected': self.rejected[lane]
+                }
+                for lane, weight in self.lane_weights.items()
+            }
+        return {
+            'max_queue_size': self.max_queue_size,
+            'max_wait_seconds': self.max_wait,
+            'service_rate_per_second': max(1, len(self.workers)) / item_seconds if item_seconds else None,
+            'lanes': lanes
+        }
+
+    def get_batch_stats(self):
+        with self.queue_lock:
+            batches, items = self.batches_processed, self.items_processed
+        return {
+            'workers': len(self.workers),
+            'max_batch_size': self.max_batch_size,
+            'window_ms': self.batch_window * 1000,
+            'batches_processed': batches,
+            'items_processed': items,
+            'avg_batch_size': items / batches if batches else 0.0
+        }
+
+    def _next_batch(self):
+        """Block until work arrives, then gather up to max_batch_size items within the window.
+
+        Items are taken in start tag order across lanes. Returns the (item, future,
+        enqueued_at, lane, start_tag) entries and the depth of each lane afterwards, or
+        None if this worker is surplus after set_workers() and should exit.
+        """
+        with self.queue_not_empty:
+            while True:
+                if len(self.workers) > self.num_workers and threading.current_thread() in self.workers:
+                    self.workers.remove(threading.current_thread())
+                    return None
+                if self.queued:
+                    break
+                self.queue_not_empty.wait()
+
+            deadline = time.monotonic() + self.batch_window
+            while self.queued < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.queue_not_empty.wait(remaining)
+
+            entries = []
+            while self.queued and len(entries) < self.max_batch_size:
+                lane = min((queue for queue in self.lanes.values() if queue), key=lambda queue: queue[0][4])
+                entry = lane.popleft()
+                self.virtual_time = max(self.virtual_time, entry[4])
+                self.queued -= 1
+                entries.append(entry)
+            return entries, {name: len(queue) for name, queue in self.lanes.items()}
+
+    def _run(self):
+        while True:
+            next_batch = self._next_batch()
+            if next_batch is None:
+                return
+            entries, depths = next_batch
+            now = time.monotonic()
+            if self.on_queue_change:
+                self.on_queue_change(depths, [(lane, now - enqueued) for _, _, enqueued, lane, _ in entries])
+            batch = [(item, future) for item, future, _, _, _ in entries if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            with self.queue_lock:
+                self.active_batches += 1
+            succeeded = False
+            started = time.perf_counter()
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} requests")
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+                succeeded = True
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(items)} requests: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            item_seconds = (time.perf_counter() - started) / len(items)
+
+            with self.queue_lock:
+                self.active_batches -= 1
+                self.batches_processed += 1
+                self.items_processed += len(items)
+                if succeeded:
+                    self.item_seconds = item_seconds if self.item_seconds is None else (
+                        self.SERVICE_TIME_ALPHA * item_seconds + (1 - self.SERVICE_TIME_ALPHA) * self.item_seconds)
+
+class InterpreterPool:
+    """Pool of TFLite interpreters built from one model buffer.
+
+    A TFLite Interpreter is not thread-safe, so each request checks one out for the
+    duration of set_tensor/invoke/get_tensor instead of sharing a single instance.
+    run() pads each batch to the next of ``batch_sizes`` and each pooled slot keeps one
+    interpreter allocated per size, built on first use, so tensors are never resized
+    and reallocated and a slot holds at most len(batch_sizes) tensor arenas.
+    """
+    def __init__(self, model_content, pool_size=INTERPRETER_POOL_SIZE, num_threads=INTERPRETER_NUM_THREADS,
+                 batch_sizes=INTERPRETER_BATCH_SIZES):
+        self.model_content = model_content
+        self.batch_sizes = sorted(set(batch_sizes))
+        self.pool_size = max(1, pool_size)
+        self.num_threads = max(1, num_threads)
+        self.interpreter_class = get_tflite_interpreter_class()
+        self.interpreters = []  # the interpreter of each slot at the model's own input shape
+        self.available = queue.LifoQueue()  # LIFO reuses the most recently used (cache-warm) slot
+        self.stats_lock = threading.Lock()
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.allocations = 0
+
+        for _ in range(self.pool_size):
+            interpreter = self._build_interpreter()
+            self.interpreters.append(interpreter)
+            # batch size -> interpreter allocated for it; None is the model's own shape
+            self.available.put({None: interpreter, int(interpreter.get_input_details()[0]['shape'][0]): interpreter})
+
+    def _build_interpreter(self, batch_size=None):
+        interpreter = self.interpreter_class(model_content=self.model_content, num_threads=self.num_threads)
+        if batch_size is not None:
+            input_details = interpreter.get_input_details()[0]
+            interpreter.resize_tensor_input(input_details['index'], [batch_size] + list(input_details['shape'][1:]))
+        interpreter.allocate_tensors()
+        with self.stats_lock:
+            self.allocations += 1
+        return interpreter
+
+    @contextmanager
+    def checkout(self, timeout=None, batch_size=None):
+        """Borrow an interpreter for exclusive use, waiting if all are busy.
+
+        With ``batch_size`` it is one whose input is allocated for batches of that size.
+        """
+        try:
+            slot = self.available.get_nowait()
+        except queue.Empty:
+            with self.stats_lock:
+                self.waits += 1
+            slot = self.available.get(timeout=timeout)
+
+        with self.stats_lock:
+            self.in_use += 1
+            self.checkouts += 1
+        try:
+            if batch_size not in slot:
+                slot[batch_size] = self._build_interpreter(batch_size)
+            yield slot[batch_size]
+        finally:
+            with self.stats_lock:
+                self.in_use -= 1
+            self.available.put(slot)
+
+    def run(self, batch):
+        """invoke_tflite over ``batch`` zero-padded to the next allocated batch size; returns the unpadded outputs.
+
+        Batches larger than the largest size run in chunks of it.
+        """
+        size = len(batch)
+        padded_size = next((batch_size for batch_size in self.batch_sizes if batch_size >= size), None)
+        if padded_size is None:
+            step = self.batch_sizes[-1]
+            chunks = [self.run(batch[start:start + step]) for start in range(0, size, step)]
+            return [np.concatenate(outputs) for outputs in zip(*chunks)]
+        if padded_size > size:
+            batch = np.concatenate([batch, np.zeros((padded_size - size,) + batch.shape[1:], dtype=batch.dtype)])
+        with self.checkout(batch_size=padded_size) as interpreter:
+            outputs = invoke_tflite(interpreter, batch)
+        return [output[:size] for output in outputs]
+
+    def get_input_details(self):
+        return self.interpreters[0].get_input_details()
+
+    def get_output_details(self):
+        return self.interpreters[0].get_output_details()
+
+    def get_stats(self):
+        with self.stats_lock:
+            return {
+                'size': self.pool_size,
+                'threads_per_interpreter': self.num_threads,
+                'in_use': self.in_use,
+                'available': self.pool_size - self.in_use,
+                'total_checkouts': self.checkouts,
+                'checkouts_waited': self.waits,
+                'batch_sizes': self.batch_sizes,
+                'tensor_allocations': self.allocations
+            }
+
+class PredictionCache:
+    """Bounded LRU cache of prediction results keyed by image content hash and model version.
+
+    Concurrent requests for the same key are coalesced (singleflight): the first caller
+    computes the result and the others wait on its future. With a cache directory
+    configured, results are also stored in SQLite so they survive worker recycling and
+    are shared between the workers on a host.
+    """
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, cache_dir=PREDICTION_CACHE_DIR,
+                 disk_max_entries=PREDICTION_CACHE_DISK_MAX_ENTRIES):
+        self.max_entries = max(0, max_entries)
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+        self.disk = None
+        self.disk_lock = threading.Lock()
+        self.disk_max_entries = disk_max_entries
+        self.disk_writes = 0
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                self.disk = sqlite3.connect(os.path.join(cache_dir, 'prediction_cache.db'), timeout=1.0, check_same_thread=False)
+                self.disk.execute('PRAGMA journal_mode=WAL')
+                self.disk.execute('CREATE TABLE IF NOT EXISTS prediction_cache (key TEXT PRIMARY KEY, result TEXT, created_at REAL)')
+                self.disk.commit()
+                logger.info(f"Prediction cache disk tier enabled at {cache_dir}")
+            except sqlite3.Error as e:
+                logger.error(f"Could not open prediction cache in {cache_dir}: {e}. Using memory only.")
+                self.disk = None
+
     @staticmethod
-    def get_memory_usage():
-        """Get current memory usage percentage"""
+    def make_key(image_bytes, model_version):
+        return f"{hashlib.blake2b(image_bytes, digest_size=16).hexdigest()}:{model_version}"
+
+    def get_or_compute(self, key, compute, timeout=None):
+        """Return (result, source) where source is 'memory', 'disk', 'coalesced' or 'model'.
+
+        The result is a shallow copy, so callers may add their own top-level fields.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return dict(self.entries[key]), 'memory'
+            future = self.in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self.in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            return dict(future.result(timeout=timeout)), 'coalesced'
+
         try:
-            memory = psutil.virtual_memory()
+            result = self._disk_get(key)
+            source = 'disk' if result is not None else 'model'
+            if result is None:
+                result = compute()
+                self._disk_put(key, result)
+            with self.lock:
+                if source == 'disk':
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                if self.max_entries:
+                    self.entries[key] = result
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            future.set_result(result)
+            return dict(result), source
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def _disk_get(self, key):
+        if self.disk is None:
+            return None
+        try:
+            with self.disk_lock:
+                row = self.disk.execute('SELECT result FROM prediction_cache WHERE key = ?', (key,)).fetchone()
+            return json.loads(row[0]) if row else None
+        except sqlite3.Error as e:
+            logger.warning(f"Prediction cache disk read failed: {e}")
+            return None
+
+    def _disk_put(self, key, result):
+        if self.disk is None:
+            return
+        try:
+            with self.disk_lock:
+                self.disk.execute('INSERT OR REPLACE INTO prediction_cache (key, result, created_at) VALUES (?, ?, ?)',
+                                  (key, json.dumps(result), time.time()))
+                self.disk_writes += 1
+                # Trim the oldest rows now and then rather than on every write
+                if self.disk_writes % 100 == 0:
+                    self.disk.execute('DELETE FROM prediction_cache WHERE key IN (SELECT key FROM prediction_cache '
+                                      'ORDER BY created_at DESC LIMIT -1 OFFSET ?)', (self.disk_max_entries,))
+                self.disk.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Prediction cache disk write failed: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.coalesced + self.misses
             return {
-                'used_percent': memory.percent,
-                'used_mb': memory.used / 1024 / 1024,
-                'total_mb': memory.total / 1024 / 1024
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'disk_enabled': self.disk is not None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits + self.coalesced) / lookups if lookups else 0.0,
+                'in_flight': len(self.in_flight)
             }
-        except Exception as e:
-            logger.error(f"Error getting memory usage: {e}")
-            return {'used_percent': 0, 'used_mb': 0, 'total_mb': 0}
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+def read_cgroup_value(*parts):
+    """Read a single value from a cgroup control file, or None if it is missing."""
+    try:
+        with open(os.path.join(CGROUP_ROOT, *parts), 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def read_cgroup_stat(*parts):
+    """Read a flat-keyed cgroup stat file (e.g. memory.stat) into a dict of ints."""
+    content = read_cgroup_value(*parts)
+    stats = {}
+    for line in (content or '').splitlines():
+        key, _, value = line.partition(' ')
+        if value.isdigit():
+            stats[key] = int(value)
+    return stats
+
+class SystemMonitor:
+    """Monitor system resources.
+
+    A daemon thread refreshes a CPU/memory snapshot every ``interval`` seconds, so the
+    getters below are O(1) reads instead of blocking on psutil.cpu_percent(interval=1).
+    When the process runs under a cgroup (Docker/Kubernetes) the container's CPU quota
+    and memory limit are used instead of whole-node figures.
+    """
     
+    def __init__(self, interval=SYSTEM_MONITOR_INTERVAL):
+        self.interval = max(0.1, interval)
+        self.snapshot_lock = threading.Lock()
+        self.snapshot = {
+            'cpu_percent': 0.0,
+            'memory': {'used_percent': 0, 'used_mb': 0, 'total_mb': 0},
+            'source': 'host',
+            'timestamp': 0.0
+        }
+        self.cgroup_version = self._detect_cgroup_version()
+        self.last_cpu_usage = None  # (cgroup cpu usage in seconds, monotonic time)
+        self.sampler = None
+        self.start()
+
+    def start(self):
+        """Take an initial sample and start the background sampler thread."""
+        if self.sampler is not None and self.sampler.is_alive():
+            return
+        import psutil
+        psutil.cpu_percent(interval=None)  # prime psutil's non-blocking counter
+        self.sample()
+        self.sampler = threading.Thread(target=self._run, name='system-monitor', daemon=True)
+        self.sampler.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
     @staticmethod
-    def get_cpu_usage():
-        """Get current CPU usage percentage"""
+    def _detect_cgroup_version():
+        if read_cgroup_value('cgroup.controllers') is not None:
+            return 2
+        if read_cgroup_value('cpuacct', 'cpuacct.usage') is not None:
+            return 1
+        return None
+
+    def _cgroup_cpu_limit(self):
+        """Number of CPUs the container may use, falling back to the host CPU count."""
+        host_cpus = os.cpu_count() or 1
+        if self.cgroup_version == 2:
+            quota, _, period = (read_cgroup_value('cpu.max') or 'max').partition(' ')
+            if quota != 'max' and period:
+                return min(host_cpus, int(quota) / int(period))
+        elif self.cgroup_version == 1:
+            quota = read_cgroup_value('cpu', 'cpu.cfs_quota_us')
+            period = read_cgroup_value('cpu', 'cpu.cfs_period_us')
+            if quota and period and int(quota) > 0:
+                return min(host_cpus, int(quota) / int(period))
+        return host_cpus
+
+    def _cgroup_cpu_seconds(self):
+        if self.cgroup_version == 2:
+            usage_usec = read_cgroup_stat('cpu.stat').get('usage_usec')
+            return usage_usec / 1e6 if usage_usec is not None else None
+        usage_ns = read_cgroup_value('cpuacct', 'cpuacct.usage')
+        return int(usage_ns) / 1e9 if usage_ns else None
+
+    def _sample_cpu(self):
+        if self.cgroup_version:
+            usage = self._cgroup_cpu_seconds()
+            now = time.monotonic()
+            if usage is not None:
+                previous, self.last_cpu_usage = self.last_cpu_usage, (usage, now)
+                if previous is None or now <= previous[1]:
+                    return 0.0
+                busy_cpus = (usage - previous[0]) / (now - previous[1])
+                return min(100.0, 100.0 * busy_cpus / self._cgroup_cpu_limit())
+        import psutil
+        return psutil.cpu_percent(interval=None)
+
+    def _sample_memory(self):
+        import psutil
+        host_total = psutil.virtual_memory().total
+        if self.cgroup_version == 2:
+            usage, limit = read_cgroup_value('memory.current'), read_cgroup_value('memory.max')
+            inactive_file = read_cgroup_stat('memory.stat').get('inactive_file', 0)
+        elif self.cgroup_version == 1:
+            usage = read_cgroup_value('memory', 'memory.usage_in_bytes')
+            limit = read_cgroup_value('memory', 'memory.limit_in_bytes')
+            inactive_file = read_cgroup_stat('memory', 'memory.stat').get('total_inactive_file', 0)
+        else:
+            usage = limit = None
+
+        if usage and usage.isdigit():
+            # Working set (usage minus reclaimable page cache), as the kubelet reports it
+            used = max(0, int(usage) - inactive_file)
+            total = int(limit) if limit and limit.isdigit() and int(limit) < host_total else host_total
+        else:
+            memory = psutil.virtual_memory()
+            used, total = memory.used, memory.total
+
+        return {
+            'used_percent': 100.0 * used / total if total else 0,
+            'used_mb': used / 1024 / 1024,
+            'total_mb': total / 1024 / 1024
+        }
+
+    def sample(self):
+        """Refresh the cached snapshot. Called by the sampler thread."""
         try:
-            return psutil.cpu_percent(interval=1)
+            snapshot = {
+                'cpu_percent': self._sample_cpu(),
+                'memory': self._sample_memory(),
+                'source': f'cgroup_v{self.cgroup_version}' if self.cgroup_version else 'host',
+                'timestamp': time.time()
+            }
+            with self.snapshot_lock:
+                self.snapshot = snapshot
         except Exception as e:
-            logger.error(f"Error getting CPU usage: {e}")
-            return 0
+            logger.error(f"Error sampling system resources: {e}")
+
+    def get_snapshot(self):
+        """Latest resource snapshot, including its age in seconds"""
+        with self.snapshot_lock:
+            snapshot = dict(self.snapshot)
+        snapshot['age_seconds'] = time.time() - snapshot['timestamp']
+        return snapshot
     
-    @staticmethod
-    def is_system_healthy():
+    def get_memory_usage(self):
+        """Get current memory usage percentage"""
+        with self.snapshot_lock:
+            return dict(self.snapshot['memory'])
+    
+    def get_cpu_usage(self):
+        """Get current CPU usage percentage"""
+        with self.snapshot_lock:
+            return self.snapshot['cpu_percent']
+    
+    def is_memory_healthy(self):
+        """Check if memory usage is below MEMORY_HEALTH_THRESHOLD"""
+        with self.snapshot_lock:
+            return self.snapshot['memory']['used_percent'] < MEMORY_HEALTH_THRESHOLD
+
+    def is_system_healthy(self):
         """Check if system resources are healthy"""
-        memory_usage = SystemMonitor.get_memory_usage()['used_percent']
-        cpu_usage = SystemMonitor.get_cpu_usage()
+        with self.snapshot_lock:
+            memory_usage = self.snapshot['memory']['used_percent']
+            cpu_usage = self.snapshot['cpu_percent']
         
         return memory_usage < MEMORY_HEALTH_THRESHOLD and cpu_usage < CPU_HEALTH_THRESHOLD
 
-def load_labels():
-    """Load crop labels from file"""
+def load_labels(label_paths=LABEL_PATHS):
+    """Load crop labels from the first existing file in ``label_paths``"""
     try:
-        for path in LABEL_PATHS:
+        for path in label_paths:
             if os.path.exists(path):
                 with open(path, 'r') as f:
                     labels = [line.strip() for line in f.readlines()]
@@ -166,60 +986,128 @@ def load_labels():
         logger.error(f"Error loading labels: {e}. Returning empty list.")
         return []
 
-def preprocess_image(image_data):
-    """Preprocess image for model input"""
+def decode_base64_image(image_data):
+    """Decode a base64 image string, with or without a data URL prefix, to bytes."""
+    # Remove data URL prefix if present
+    if image_data.startswith('data:image'):
+        image_data = image_data.split(',')[1]
+    return base64.b64decode(image_data)
+
+# Per-thread input buffers reused across requests by preprocess_image
+preprocess_buffers = threading.local()
+
+def get_input_buffer(dtype=np.float32, size=IMAGE_SIZE):
+    """Return this thread's reusable (1, H, W, 3) model input buffer for the given dtype and (W, H) size."""
+    key = (np.dtype(dtype), tuple(size))
+    buffers = getattr(preprocess_buffers, 'by_dtype', None)
+    if buffers is None:
+        buffers = preprocess_buffers.by_dtype = {}
+    if key not in buffers:
+        buffers[key] = np.empty((1, size[1], size[0], 3), dtype=dtype)
+    return buffers[key]
+
+def get_model_input_size(model_or_interpreter, is_tflite_model):
+    """(width, height) a model expects, falling back to IMAGE_SIZE when it is not fixed."""
+    if is_tflite_model:
+        shape = model_or_interpreter.get_input_details()[0]['shape']
+    else:
+        shape = model_or_interpreter.input_shape
+    if len(shape) != 4 or not shape[1] or not shape[2] or shape[1] < 1:
+        return IMAGE_SIZE
+    return (int(shape[2]), int(shape[1]))
+
+def preprocess_image(image_data, draft=PREPROCESS_DRAFT_MODE, out=None, dtype=np.float32, size=IMAGE_SIZE):
+    """Preprocess image for model input.
+
+    ``size`` is the (width, height) the model expects, see get_model_input_size.
+    With ``draft`` enabled, JPEGs are decoded with DCT scaling close to ``size`` instead of
+    at full resolution. The result is written into ``out`` or, by default, into a per-thread
+    buffer that the next call on the same thread overwrites, so copy it if it must outlive
+    the request. float32 buffers are scaled to [0, 1]; uint8 buffers receive raw pixels.
+    """
     try:
-        # Handle both file upload (PIL Image object) and base64 string
+        # Handle file upload (PIL Image object), raw image bytes and base64 string
+        if isinstance(image_data, str):
+            with tracing.span('base64'):
+                image_data = decode_base64_image(image_data)
         if isinstance(image_data, Image.Image):
             image = image_data
-        elif isinstance(image_data, str):
-            # Remove data URL prefix if present
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
+        elif isinstance(image_data, bytes):
+            # BytesIO shares the bytes object's buffer instead of copying it
+            with tracing.span('open'):
+                image = Image.open(io.BytesIO(image_data))
         else:
-            raise ValueError("Unsupported image data type. Must be PIL Image or base64 string.")
-        
-        logger.info(f"Image loaded: {image.size} {image.mode}")
-        
-        # Convert to RGB if not already
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+            raise ValueError("Unsupported image data type. Must be PIL Image, bytes or base64 string.")
+        source_size, source_mode = image.size, image.mode
+
+        with tracing.span('pil_decode'):
+            # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding; must run before load()
+            if draft and image.format == 'JPEG':
+                image.draft('RGB', size)
+            image.load()
+            decoded_size = image.size
+            
+            # Convert to RGB if not already
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
 
         # Resize to model input size
-        image = image.resize(IMAGE_SIZE)
-        logger.info(f"Image resized to: {image.size}")
-        
-        # Convert to numpy array and normalize
-        image_array = np.array(image) / 255.0
+        with tracing.span('resize'):
+            image = image.resize(size)
         
-        # Add batch dimension
-        image_array = np.expand_dims(image_array, axis=0)
+        # Convert straight into the input buffer (batch dimension included) and normalize
+        with tracing.span('normalize'):
+            image_array = out if out is not None else get_input_buffer(dtype, size)
+            pixels = np.asarray(image, dtype=np.uint8)
+            if image_array.dtype == np.uint8:
+                image_array[0] = pixels
+            else:
+                np.multiply(pixels, image_array.dtype.type(1.0 / 255.0), out=image_array[0], casting='unsafe')
         
-        logger.info(f"Image preprocessed: shape={image_array.shape}, dtype={image_array.dtype}")
+        if structured_logging.is_verbose():
+            logger.info(f"Image preprocessed: {source_size} {source_mode}, decoded at {decoded_size}, "
+                        f"input shape={image_array.shape} dtype={image_array.dtype}")
         return image_array
         
     except Exception as e:
         logger.error(f"Error preprocessing image: {e}")
         raise
 
-def load_ml_model():
-    """Load the ML model from common paths and run warm-up inference."""
+def compute_model_version(model_path, model_content=None):
+    """Identify a model artifact by file name and content hash, e.g. 'best_model.h5@3f2a9c1b0d4e'."""
+    digest = hashlib.sha256()
+    if model_content is not None:
+        digest.update(model_content)
+    else:
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return f"{os.path.basename(model_path)}@{digest.hexdigest()[:12]}"
+
+def load_ml_model(model_paths=None):
+    """Load the ML model from common paths and run warm-up inference.
+
+    ``model_paths`` are tried in order and default to the configured paths.
+    Returns (model_or_interpreter, is_tflite, is_multitask, model_version).
+    """
     model = None
     interpreter = None
     is_tflite = False
     is_multitask = False
 
-    for model_path in MODEL_PATHS:
+    # In fast-startup mode TFLite models are tried first; .h5 paths remain as a fallback
+    # but pull in TensorFlow.
+    if model_paths is None:
+        model_paths = TFLITE_MODEL_PATHS + MODEL_PATHS if FAST_STARTUP else MODEL_PATHS
+
+    for model_path in model_paths:
         if os.path.exists(model_path):
             try:
                 logger.info(f"Attempting to load model from: {model_path}")
                 if model_path.endswith('.tflite'):
-                    interpreter = tflite.Interpreter(model_path=model_path)
-                    interpreter.allocate_tensors()
+                    with open(model_path, 'rb') as f:
+                        model_content = f.read()
+                    interpreter = InterpreterPool(model_content)
                     is_tflite = True
                     
                     # Check if it's a multitask model by examining output details
@@ -230,23 +1118,23 @@ def load_ml_model():
                     else:
                         logger.info(f"✅ Single-task TensorFlow Lite model loaded from {model_path}")
 
-                    # Warm-up for lower p95 latency
+                    # Warm-up every pooled interpreter for lower p95 latency
                     input_details = interpreter.get_input_details()
                     input_shape = input_details[0]['shape']
-                    interpreter.set_tensor(input_details[0]['index'], np.zeros(input_shape, dtype=np.float32))
-                    interpreter.invoke()
+                    for pooled in interpreter.interpreters:
+                        pooled.set_tensor(input_details[0]['index'], np.zeros(input_shape, dtype=input_details[0]['dtype']))
+                        pooled.invoke()
+                        for output in output_details:
+                            _ = pooled.get_tensor(output['index'])
                     
                     if is_multitask:
-                        # Warm up both outputs
-                        _ = interpreter.get_tensor(output_details[0]['index'])
-                        _ = interpreter.get_tensor(output_details[1]['index'])
-                        logger.info(f"✅ Multitask TensorFlow Lite model warmed up from {model_path}")
+                        logger.info(f"✅ Multitask TensorFlow Lite model warmed up from {model_path} ({interpreter.pool_size} interpreters x {interpreter.num_threads} threads)")
                     else:
-                        _ = interpreter.get_tensor(output_details[0]['index'])
-                        logger.info(f"✅ TensorFlow Lite model warmed up from {model_path}")
+                        logger.info(f"✅ TensorFlow Lite model warmed up from {model_path} ({interpreter.pool_size} interpreters x {interpreter.num_threads} threads)")
                     
-                    return interpreter, is_tflite, is_multitask
+                    return interpreter, is_tflite, is_multitask, compute_model_version(model_path, model_content)
                 else:
+                    import tensorflow as tf # type: ignore
                     model = tf.keras.models.load_model(model_path)
                     
                     # Check if it's a multitask model by examining output structure
@@ -256,133 +1144,178 @@ def load_ml_model():
                     else:
                         logger.info(f"✅ Single-task Keras model loaded from {model_path}")
                     
-                    # Warm-up for lower p95 latency
+                    # Warm-up for lower p95 latency, at the model's own input size
+                    input_width, input_height = get_model_input_size(model, False)
                     if is_multitask:
                         # Warm up multitask model
-                        warmup_input = np.zeros((1, IMAGE_SIZE[0], IMAGE_SIZE[1], 3), dtype=np.float32)
+                        warmup_input = np.zeros((1, input_height, input_width, 3), dtype=np.float32)
                         _ = model.predict(warmup_input, verbose=0)
                         logger.info(f"✅ Multitask Keras model warmed up from {model_path}")
                     else:
-                        _ = model.predict(np.zeros((1, IMAGE_SIZE[0], IMAGE_SIZE[1], 3), dtype=np.float32), verbose=0)
+                        _ = model.predict(np.zeros((1, input_height, input_width, 3), dtype=np.float32), verbose=0)
                         logger.info(f"✅ Keras model warmed up from {model_path}")
                     
-                    return model, is_tflite, is_multitask
+                    return model, is_tflite, is_multitask, compute_model_version(model_path)
             except Exception as e:
                 logger.error(f"Error loading model from {model_path}: {e}")
                 continue
     logger.error("❌ No valid model file found in known paths")
-    return None, False, False
+    return None, False, False, None
+
+def quantize_input(batch, input_detail):
+    """Map a float batch onto an integer input tensor using its (scale, zero_point); other dtypes are only cast."""
+    dtype = input_detail['dtype']
+    scale, zero_point = input_detail['quantization']
+    if not np.issubdtype(dtype, np.integer) or not scale:
+        return batch.astype(dtype, copy=False)
+    info = np.iinfo(dtype)
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+def dequantize_output(values, output_detail):
+    """Float values of an integer (full-integer quantized) output tensor."""
+    scale, zero_point = output_detail['quantization']
+    if not np.issubdtype(values.dtype, np.integer) or not scale:
+        return values
+    return (values.astype(np.float32) - zero_point) * np.float32(scale)
+
+def invoke_tflite(interpreter, batch):
+    """Run one TFLite interpreter over a (N, H, W, C) batch and return every output in output_details order."""
+    input_details = interpreter.get_input_details()
+    input_shape = tuple(input_details[0]['shape'])
+
+    if batch.shape != input_shape:
+        if batch.shape[1:] == input_shape[1:]:
+            # Only the batch dimension differs: resize the input tensor to the batch size
+            interpreter.resize_tensor_input(input_details[0]['index'], list(batch.shape))
+            interpreter.allocate_tensors()
+            input_details = interpreter.get_input_details()
+        else:
+            # This case should ideally not happen if preprocess_image is correct
+            # but as a safeguard, resize if shapes mismatch
+            logger.warning(f"Input batch shape {batch.shape} does not match TFLite input shape {input_shape}. Attempting to reshape.")
+            batch = np.resize(batch, input_shape)
+
+    # Full-integer models (tflite_conversion int8 mode with int8_io) take and return int8 tensors
+    interpreter.set_tensor(input_details[0]['index'], quantize_input(batch, input_details[0]))
+    interpreter.invoke()
+    return [dequantize_output(interpreter.get_tensor(output['index']), output) for output in interpreter.get_output_details()]
+
+def run_model_outputs(model_or_interpreter, batch, is_tflite_model):
+    """Run one forward pass and return all outputs: a list in output order for TFLite,
+    or whatever the Keras model returns (a dict for models with named outputs)."""
+    if is_tflite_model and isinstance(model_or_interpreter, InterpreterPool):
+        return model_or_interpreter.run(batch)
+    if is_tflite_model:
+        return invoke_tflite(model_or_interpreter, batch)
+    return model_or_interpreter.predict(batch, verbose=0)
+
+def run_model_inference(model_or_interpreter, batch, is_tflite_model, is_multitask_model=False):
+    """Run one forward pass over a preprocessed (N, H, W, C) batch.
+
+    Returns (class_predictions, reg_predictions); reg_predictions is None for single-task models.
+    """
+    predictions = run_model_outputs(model_or_interpreter, batch, is_tflite_model)
+    if is_tflite_model:
+        class_predictions = predictions[0]
+        reg_predictions = predictions[1] if is_multitask_model else None
+    elif is_multitask_model:
+        class_predictions = predictions['class_output']
+        reg_predictions = predictions['reg_output']
+    else:
+        class_predictions = predictions
+        reg_predictions = None
+
+    logger.debug(f"Model prediction completed: batch_size={len(batch)}, class_shape={class_predictions.shape}")
+    return class_predictions, reg_predictions
+
+def build_prediction_result(class_scores, reg_score, labels, is_multitask_model=False):
+    """Turn the model outputs for a single image into the /analyze_crop response fields."""
+    if is_multitask_model:
+        # Multitask model: use classification for class, regression for confidence
+        predicted_class_idx = np.argmax(class_scores)
+        class_confidence = np.max(class_scores)
+        reg_confidence = reg_score  # Regression confidence (0-100)
+
+        # Use regression confidence as primary, fallback to class confidence
+        confidence = reg_confidence / 100.0  # Convert to 0-1 range
+    else:
+        # Single output model: use max probability as confidence
+        predicted_class_idx = np.argmax(class_scores)
+        confidence = np.max(class_scores)
+
+    # Apply confidence threshold
+    if confidence < CONFIDENCE_THRESHOLD:
+        predicted_label = "Unknown"
+        is_healthy = False
+        predicted_class_idx = -1 # Indicate unknown class
+    else:
+        # Get the predicted label
+        predicted_label = labels[predicted_class_idx] if predicted_class_idx < len(labels) else "Unknown"
+
+        # Determine if crop is healthy (assuming labels ending with "Healthy" are healthy)
+        is_healthy = predicted_label.endswith("Healthy")
+
+    # Requests log one summary record with the label and confidence; the class scores
+    # are only logged for requests sampled for verbose diagnostics (see log_prediction)
+    if is_multitask_model:
+        return {
+            'prediction_class': int(predicted_class_idx),
+            'crop_type': predicted_label,
+            'confidence': float(confidence),
+            'is_healthy': is_healthy,
+            'all_predictions': class_scores.tolist(),
+            'regression_confidence': float(reg_confidence),
+            'class_confidence': float(class_confidence),
+            'model_type': 'multitask'
+        }
+    else:
+        return {
+            'prediction_class': int(predicted_class_idx),
+            'crop_type': predicted_label,
+            'confidence': float(confidence),
+            'is_healthy': is_healthy,
+            'all_predictions': class_scores.tolist(),
+            'model_type': 'single_task'
+        }
+
+def predict_batch(model_or_interpreter, image_arrays, labels, is_tflite_model, is_multitask_model=False, stage_timer=None):
+    """Run a single batched inference over preprocessed images and return one result per image.
+
+    ``stage_timer(name)``, if given, returns a context manager that times the 'invoke'
+    and 'postprocess' steps (see metrics.ServerMetrics.time_stage and tracing.span).
+    """
+    stage_timer = stage_timer or (lambda name: nullcontext())
+    with stage_timer('invoke'):
+        batch = np.concatenate(image_arrays, axis=0)
+        class_predictions, reg_predictions = run_model_inference(model_or_interpreter, batch, is_tflite_model, is_multitask_model)
+
+    results = []
+    offset = 0
+    with stage_timer('postprocess'):
+        for image_array in image_arrays:
+            # Each preprocessed image carries its own batch dimension (normally 1)
+            reg_score = reg_predictions[offset][0] if reg_predictions is not None else None
+            results.append(build_prediction_result(class_predictions[offset], reg_score, labels, is_multitask_model))
+            offset += len(image_array)
+    return results
+
+def log_prediction(result):
+    """Log the class scores behind a prediction, for requests sampled for verbose diagnostics."""
+    if structured_logging.is_verbose():
+        structured_logging.log_event(
+            logger, 'prediction_detail', label=result.get('crop_type'), confidence=result.get('confidence'),
+            regression_confidence=result.get('regression_confidence'), all_predictions=result.get('all_predictions'))
 
 def analyze_crop_prediction(model_or_interpreter, image_data, labels, is_tflite_model, is_multitask_model=False):
     """Analyze crop health using the loaded model or TFLite interpreter"""
     try:
-        logger.info("Starting crop analysis...")
-        
         # Preprocess the image
-        processed_image = preprocess_image(image_data)
-        logger.info("Image preprocessing completed")
+        with tracing.span('preprocess'):
+            processed_image = preprocess_image(image_data)
         
         # Make prediction
-        logger.info("Making model prediction...")
-        if is_tflite_model:
-            interpreter = model_or_interpreter
-            input_details = interpreter.get_input_details()
-            output_details = interpreter.get_output_details()
-
-            # Ensure input tensor has the correct type and shape
-            input_shape = input_details[0]['shape']
-            input_dtype = input_details[0]['dtype']
-            
-            # Resize processed_image to match input_shape if necessary (e.g., batch size)
-            # Assuming processed_image already has batch dimension (1, H, W, C)
-            if processed_image.shape != tuple(input_shape):
-                # This case should ideally not happen if preprocess_image is correct
-                # but as a safeguard, resize if shapes mismatch
-                logger.warning(f"Input image shape {processed_image.shape} does not match TFLite input shape {input_shape}. Attempting to reshape.")
-                processed_image = np.resize(processed_image, input_shape)
-
-            interpreter.set_tensor(input_details[0]['index'], processed_image.astype(input_dtype))
-            interpreter.invoke()
-            
-            if is_multitask_model:
-                # Handle multitask model with two outputs
-                class_predictions = interpreter.get_tensor(output_details[0]['index'])  # class_output
-                reg_predictions = interpreter.get_tensor(output_details[1]['index'])    # reg_output
-                logger.info(f"TFLite multitask model prediction completed: class_shape={class_predictions.shape}, reg_shape={reg_predictions.shape}")
-            else:
-                # Handle single output model
-                predictions = interpreter.get_tensor(output_details[0]['index'])
-                logger.info(f"TFLite model prediction completed: shape={predictions.shape}")
-        else:
-            model = model_or_interpreter
-            if is_multitask_model:
-                # Handle multitask Keras model
-                predictions = model.predict(processed_image, verbose=0)
-                class_predictions = predictions['class_output']
-                reg_predictions = predictions['reg_output']
-                logger.info(f"Keras multitask model prediction completed: class_shape={class_predictions.shape}, reg_shape={reg_predictions.shape}")
-            else:
-                # Handle single output Keras model
-                predictions = model.predict(processed_image, verbose=0)
-                logger.info(f"Keras model prediction completed: shape={predictions.shape}")
-        
-        # Process predictions based on model type
-        if is_multitask_model:
-            # Multitask model: use classification for class, regression for confidence
-            predicted_class_idx = np.argmax(class_predictions[0])
-            class_confidence = np.max(class_predictions[0])
-            reg_confidence = reg_predictions[0][0]  # Regression confidence (0-100)
-            
-            # Use regression confidence as primary, fallback to class confidence
-            confidence = reg_confidence / 100.0  # Convert to 0-1 range
-            logger.info(f"Multitask results: class_idx={predicted_class_idx}, class_conf={class_confidence:.4f}, reg_conf={reg_confidence:.2f}")
-        else:
-            # Single output model: use max probability as confidence
-            predicted_class_idx = np.argmax(predictions[0])
-            confidence = np.max(predictions[0])
-        
-        # Apply confidence threshold
-        if confidence < CONFIDENCE_THRESHOLD:
-            predicted_label = "Unknown"
-            is_healthy = False
-            predicted_class_idx = -1 # Indicate unknown class
-            logger.warning(f"Prediction confidence ({confidence:.4f}) below threshold ({CONFIDENCE_THRESHOLD:.4f}). Classified as 'Unknown'.")
-        else:
-            # Get the predicted label
-            predicted_label = labels[predicted_class_idx] if predicted_class_idx < len(labels) else "Unknown"
-            
-            # Determine if crop is healthy (assuming labels ending with "Healthy" are healthy)
-            is_healthy = predicted_label.endswith("Healthy")
-        
-        logger.info(f"Prediction results:")
-        logger.info(f"  - Predicted class: {predicted_class_idx}")
-        logger.info(f"  - Predicted label: {predicted_label}")
-        logger.info(f"  - Confidence: {confidence:.4f}")
-        logger.info(f"  - Is healthy: {is_healthy}")
-        
-        if is_multitask_model:
-            logger.info(f"  - Class predictions: {class_predictions[0].tolist()}")
-            logger.info(f"  - Regression confidence: {reg_confidence:.2f}")
-            return {
-                'prediction_class': int(predicted_class_idx),
-                'crop_type': predicted_label,
-                'confidence': float(confidence),
-                'is_healthy': is_healthy,
-                'all_predictions': class_predictions[0].tolist(),
-                'regression_confidence': float(reg_confidence),
-                'class_confidence': float(class_confidence),
-                'model_type': 'multitask'
-            }
-        else:
-            logger.info(f"  - All predictions: {predictions[0].tolist()}")
-            return {
-                'prediction_class': int(predicted_class_idx),
-                'crop_type': predicted_label,
-                'confidence': float(confidence),
-                'is_healthy': is_healthy,
-                'all_predictions': predictions[0].tolist(),
-                'model_type': 'single_task'
-            }
+        return predict_batch(model_or_interpreter, [processed_image], labels, is_tflite_model, is_multitask_model,
+                             stage_timer=tracing.span)[0]
         
     except Exception as e:
         logger.error(f"Error in crop analysis: {e}")
@@ -1,8 +1,7 @@
 from tensorflow.keras.applications import MobileNetV2 # type: ignore
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Lambda, BatchNormalization # type: ignore
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Activation, Rescaling, BatchNormalization # type: ignore
 from tensorflow.keras.models import Model # type: ignore
 from tensorflow.keras.regularizers import l2 # type: ignore
-import tensorflow as tf # type: ignore
 
 def build_multitask_model(num_classes):
     base = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
@@ -29,7 +28,9 @@ def build_multitask_model(num_classes):
         kernel_regularizer=l2(0.001)
     )(x)
 
-    reg_output = Lambda(lambda t: tf.keras.activations.sigmoid(t) * 100, name='reg_output')(reg_output_raw)
+    # sigmoid * 100 from builtin layers rather than a Lambda, so the TFLite graph needs no Flex ops
+    reg_output = Activation('sigmoid')(reg_output_raw)
+    reg_output = Rescaling(100.0, name='reg_output')(reg_output)
 
     model = Model(inputs=base.input, outputs={'class_output': class_output, 'reg_output': reg_output})
     return model
\ No newline at end of file
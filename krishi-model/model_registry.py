@@ -0,0 +1,162 @@
+"""
+Versioned model registry for Krishi Sahayak.
+
+Keeps up to MODEL_REGISTRY_MAX_VERSIONS loaded model versions side by side. A new
+artifact is loaded and warmed up on a background thread and then swapped in
+atomically; requests hold a handle to the version they started on, so in-flight
+requests finish on the old version while new ones go to the new one.
+"""
+
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from ml_utils import load_ml_model, get_model_input_size, InterpreterPool
+from config import MODEL_REGISTRY_MAX_VERSIONS
+
+logger = logging.getLogger(__name__)
+
+class ModelHandle:
+    """One loaded, warmed-up model version."""
+
+    def __init__(self, version, model, is_tflite, is_multitask, path):
+        self.version = version
+        self.model = model
+        self.is_tflite = is_tflite
+        self.is_multitask = is_multitask
+        self.path = path
+        # Requests are preprocessed straight to this (width, height)
+        self.input_size = getattr(model, 'input_size', None) or get_model_input_size(model, is_tflite)
+        self.loaded_at = time.time()
+        self.in_flight = 0  # requests currently holding this handle
+        self.requests = 0
+
+    def get_info(self):
+        return {
+            'version': self.version,
+            'path': self.path,
+            'is_tflite': self.is_tflite,
+            'is_multitask': self.is_multitask,
+            'input_size': list(self.input_size),
+            'loaded_at': self.loaded_at,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'interpreter_pool': self.model.get_stats() if isinstance(self.model, InterpreterPool) else None
+        }
+
+class ModelRegistry:
+    """Loaded model versions plus a pointer to the active one.
+
+    ``loader`` takes a list of candidate paths (or None for the configured ones) and
+    returns (model, is_tflite, is_multitask, version) like load_ml_model.
+    ``on_activate(handle)`` is called whenever a different version becomes active.
+    """
+
+    def __init__(self, loader=load_ml_model, max_versions=MODEL_REGISTRY_MAX_VERSIONS, on_activate=None):
+        self.loader_fn = loader
+        self.on_activate = on_activate
+        self.max_versions = max(1, max_versions)
+        self.lock = threading.Lock()
+        self.versions = OrderedDict()  # version -> ModelHandle, least recently activated first
+        self.active = None
+        self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+        self.loading = None  # path being loaded in the background
+        self.last_error = None
+
+    def load(self, model_path=None, activate=True):
+        """Load and warm up a model, optionally making it active.
+
+        With no ``model_path`` the configured paths are searched. Returns the handle,
+        or None if nothing could be loaded.
+        """
+        model, is_tflite, is_multitask, version = self.loader_fn([model_path] if model_path else None)
+        if model is None:
+            self.last_error = f"No loadable model at {model_path or 'the configured paths'}"
+            return None
+
+        with self.lock:
+            handle = self.versions.get(version)
+            if handle is None:
+                handle = ModelHandle(version, model, is_tflite, is_multitask, model_path or version.split('@')[0])
+                self.versions[version] = handle
+                if not activate:
+                    self._evict_locked()  # otherwise activate() evicts once the new version is active
+            else:
+                logger.info(f"Model version {version} is already loaded")
+        self.last_error = None
+        if activate:
+            self.activate(version)
+        return handle
+
+    def load_async(self, model_path, activate=True):
+        """Load a model on the background loader thread; returns a Future for its handle.
+
+        Returns None without loading if another load is still in progress.
+        """
+        with self.lock:
+            if self.loading:
+                return None
+            self.loading = model_path or 'configured paths'
+        return self.loader.submit(self._load_in_background, model_path, activate)
+
+    def _load_in_background(self, model_path, activate):
+        try:
+            return self.load(model_path, activate=activate)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Background load of {model_path} failed: {e}")
+            return None
+        finally:
+            self.loading = None
+
+    def activate(self, version):
+        """Atomically point new requests at ``version``. Raises KeyError if it is not loaded."""
+        with self.lock:
+            handle = self.versions[version]
+            previous, self.active = self.active, handle
+            self.versions.move_to_end(version)
+            self._evict_locked()
+        if previous is not handle:
+            logger.info(f"✅ Active model version: {version} (was {previous.version if previous else None})")
+            if self.on_activate:
+                self.on_activate(handle)
+        return handle
+
+    def _evict_locked(self):
+        # Drop the least recently activated versions; a request still holding one
+        # keeps it alive until it finishes.
+        while len(self.versions) > self.max_versions:
+            version = next(v for v, h in self.versions.items() if h is not self.active)
+            handle = self.versions.pop(version)
+            logger.info(f"Unloading model version {version} ({handle.in_flight} requests still in flight)")
+
+    def get_active(self):
+        return self.active
+
+    @contextmanager
+    def acquire(self):
+        """Hold the active version for the duration of one request."""
+        with self.lock:
+            handle = self.active
+            if handle is None:
+                raise RuntimeError("No model version is active")
+            handle.in_flight += 1
+            handle.requests += 1
+        try:
+            yield handle
+        finally:
+            with self.lock:
+                handle.in_flight -= 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'active_version': self.active.version if self.active else None,
+                'loading': self.loading,
+                'last_error': self.last_error,
+                'max_versions': self.max_versions,
+                'versions': [handle.get_info() for handle in self.versions.values()]
+            }
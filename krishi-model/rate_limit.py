@@ -0,0 +1,427 @@
+"""
+Per-user rate limiting for the Krishi Sahayak ML servers.
+
+Every backend implements GCRA: a user may make a burst of ``limit`` requests and then
+regains one request every window / limit seconds. The only state per user is its
+theoretical arrival time (TAT); a user whose TAT has passed is indistinguishable from a
+new one, so expired state can be dropped or overwritten at any time. TATs are integer
+microseconds: with float seconds, rounding at epoch magnitudes could push the last
+request of a burst past the window.
+
+Backends (RATE_LIMIT_BACKEND):
+- local: in-process state; each gunicorn worker and pod limits independently.
+- shared_memory: a fixed-size table in an mmap'ed file (RATE_LIMIT_SHM_PATH) shared by
+  all workers on one host, with fcntl range locks per stripe of slots.
+- redis: one atomic Lua script per check against a Redis-protocol store shared by all
+  pods. Concurrent checks are sent as one pipeline. The client is injectable, so a
+  local stand-in (e.g. fakeredis) can replace the server in tests.
+"""
+
+import os
+import mmap
+import errno
+import time
+import fcntl
+import struct
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+
+from config import (
+    RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, RATE_LIMIT_EVICT_INTERVAL, RATE_LIMIT_SHARDS, RATE_LIMIT_BACKEND,
+    RATE_LIMIT_SHM_PATH, RATE_LIMIT_SHM_SLOTS, RATE_LIMIT_REDIS_URL, RATE_LIMIT_REDIS_PREFIX,
+    RATE_LIMIT_REDIS_TIMEOUT, RATE_LIMIT_FAIL_OPEN
+)
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKENDS = ('local', 'shared_memory', 'redis')
+
+# remaining: requests allowed right now after this one; retry_after: seconds until the next is allowed
+RateLimitDecision = namedtuple('RateLimitDecision', ['allowed', 'remaining', 'retry_after'])
+
+def to_microseconds(seconds):
+    return int(round(seconds * 1000000))
+
+def gcra(tat, now, emission_interval, window, cost=1):
+    """(new TAT or None if denied, decision) for a user with theoretical arrival time ``tat``.
+
+    All times are integer microseconds, so a burst of window // emission_interval
+    requests is exact; retry_after in the decision is in seconds. ``cost=0`` only
+    reports the user's state.
+    """
+    tat = max(tat, now)
+    new_tat = tat + emission_interval * cost
+    if new_tat - now > window:
+        return None, RateLimitDecision(False, 0, (tat + emission_interval - window - now) / 1000000)
+    remaining = (window - (new_tat - now)) // emission_interval
+    retry_after = max(0, new_tat + emission_interval - window - now) / 1000000
+    return new_tat, RateLimitDecision(True, remaining, retry_after)
+
+class BaseRateLimiter:
+    """Common interface; backends implement check()."""
+
+    def __init__(self, limit=RATE_LIMIT_REQUESTS, window=RATE_LIMIT_WINDOW):
+        self.limit = limit
+        self.window = float(window)
+        # Rounded down, so limit intervals always fit in the window
+        self.window_us = to_microseconds(self.window)
+        self.emission_us = self.window_us // limit
+
+    def check(self, user_id, cost=1):
+        """Count ``cost`` requests for the user if allowed; returns a RateLimitDecision."""
+        raise NotImplementedError
+
+    def is_allowed(self, user_id):
+        """Check if user is within rate limit, and count the request if so"""
+        return self.check(user_id).allowed
+
+    def get_remaining_requests(self, user_id):
+        """Requests the user can make right now; looking a user up does not create state"""
+        return self.check(user_id, cost=0).remaining
+
+    def get_retry_after(self, user_id):
+        """Seconds until the user's next request is allowed (0 if it is allowed now)"""
+        return self.check(user_id, cost=0).retry_after
+
+    def active_users(self):
+        """Users with requests in the last window, or None if the backend cannot count them cheaply"""
+        return None
+
+    def get_stats(self):
+        return {
+            'backend': self.backend,
+            'limit': self.limit,
+            'window_seconds': self.window,
+            'active_users': self.active_users()
+        }
+
+class RateLimiterShard:
+    """Part of the local limiter's users, with its own lock and counters."""
+
+    __slots__ = ('lock', 'tats', 'allowed', 'denied', 'evicted')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tats = OrderedDict()
+        self.allowed = 0
+        self.denied = 0
+        self.evicted = 0
+
+class RateLimiter(BaseRateLimiter):
+    """In-process GCRA limiter with idle-user eviction.
+
+    Users are split by key hash across ``shards``, each with its own lock, so request
+    threads only contend when their users share a shard. Each shard keeps its TATs in
+    order of last update; every TAT is at most ``window`` after its update, so expired
+    entries collect at the front, where a background sweep drops them every
+    ``evict_interval`` seconds. Counts are kept per shard as they change, so stats
+    only add up ``shards`` numbers and take no lock.
+    """
+
+    backend = 'local'
+
+    def __init__(self, limit=RATE_LIMIT_REQUESTS, window=RATE_LIMIT_WINDOW, evict_interval=RATE_LIMIT_EVICT_INTERVAL,
+                 shards=RATE_LIMIT_SHARDS):
+        super().__init__(limit, window)
+        self.shards = [RateLimiterShard() for _ in range(max(1, shards))]
+        self.evict_interval = evict_interval
+        if evict_interval:
+            threading.Thread(target=self._evict_loop, daemon=True, name='rate-limiter-evict').start()
+
+    def shard_for(self, user_id):
+        return self.shards[hash(user_id) % len(self.shards)]
+
+    def check(self, user_id, cost=1, now=None):
+        now = to_microseconds(time.time() if now is None else now)
+        shard = self.shard_for(user_id)
+        with shard.lock:
+            new_tat, decision = gcra(shard.tats.get(user_id, now), now, self.emission_us, self.window_us, cost)
+            if cost:
+                if new_tat is None:
+                    shard.denied += 1
+                else:
+                    shard.allowed += 1
+                    shard.tats[user_id] = new_tat
+                    shard.tats.move_to_end(user_id)
+        return decision
+
+    def active_users(self):
+        """Users with requests in the last window (plus expired ones not yet swept)"""
+        return sum(len(shard.tats) for shard in self.shards)
+
+    @property
+    def evicted(self):
+        return sum(shard.evicted for shard in self.shards)
+
+    def evict_expired(self, now=None, chunk=1000):
+        """Drop users whose TAT has passed, one shard and chunk at a time. Returns the count."""
+        now = to_microseconds(time.time() if now is None else now)
+        evicted = 0
+        for shard in self.shards:
+            done = False
+            while not done:
+                with shard.lock:
+                    for _ in range(chunk):
+                        if not shard.tats or next(iter(shard.tats.values())) > now:
+                            done = True
+                            break
+                        shard.tats.popitem(last=False)
+                        shard.evicted += 1
+                        evicted += 1
+        return evicted
+
+    def _evict_loop(self):
+        while True:
+            time.sleep(self.evict_interval)
+            try:
+                self.evict_expired()
+            except Exception as e:
+                logger.error(f"Rate limiter eviction failed: {e}")
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats.update({
+            'shards': len(self.shards),
+            'allowed_requests': sum(shard.allowed for shard in self.shards),
+            'denied_requests': sum(shard.denied for shard in self.shards),
+            'evicted_users': self.evicted
+        })
+        return stats
+
+# Shared-memory slot: 64-bit key hash (0 = empty) and TAT in microseconds (exact in a
+# double; a table written with TATs in seconds reads as long expired)
+SLOT = struct.Struct('<Qd')
+
+def key_hash(user_id):
+    """Stable 64-bit hash of a user id (Python's hash() differs per process)."""
+    value = int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), 'little')
+    return value or 1
+
+class SharedMemoryRateLimiter(BaseRateLimiter):
+    """GCRA limiter whose state lives in an mmap'ed file shared by all processes on the host.
+
+    The table has a fixed number of slots, split into stripes that are locked with a
+    thread lock (fcntl locks do not exclude threads of one process) and an fcntl range
+    lock. A user is looked up in ``probe`` consecutive slots of its stripe; expired
+    slots are reused, so there is nothing to sweep. If all of them hold active users,
+    the one closest to expiry is overwritten and starts over with a full burst.
+    """
+
+    backend = 'shared_memory'
+
+    def __init__(self, limit=RATE_LIMIT_REQUESTS, window=RATE_LIMIT_WINDOW, path=RATE_LIMIT_SHM_PATH,
+                 slots=RATE_LIMIT_SHM_SLOTS, stripes=256, probe=8):
+        super().__init__(limit, window)
+        self.path = path
+        self.stripes = stripes
+        self.stripe_slots = max(probe, slots // stripes)
+        self.slots = self.stripe_slots * stripes
+        self.probe = probe
+        size = self.slots * SLOT.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)  # zero-filled, i.e. empty slots; a no-op for the other workers
+        self.mm = mmap.mmap(self.fd, size)
+        self.stripe_locks = [threading.Lock() for _ in range(stripes)]
+        # This process's counts per stripe, each only changed under its stripe lock
+        self.allowed = [0] * stripes
+        self.denied = [0] * stripes
+        self.overwritten = [0] * stripes
+
+    def check(self, user_id, cost=1, now=None):
+        now = to_microseconds(time.time() if now is None else now)
+        h = key_hash(user_id)
+        stripe = h % self.stripes
+        first_slot = stripe * self.stripe_slots
+        start = (h // self.stripes) % self.stripe_slots
+        stripe_bytes = self.stripe_slots * SLOT.size
+
+        with self.stripe_locks[stripe]:
+            self._lock_range(stripe_bytes, first_slot * SLOT.size)
+            try:
+                found = free = victim = None
+                victim_tat = None
+                for i in range(self.probe):
+                    offset = (first_slot + (start + i) % self.stripe_slots) * SLOT.size
+                    slot_hash, tat = SLOT.unpack_from(self.mm, offset)
+                    if slot_hash == h:
+                        found = offset
+                        break
+                    if free is None and (slot_hash == 0 or tat <= now):
+                        free = offset
+                    if victim_tat is None or tat < victim_tat:
+                        victim, victim_tat = offset, tat
+
+                tat = int(SLOT.unpack_from(self.mm, found)[1]) if found is not None else now
+                new_tat, decision = gcra(tat, now, self.emission_us, self.window_us, cost)
+                if cost and new_tat is None:
+                    self.denied[stripe] += 1
+                elif cost:
+                    self.allowed[stripe] += 1
+                    offset = found if found is not None else free
+                    if offset is None:
+                        offset = victim
+                        self.overwritten[stripe] += 1
+                    SLOT.pack_into(self.mm, offset, h, new_tat)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, stripe_bytes, first_slot * SLOT.size)
+        return decision
+
+    def _lock_range(self, length, offset):
+        while True:
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, length, offset)
+                return
+            except OSError as e:
+                # fcntl locks belong to the process, so two workers whose threads wait on
+                # each other's stripes look like a deadlock to the kernel; it clears quickly
+                if e.errno != errno.EDEADLK:
+                    raise
+                time.sleep(0.0001)
+
+    def active_users(self):
+        """Slots holding users with requests in the last window (read without locking)."""
+        import numpy as np # type: ignore
+        table = np.frombuffer(self.mm, dtype=[('key', '<u8'), ('tat', '<f8')])
+        return int(np.count_nonzero((table['key'] != 0) & (table['tat'] > to_microseconds(time.time()))))
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats.update({
+            'path': self.path,
+            'slots': self.slots,
+            'allowed_requests': sum(self.allowed),  # by this worker
+            'denied_requests': sum(self.denied),
+            'overwritten_users': sum(self.overwritten)
+        })
+        return stats
+
+# KEYS[1]: user key. ARGV: emission interval and window in microseconds, cost. Returns
+# {allowed, remaining, retry_after in seconds as a string (Lua numbers are truncated to
+# integers in replies)}. TATs are integer microseconds as in gcra(); the server clock is
+# used so pods with skewed clocks agree; keys expire when idle.
+GCRA_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000000 + tonumber(clock[2])
+local emission_interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local new_tat = tat + emission_interval * cost
+if new_tat - now > window then
+    return {0, 0, tostring((tat + emission_interval - window - now) / 1000000)}
+end
+if cost > 0 then
+    redis.call('SET', KEYS[1], string.format('%.0f', new_tat), 'PX', math.ceil((new_tat - now) / 1000))
+end
+local remaining = math.floor((window - (new_tat - now)) / emission_interval)
+return {1, remaining, tostring(math.max(0, new_tat + emission_interval - window - now) / 1000000)}
+"""
+
+class RedisRateLimiter(BaseRateLimiter):
+    """GCRA limiter on a Redis-protocol store shared by all workers and pods.
+
+    Checks are queued and a sender thread runs everything queued as one pipeline of
+    EVALSHA calls, so concurrent requests share a round trip. ``client`` is anything with
+    redis-py's script_load/pipeline API; by default one is created from RATE_LIMIT_REDIS_URL.
+    If the store cannot be reached, requests are allowed when ``fail_open`` is set.
+    """
+
+    backend = 'redis'
+
+    def __init__(self, limit=RATE_LIMIT_REQUESTS, window=RATE_LIMIT_WINDOW, client=None, url=RATE_LIMIT_REDIS_URL,
+                 prefix=RATE_LIMIT_REDIS_PREFIX, timeout=RATE_LIMIT_REDIS_TIMEOUT, fail_open=RATE_LIMIT_FAIL_OPEN):
+        super().__init__(limit, window)
+        if client is None:
+            import redis # type: ignore
+            client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.client = client
+        self.prefix = prefix
+        self.timeout = timeout
+        self.fail_open = fail_open
+        self.script_sha = None
+        self.pending = []
+        self.condition = threading.Condition()
+        self.pipelines = 0
+        self.checks = 0
+        self.errors = 0
+        self.sender = None
+
+    def check(self, user_id, cost=1):
+        future = Future()
+        with self.condition:
+            if self.sender is None:
+                # Started on first use, i.e. in the worker process rather than a pre-fork parent
+                self.sender = threading.Thread(target=self._send_loop, daemon=True, name='rate-limiter-redis')
+                self.sender.start()
+            self.pending.append((f"{self.prefix}{user_id}", cost, future))
+            self.condition.notify()
+        try:
+            return future.result(timeout=self.timeout * 4 + 1)
+        except Exception as e:
+            return self._unavailable(e)
+
+    def _send_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                batch, self.pending = self.pending, []
+            try:
+                replies = self._run_pipeline(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), (allowed, remaining, retry_after) in zip(batch, replies):
+                future.set_result(RateLimitDecision(bool(allowed), int(remaining), float(retry_after)))
+
+    def _run_pipeline(self, batch):
+        for attempt in range(2):
+            if self.script_sha is None:
+                self.script_sha = self.client.script_load(GCRA_SCRIPT)
+            pipeline = self.client.pipeline(transaction=False)
+            for key, cost, _ in batch:
+                pipeline.evalsha(self.script_sha, 1, key, self.emission_us, self.window_us, cost)
+            try:
+                replies = pipeline.execute()
+            except Exception as e:
+                if 'NOSCRIPT' in str(e) and attempt == 0:
+                    self.script_sha = None  # the store restarted and lost the script
+                    continue
+                raise
+            self.pipelines += 1
+            self.checks += len(batch)
+            return replies
+
+    def _unavailable(self, error):
+        self.errors += 1
+        if self.errors == 1 or self.errors % 1000 == 0:
+            logger.warning(f"⚠️ Rate limit store unavailable ({self.errors} errors): {error}; "
+                           f"{'allowing' if self.fail_open else 'rejecting'} requests")
+        if self.fail_open:
+            return RateLimitDecision(True, self.limit, 0.0)
+        return RateLimitDecision(False, 0, 1.0)
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats.update({
+            'checks': self.checks,
+            'checks_per_pipeline': self.checks / self.pipelines if self.pipelines else None,
+            'errors': self.errors
+        })
+        return stats
+
+def create_rate_limiter(backend=RATE_LIMIT_BACKEND, **kwargs):
+    """The rate limiter for RATE_LIMIT_BACKEND."""
+    if backend == 'shared_memory':
+        return SharedMemoryRateLimiter(**kwargs)
+    if backend == 'redis':
+        return RedisRateLimiter(**kwargs)
+    if backend != 'local':
+        raise ValueError(f"Unknown rate limit backend '{backend}'; expected one of {RATE_LIMIT_BACKENDS}")
+    return RateLimiter(**kwargs)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Benchmark inference backends across model formats, thread counts and batch sizes.
+
+Every candidate model is loaded with load_ml_model, as the server loads it, and run
+with run_model_inference. Candidates can be Keras .h5/.keras files (model.predict) or
+TFLite files. --convert adds TFLite float32/float16/dynamic/int8 conversions of the
+first Keras candidate, made with tflite_conversion.
+
+Each (model, threads) combination runs in its own spawned process, so TensorFlow
+thread pools and peak RSS are measured independently. A run covers a fixed synthetic
+image set (seeded) and, with --images, a real one, at every batch size. It reports
+p50/p95/p99 batch latency, ms per image and images per second. The thread count is
+INTERPRETER_NUM_THREADS for TFLite and TF_NUM_INTRAOP_THREADS for Keras.
+
+--layouts WxT approximates gunicorn layouts: W worker processes, each with T request
+threads sharing one model (an interpreter pool of T for TFLite), run batch-1
+inference for --duration seconds. HTTP and the micro-batcher are not included.
+
+The JSON report includes the git commit, so runs on different commits can be compared.
+
+Usage: python scripts/benchmark_inference.py [--models saved_models/best_model.h5 ...] [--convert float16 int8]
+                                             [--threads 1 2 4] [--batch-sizes 1 4 8] [--layouts 1x8 2x4]
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from PIL import Image
+
+from config import MODEL_PATHS, TFLITE_MODEL_PATHS
+from benchmark_preprocess import peak_rss_mb, current_rss_mb, reset_peak_rss
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+def make_synthetic_images(count, seed=0):
+    """Fixed set of photo-sized JPEGs (gradients plus noise), identical on every run."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:480, 0:640]
+    images = []
+    for _ in range(count):
+        offsets = rng.random(3) * 255
+        pixels = np.stack([(x / 4 + offsets[0]) % 256, (y / 3 + offsets[1]) % 256, ((x + y) / 5 + offsets[2]) % 256], axis=-1)
+        pixels += rng.random((480, 640, 3)) * 30
+        buffer = io.BytesIO()
+        Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+def load_real_images(image_dir, count):
+    images = []
+    for root, _, files in os.walk(image_dir):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS) and len(images) < count:
+                with open(os.path.join(root, name), 'rb') as f:
+                    images.append(f.read())
+    return images
+
+def configure_threads(threads, pool_size=1):
+    """Thread settings read at import time by config.py and TensorFlow, so they must be set first."""
+    os.environ['INTERPRETER_NUM_THREADS'] = str(threads)
+    os.environ['INTERPRETER_POOL_SIZE'] = str(pool_size)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+def load_candidate(model_path):
+    import logging
+    logging.disable(logging.INFO)
+    from ml_utils import load_ml_model, get_model_input_size
+
+    model, is_tflite, is_multitask, version = load_ml_model([model_path])
+    if model is None:
+        raise RuntimeError(f"load_ml_model could not load {model_path}")
+    return model, is_tflite, is_multitask, version, get_model_input_size(model, is_tflite)
+
+def preprocess_all(images, size):
+    from ml_utils import preprocess_image
+    return np.concatenate([preprocess_image(image, draft=False, size=size) for image in images], axis=0)
+
+def latency_stats(timings, images_per_call):
+    timings_ms = np.array(timings) * 1000
+    return {
+        'calls': len(timings),
+        'p50_ms': float(np.percentile(timings_ms, 50)),
+        'p95_ms': float(np.percentile(timings_ms, 95)),
+        'p99_ms': float(np.percentile(timings_ms, 99)),
+        'mean_ms': float(timings_ms.mean()),
+        'ms_per_image': float(timings_ms.sum() / (len(timings) * images_per_call)),
+        'images_per_second': float(len(timings) * images_per_call / (timings_ms.sum() / 1000))
+    }
+
+def run_candidate(model_path, threads, image_sets, batch_sizes, iterations, results, key):
+    """Child process: one model at one thread count over every image set and batch size."""
+    configure_threads(threads)
+    rss_before = current_rss_mb()
+    reset_peak_rss()
+    start = time.perf_counter()
+    model, is_tflite, is_multitask, version, input_size = load_candidate(model_path)
+    from ml_utils import run_model_inference
+
+    report = {
+        'model': model_path,
+        'format': 'tflite' if is_tflite else 'keras',
+        'version': version,
+        'threads': threads,
+        'input_size': list(input_size),
+        'load_seconds': time.perf_counter() - start,
+        'image_sets': {}
+    }
+    for set_name, images in image_sets.items():
+        batch = preprocess_all(images, input_size)
+        report['image_sets'][set_name] = {}
+        for batch_size in batch_sizes:
+            batches = [batch[i:i + batch_size] for i in range(0, len(batch) - batch_size + 1, batch_size)] or [batch[:batch_size]]
+            run_model_inference(model, batches[0], is_tflite, is_multitask)  # warm-up at this batch size
+            timings = []
+            for iteration in range(iterations):
+                chunk = batches[iteration % len(batches)]
+                call_start = time.perf_counter()
+                run_model_inference(model, chunk, is_tflite, is_multitask)
+                timings.append(time.perf_counter() - call_start)
+            report['image_sets'][set_name][str(batch_size)] = latency_stats(timings, len(batches[0]))
+    report['peak_rss_mb'] = peak_rss_mb()
+    report['peak_rss_increase_mb'] = max(0.0, report['peak_rss_mb'] - rss_before)
+    results[key] = report
+
+def run_layout_worker(model_path, request_threads, interpreter_threads, images, duration, barrier, results, key):
+    """Child process: one gunicorn-like worker with ``request_threads`` threads issuing batch-1 inference."""
+    configure_threads(interpreter_threads, pool_size=request_threads)
+    model, is_tflite, is_multitask, _, input_size = load_candidate(model_path)
+    from ml_utils import run_model_inference
+    batch = preprocess_all(images, input_size)
+
+    timings = [[] for _ in range(request_threads)]
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+
+    def request_loop(thread_timings, offset):
+        index = offset
+        while time.perf_counter() < deadline:
+            image = batch[index % len(batch)][np.newaxis]
+            call_start = time.perf_counter()
+            run_model_inference(model, image, is_tflite, is_multitask)
+            thread_timings.append(time.perf_counter() - call_start)
+            index += 1
+
+    threads = [threading.Thread(target=request_loop, args=(timings[i], i)) for i in range(request_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results[key] = {'timings': [t for thread_timings in timings for t in thread_timings], 'peak_rss_mb': peak_rss_mb()}
+
+def run_layout(model_path, workers, request_threads, interpreter_threads, images, duration, manager):
+    context = multiprocessing.get_context('spawn')
+    results = manager.dict()
+    barrier = context.Barrier(workers)
+    processes = [
+        context.Process(target=run_layout_worker,
+                        args=(model_path, request_threads, interpreter_threads, images, duration, barrier, results, i))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    if len(results) != workers:
+        raise RuntimeError(f"{workers - len(results)} layout workers failed")
+
+    timings = [t for worker in results.values() for t in worker['timings']]
+    stats = latency_stats(timings, 1)
+    stats['images_per_second'] = len(timings) / duration  # wall-clock throughput across all workers
+    stats.update({
+        'model': model_path,
+        'workers': workers,
+        'threads_per_worker': request_threads,
+        'interpreter_threads': interpreter_threads,
+        'duration_seconds': duration,
+        'peak_rss_mb_total': sum(worker['peak_rss_mb'] for worker in results.values())
+    })
+    return stats
+
+def default_candidates():
+    return [path for path in MODEL_PATHS + TFLITE_MODEL_PATHS if os.path.exists(path)]
+
+def convert_candidates(keras_path, modes, output_dir, representative_dirs):
+    """TFLite conversions of ``keras_path`` in each mode, written to ``output_dir``."""
+    import tensorflow as tf
+    from tflite_conversion import convert_keras_model
+
+    model = tf.keras.models.load_model(keras_path, compile=False)
+    name = os.path.splitext(os.path.basename(keras_path))[0]
+    paths = []
+    for mode in modes:
+        try:
+            tflite_model = convert_keras_model(model, mode=mode, data_dirs=representative_dirs)
+        except (ValueError, RuntimeError) as e:
+            print(f"⚠️ Skipping {mode} conversion: {e}")
+            continue
+        path = os.path.join(output_dir, f"{name}_{mode}.tflite")
+        with open(path, 'wb') as f:
+            f.write(tflite_model)
+        paths.append(path)
+    return paths
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', help='Candidate .h5/.keras/.tflite files (default: existing MODEL_PATHS and TFLITE_MODEL_PATHS)')
+    parser.add_argument('--convert', nargs='+', default=[], choices=['float32', 'float16', 'dynamic', 'int8'],
+                        help='Also benchmark these TFLite conversions of the first Keras candidate')
+    parser.add_argument('--representative-dir', action='append', help='int8 calibration split for --convert int8')
+    parser.add_argument('--images', help='Directory of real photos (adds a "real" image set)')
+    parser.add_argument('--num-images', type=int, default=32, help='Images per image set')
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--iterations', type=int, default=30, help='Timed calls per batch size')
+    parser.add_argument('--layouts', nargs='*', default=[], help='Worker x thread layouts such as 1x8 2x4 4x2')
+    parser.add_argument('--layout-interpreter-threads', type=int, default=1, help='num_threads per interpreter in layout runs')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per layout run')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    candidates = args.models or default_candidates()
+    keras_candidates = [path for path in candidates if not path.endswith('.tflite')]
+    conversion_dir = tempfile.mkdtemp(prefix='benchmark_inference_')
+    if args.convert:
+        if not keras_candidates:
+            sys.exit("❌ --convert needs a Keras candidate")
+        candidates = candidates + convert_candidates(keras_candidates[0], args.convert, conversion_dir, args.representative_dir)
+    if not candidates:
+        sys.exit("❌ No candidate models found; pass --models")
+
+    image_sets = {'synthetic': make_synthetic_images(args.num_images)}
+    if args.images:
+        image_sets['real'] = load_real_images(args.images, args.num_images)
+    print(f"📷 Image sets: {', '.join(f'{name}={len(images)}' for name, images in image_sets.items())}; "
+          f"batch sizes {args.batch_sizes}; threads {args.threads}")
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'machine': {'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'python': platform.python_version()},
+        'settings': {
+            'num_images': args.num_images, 'batch_sizes': args.batch_sizes, 'iterations': args.iterations,
+            'threads': args.threads, 'converted': args.convert
+        },
+        'results': [],
+        'layouts': []
+    }
+
+    manager = multiprocessing.Manager()
+    results = manager.dict()
+    context = multiprocessing.get_context('spawn')
+    for model_path in candidates:
+        for threads in args.threads:
+            key = f"{model_path}@{threads}"
+            process = context.Process(target=run_candidate,
+                                      args=(model_path, threads, image_sets, args.batch_sizes, args.iterations, results, key))
+            process.start()
+            process.join()
+            if key not in results:
+                print(f"❌ {os.path.basename(model_path)} with {threads} threads failed (exit code {process.exitcode})")
+                continue
+            result = results[key]
+            report['results'].append(result)
+            for set_name, by_batch in result['image_sets'].items():
+                for batch_size, stats in by_batch.items():
+                    print(f"  {os.path.basename(model_path):40s} t={threads} {set_name:9s} bs={batch_size:>2s} "
+                          f"p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms "
+                          f"{stats['images_per_second']:8.1f} img/s  rss={result['peak_rss_mb']:7.1f}MB")
+
+    layout_images = image_sets.get('real') or image_sets['synthetic']
+    for layout in args.layouts:
+        workers, request_threads = (int(part) for part in layout.lower().split('x'))
+        for model_path in candidates:
+            stats = run_layout(model_path, workers, request_threads, args.layout_interpreter_threads,
+                               layout_images, args.duration, manager)
+            report['layouts'].append(stats)
+            print(f"  layout {layout:5s} {os.path.basename(model_path):40s} p50={stats['p50_ms']:8.2f}ms "
+                  f"p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms {stats['images_per_second']:8.1f} img/s "
+                  f"rss={stats['peak_rss_mb_total']:7.1f}MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
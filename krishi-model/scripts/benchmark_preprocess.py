@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark image preprocessing paths for /analyze_crop.
+
+Compares the original full-resolution decode (float64 array) against the buffered
+float32 path with and without JPEG draft (DCT-scaled) decoding. Each variant runs in
+its own process so peak RSS is measured independently.
+
+Usage: python scripts/benchmark_preprocess.py [--image photo.jpg] [--iterations 20]
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import resource
+import multiprocessing
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from PIL import Image
+
+from config import IMAGE_SIZE
+
+def legacy_preprocess(image_bytes):
+    """The preprocessing path before draft decoding: full decode, float64 normalisation."""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize(IMAGE_SIZE)
+    image_array = np.array(image) / 255.0
+    image_array = np.expand_dims(image_array, axis=0)
+    return image_array.astype(np.float32)  # analyze_crop_prediction cast to the input dtype
+
+def make_synthetic_jpeg(width=4000, height=3000):
+    """A 12 MP photo-like JPEG (smooth gradients plus sensor-like noise)."""
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([(x / 16) % 256, (y / 12) % 256, ((x + y) / 20) % 256], axis=-1)
+    pixels += np.random.default_rng(0).random((height, width, 3)) * 20
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+def reset_peak_rss():
+    """Reset the kernel's peak-RSS watermark (Linux); importing TensorFlow otherwise dominates it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+def run_variant(name, image_bytes, iterations, results):
+    import logging
+    logging.disable(logging.INFO)
+    from ml_utils import preprocess_image
+
+    variants = {
+        'legacy_full_decode_float64': lambda: legacy_preprocess(image_bytes),
+        'full_decode_float32_buffer': lambda: preprocess_image(Image.open(io.BytesIO(image_bytes)), draft=False),
+        'draft_decode_float32_buffer': lambda: preprocess_image(Image.open(io.BytesIO(image_bytes)), draft=True),
+        'draft_decode_uint8_buffer': lambda: preprocess_image(Image.open(io.BytesIO(image_bytes)), draft=True, dtype=np.uint8),
+    }
+    fn = variants[name]
+    rss_before = current_rss_mb()
+    reset_peak_rss()
+    output = fn()  # warm-up (counted in peak RSS: decode buffers are allocated here)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        output = fn()
+        timings.append(time.perf_counter() - start)
+    rss_peak = peak_rss_mb()
+
+    results[name] = {
+        'mean_ms': 1000 * float(np.mean(timings)),
+        'p50_ms': 1000 * float(np.percentile(timings, 50)),
+        'p95_ms': 1000 * float(np.percentile(timings, 95)),
+        'peak_rss_increase_mb': max(0.0, rss_peak - rss_before),
+        'output_dtype': str(output.dtype),
+        'output_shape': list(output.shape),
+        'checksum': float(output.astype(np.float64).mean())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help='JPEG to benchmark with (default: synthetic 12 MP photo)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = make_synthetic_jpeg()
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        source = {'size': list(image.size), 'format': image.format, 'bytes': len(image_bytes)}
+    print(f"📷 Source image: {source['size'][0]}x{source['size'][1]} {source['format']}, {len(image_bytes) / 1024 / 1024:.2f} MB")
+
+    manager = multiprocessing.Manager()
+    results = manager.dict()
+    for name in ['legacy_full_decode_float64', 'full_decode_float32_buffer', 'draft_decode_float32_buffer', 'draft_decode_uint8_buffer']:
+        process = multiprocessing.get_context('spawn').Process(target=run_variant, args=(name, image_bytes, args.iterations, results))
+        process.start()
+        process.join()
+        stats = results[name]
+        print(f"  {name:30s} mean={stats['mean_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms peak_rss+={stats['peak_rss_increase_mb']:7.1f}MB")
+
+    baseline = results['legacy_full_decode_float64']['mean_ms']
+    report = {'image': source, 'iterations': args.iterations, 'results': dict(results),
+              'speedup_vs_legacy': {name: baseline / stats['mean_ms'] for name, stats in results.items()}}
+    print(f"⚡ Draft decode speedup vs legacy: {report['speedup_vs_legacy']['draft_decode_float32_buffer']:.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
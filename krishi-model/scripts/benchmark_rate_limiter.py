@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-user rate limiter under many distinct users.
+
+Compares the previous limiter (one deque of timestamps per user, entries never
+removed, lookups create entries) against the GCRA backends of rate_limit.py: the
+in-process RateLimiter (one float per user, idle users swept) and the fixed-size
+shared-memory table. Each limiter runs in its own process at each key count, so RSS
+is measured independently. Per run it reports:
+- is_allowed throughput over --keys distinct users, --requests-per-key requests each
+- get_remaining_requests throughput for users never seen, and the entries it created
+- RSS growth of the limiter state, and for GCRA the time to sweep every idle user and
+  the users left afterwards
+
+With --latency-backends it also measures the per-check latency the way the server
+sees it: --processes worker processes with --threads threads each, all checking at
+once against one limiter (shared_memory and redis share state across the processes).
+
+With --contention-shards it runs --threads threads in one process against the local
+limiter split into each given number of shards (1 = a single lock), while another
+thread reads the stats every --status-interval-ms as /status does, and reports
+throughput and per-check latency.
+
+Usage: python scripts/benchmark_rate_limiter.py [--keys 100000 1000000] [--requests-per-key 2]
+       python scripts/benchmark_rate_limiter.py --keys 10000 --limiters gcra --contention-shards 1 8 32 --threads 8
+       python scripts/benchmark_rate_limiter.py --keys 10000 --latency-backends shared_memory redis --redis-url redis://localhost:6379/0
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+import multiprocessing
+from collections import defaultdict, deque
+
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW
+from benchmark_preprocess import current_rss_mb
+
+class LegacyRateLimiter:
+    """The limiter before GCRA: a timestamp per request per user."""
+
+    def __init__(self, limit=RATE_LIMIT_REQUESTS, window=RATE_LIMIT_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.user_requests = defaultdict(deque)
+        self.lock = threading.Lock()
+
+    def is_allowed(self, user_id):
+        current_time = time.time()
+        with self.lock:
+            while self.user_requests[user_id] and self.user_requests[user_id][0] < current_time - self.window:
+                self.user_requests[user_id].popleft()
+            if len(self.user_requests[user_id]) >= self.limit:
+                return False
+            self.user_requests[user_id].append(current_time)
+            return True
+
+    def get_remaining_requests(self, user_id):
+        current_time = time.time()
+        with self.lock:
+            while self.user_requests[user_id] and self.user_requests[user_id][0] < current_time - self.window:
+                self.user_requests[user_id].popleft()
+            return max(0, self.limit - len(self.user_requests[user_id]))
+
+    def active_users(self):
+        return len(self.user_requests)
+
+def make_keys(count, prefix):
+    """User ids shaped like the X-User-ID fallback (remote_addr)."""
+    return [f"{prefix}{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}.{i >> 24}" for i in range(count)]
+
+def create_limiter(name, limit, window, shm_path=None, redis_url=None):
+    from rate_limit import RateLimiter, SharedMemoryRateLimiter, RedisRateLimiter
+    if name == 'legacy_deque':
+        return LegacyRateLimiter(limit, window)
+    if name == 'shared_memory':
+        return SharedMemoryRateLimiter(limit, window, path=shm_path)
+    if name == 'redis':
+        return RedisRateLimiter(limit, window, url=redis_url, prefix=f"benchmark:{os.getppid()}:")
+    return RateLimiter(limit, window, evict_interval=None)  # swept explicitly in run_limiter
+
+def run_limiter(name, num_keys, requests_per_key, limit, window, shm_path, results):
+    import logging
+    logging.disable(logging.INFO)
+
+    keys = make_keys(num_keys, '10.')
+    unseen = make_keys(min(num_keys, 100000), '172.')
+    rss_before = current_rss_mb()
+    limiter = create_limiter(name, limit, window, shm_path=shm_path)
+
+    start = time.perf_counter()
+    allowed = 0
+    for _ in range(requests_per_key):
+        for key in keys:
+            allowed += limiter.is_allowed(key)
+    allow_seconds = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    users_before_lookups = limiter.active_users()
+    start = time.perf_counter()
+    for key in unseen:
+        limiter.get_remaining_requests(key)
+    lookup_seconds = time.perf_counter() - start
+
+    stats = {
+        'keys': num_keys,
+        'calls': num_keys * requests_per_key,
+        'allowed': allowed,
+        'is_allowed_per_second': num_keys * requests_per_key / allow_seconds,
+        'is_allowed_us': allow_seconds / (num_keys * requests_per_key) * 1e6,
+        'lookup_per_second': len(unseen) / lookup_seconds,
+        'entries_created_by_lookups': limiter.active_users() - users_before_lookups,
+        'rss_increase_mb': max(0.0, rss_after - rss_before),
+        'bytes_per_user': max(0.0, rss_after - rss_before) * 1024 * 1024 / num_keys,
+    }
+    if name == 'gcra':
+        # Every user is idle once a full window has passed
+        start = time.perf_counter()
+        stats['evicted'] = limiter.evict_expired(now=time.time() + window + 1)
+        stats['evict_seconds'] = time.perf_counter() - start
+        stats['users_after_evict'] = limiter.active_users()
+    results[(name, num_keys)] = stats
+
+def run_latency_worker(name, index, threads, checks, limit, window, shm_path, redis_url, barrier, results):
+    import logging
+    logging.disable(logging.INFO)
+    limiter = create_limiter(name, limit, window, shm_path=shm_path, redis_url=redis_url)
+    timings = [[] for _ in range(threads)]
+
+    def run(thread_index):
+        keys = make_keys(checks, f"{index}.{thread_index}.")
+        record = timings[thread_index].append
+        for key in keys:
+            start = time.perf_counter()
+            limiter.is_allowed(key)
+            record(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    barrier.wait()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results[index] = ([t for thread_timings in timings for t in thread_timings], limiter.get_stats())
+
+def measure_latency(name, processes, threads, checks, limit, window, shm_path, redis_url):
+    context = multiprocessing.get_context('spawn')
+    manager = context.Manager()
+    results = manager.dict()
+    barrier = context.Barrier(processes + 1)
+    workers = [context.Process(target=run_latency_worker, args=(name, index, threads, checks, limit, window,
+                                                                shm_path, redis_url, barrier, results))
+               for index in range(processes)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    timings = np.array([t for index in range(processes) for t in results[index][0]]) * 1000
+    stats = {
+        'backend': name,
+        'processes': processes,
+        'threads': threads,
+        'checks': len(timings),
+        'checks_per_second': len(timings) / elapsed,
+        'latency_ms': {p: float(np.percentile(timings, int(p[1:]))) for p in ('p50', 'p95', 'p99')},
+        'latency_ms_max': float(timings.max()),
+        'limiter_stats': results[0][1]
+    }
+    return stats
+
+def measure_contention(shards, threads, checks, limit, window, status_interval):
+    from rate_limit import RateLimiter
+    limiter = RateLimiter(limit, window, evict_interval=None, shards=shards)
+    timings = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+    stop = threading.Event()
+    status_reads = 0
+
+    def run(thread_index):
+        # Every thread has its own users plus a few hot ones shared by all
+        keys = make_keys(checks, f"{thread_index}.")
+        keys[::10] = make_keys(len(keys[::10]), 'hot.')
+        record = timings[thread_index].append
+        barrier.wait()
+        for key in keys:
+            start = time.perf_counter()
+            limiter.check(key)
+            record(time.perf_counter() - start)
+
+    def read_status():
+        nonlocal status_reads
+        while not stop.wait(status_interval):
+            limiter.get_stats()
+            status_reads += 1
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    reader = threading.Thread(target=read_status)
+    reader.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    reader.join()
+
+    timings = np.array([t for thread_timings in timings for t in thread_timings]) * 1000
+    stats = limiter.get_stats()
+    return {
+        'shards': shards,
+        'threads': threads,
+        'checks': len(timings),
+        'checks_per_second': len(timings) / elapsed,
+        'latency_ms': {name: float(np.percentile(timings, q)) for name, q in
+                       (('p50', 50), ('p95', 95), ('p99', 99), ('p999', 99.9))},
+        'latency_ms_max': float(timings.max()),
+        'status_reads': status_reads,
+        'allowed_requests': stats['allowed_requests'],
+        'denied_requests': stats['denied_requests']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, nargs='+', default=[100000, 1000000], help='Distinct users per run')
+    parser.add_argument('--requests-per-key', type=int, default=2)
+    parser.add_argument('--limit', type=int, default=RATE_LIMIT_REQUESTS)
+    parser.add_argument('--window', type=float, default=RATE_LIMIT_WINDOW)
+    parser.add_argument('--limiters', nargs='+', choices=['legacy_deque', 'gcra', 'shared_memory'],
+                        default=['legacy_deque', 'gcra', 'shared_memory'])
+    parser.add_argument('--latency-backends', nargs='*', choices=['local', 'shared_memory', 'redis'], default=[],
+                        help='Backends for the concurrent latency run (redis needs --redis-url)')
+    parser.add_argument('--processes', type=int, default=2, help='Latency run: worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='Latency run: threads per process')
+    parser.add_argument('--checks', type=int, default=5000, help='Latency run: checks per thread')
+    parser.add_argument('--contention-shards', type=int, nargs='*', default=[],
+                        help='Shard counts for the single-process contention run of the local limiter')
+    parser.add_argument('--status-interval-ms', type=float, default=1.0, help='Contention run: stats read interval')
+    parser.add_argument('--redis-url', help='Redis-protocol store for the redis backend')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    shm_path = os.path.join(tempfile.mkdtemp(prefix='rate_limit_benchmark_'), 'table')
+    manager = multiprocessing.Manager()
+    results = manager.dict()
+    report = {'limit': args.limit, 'window_seconds': args.window, 'requests_per_key': args.requests_per_key,
+              'runs': [], 'latency': [], 'contention': []}
+    for num_keys in args.keys:
+        for name in args.limiters:
+            if os.path.exists(shm_path):
+                os.remove(shm_path)
+            process = multiprocessing.get_context('spawn').Process(
+                target=run_limiter, args=(name, num_keys, args.requests_per_key, args.limit, args.window, shm_path, results))
+            process.start()
+            process.join()
+            stats = results[(name, num_keys)]
+            report['runs'].append({'limiter': name, **stats})
+            line = (f"  {name:13s} {num_keys:>9,d} users  {stats['is_allowed_per_second']:>11,.0f} checks/s "
+                    f"({stats['is_allowed_us']:.2f} us)  {stats['rss_increase_mb']:8.1f} MB "
+                    f"({stats['bytes_per_user']:.0f} B/user)  lookups created {stats['entries_created_by_lookups']:,d}")
+            if 'evict_seconds' in stats:
+                line += f"  sweep {stats['evicted']:,d} in {stats['evict_seconds']:.2f}s -> {stats['users_after_evict']:,d} left"
+            print(line)
+
+    for name in args.latency_backends:
+        if name == 'redis' and not args.redis_url:
+            print("⚠️ Skipping redis: pass --redis-url")
+            continue
+        if os.path.exists(shm_path):
+            os.remove(shm_path)
+        stats = measure_latency(name, args.processes, args.threads, args.checks, args.limit, args.window,
+                                shm_path, args.redis_url)
+        report['latency'].append(stats)
+        latency = stats['latency_ms']
+        print(f"  {name:13s} {args.processes}x{args.threads} threads  {stats['checks_per_second']:>10,.0f} checks/s  "
+              f"p50 {latency['p50']:.3f} ms  p95 {latency['p95']:.3f} ms  p99 {latency['p99']:.3f} ms")
+    if os.path.exists(shm_path):
+        os.remove(shm_path)
+    os.rmdir(os.path.dirname(shm_path))
+
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    for shards in args.contention_shards:
+        stats = measure_contention(shards, args.threads, args.checks, args.limit, args.window,
+                                   args.status_interval_ms / 1000)
+        stats['gil_enabled'] = gil
+        report['contention'].append(stats)
+        latency = stats['latency_ms']
+        print(f"  local {shards:>3d} shards  {args.threads} threads  {stats['checks_per_second']:>10,.0f} checks/s  "
+              f"p50 {latency['p50']:.4f} ms  p99 {latency['p99']:.4f} ms  p999 {latency['p999']:.4f} ms  "
+              f"({stats['status_reads']} stats reads)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark the shared-backbone multi-head model against the two-model cascade.
+
+Loads both engines the way the server does with INFERENCE_MODE=cascade:
+- the separate crop detector plus per-crop disease models
+- crop_disease_multihead from scripts/export_shared_backbone.py
+It then runs the same preprocessed images through each engine's predict_batch and
+reports batch latency, throughput, model calls per image and how often the two
+engines predict the same label.
+
+Usage: python scripts/benchmark_shared_backbone.py [--model-dir saved_models] [--images photos/] [--batch-size 8]
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from PIL import Image
+
+import cascade
+from ml_utils import preprocess_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+def load_images(image_dir, max_images):
+    """Encoded image bytes from ``image_dir`` (recursively), or synthetic JPEGs if none is given."""
+    images = []
+    if image_dir:
+        for root, _, files in os.walk(image_dir):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS) and len(images) < max_images:
+                    with open(os.path.join(root, name), 'rb') as f:
+                        images.append(f.read())
+    else:
+        rng = np.random.RandomState(0)
+        for _ in range(max_images):
+            buffer = io.BytesIO()
+            Image.fromarray((rng.rand(480, 640, 3) * 255).astype(np.uint8)).save(buffer, 'JPEG', quality=90)
+            images.append(buffer.getvalue())
+    return images
+
+def benchmark_engine(engine, image_arrays, batch_size, iterations):
+    batches = [image_arrays[i:i + batch_size] for i in range(0, len(image_arrays), batch_size)]
+    engine.predict_batch(batches[0])  # warm-up
+    calls_before = sum(stage.get_stats()['calls'] for stage in engine.get_stages())
+
+    timings = []
+    predictions = []
+    for iteration in range(iterations):
+        for batch in batches:
+            start = time.perf_counter()
+            results = engine.predict_batch(batch)
+            timings.append(time.perf_counter() - start)
+            if iteration == 0:
+                predictions.extend(results)
+
+    calls = sum(stage.get_stats()['calls'] for stage in engine.get_stages()) - calls_before
+    images_run = len(image_arrays) * iterations
+    timings_ms = np.array(timings) * 1000
+    return {
+        'version': engine.version,
+        'batches': len(timings),
+        'mean_batch_ms': float(timings_ms.mean()),
+        'p50_batch_ms': float(np.percentile(timings_ms, 50)),
+        'p95_batch_ms': float(np.percentile(timings_ms, 95)),
+        'ms_per_image': float(timings_ms.sum() / images_run),
+        'images_per_second': float(images_run / (timings_ms.sum() / 1000)),
+        'model_calls_per_image': calls / images_run
+    }, predictions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', default='saved_models', help='Directory with the separate cascade models')
+    parser.add_argument('--shared-dir', help='Directory with crop_disease_multihead.* (default: --model-dir)')
+    parser.add_argument('--images', help='Directory of test photos (default: synthetic images)')
+    parser.add_argument('--max-images', type=int, default=64)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--confidence-threshold', type=float, default=0.0,
+                        help='Crop confidence needed to run the disease stage (default 0: always run it)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+    cascade.CONFIDENCE_THRESHOLD = args.confidence_threshold
+
+    separate = cascade.load_separate_models([args.model_dir])
+    shared = cascade.load_shared_backbone_model([args.shared_dir or args.model_dir])
+    if separate is None or shared is None:
+        sys.exit("❌ Need both the separate cascade models and crop_disease_multihead (run scripts/export_shared_backbone.py)")
+
+    images = load_images(args.images, args.max_images)
+    print(f"📷 {len(images)} images, batch size {args.batch_size}, {args.iterations} iterations")
+
+    report = {'images': len(images), 'batch_size': args.batch_size, 'iterations': args.iterations, 'results': {}}
+    predictions = {}
+    for name, engine in [('two_model_cascade', separate), ('shared_backbone', shared)]:
+        image_arrays = [preprocess_image(image, size=engine.input_size).copy() for image in images]
+        stats, predictions[name] = benchmark_engine(engine, image_arrays, args.batch_size, args.iterations)
+        report['results'][name] = stats
+        print(f"  {name:18s} {stats['ms_per_image']:7.2f} ms/image  p95 batch {stats['p95_batch_ms']:7.2f} ms  "
+              f"{stats['images_per_second']:7.1f} img/s  {stats['model_calls_per_image']:.2f} model calls/image")
+
+    pairs = list(zip(predictions['two_model_cascade'], predictions['shared_backbone']))
+    report['agreement'] = {
+        'crop': sum(a['crop'] == b['crop'] for a, b in pairs) / len(pairs),
+        'label': sum(a['crop_type'] == b['crop_type'] for a, b in pairs) / len(pairs)
+    }
+    report['speedup'] = report['results']['two_model_cascade']['ms_per_image'] / report['results']['shared_backbone']['ms_per_image']
+    print(f"⚡ Shared backbone speedup: {report['speedup']:.2f}x; label agreement with the cascade: {report['agreement']['label']:.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
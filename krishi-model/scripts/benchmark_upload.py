@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Measure what the raw-body upload path saves compared to base64 JSON on /analyze_crop.
+
+Both variants go through the production request parsing (Flask request context with
+the same body a client would send) and preprocess_image, without running the model.
+Python allocations (JSON parsing, base64 strings and decoded copies) are tracked with
+tracemalloc; the JPEG decode itself is identical for both paths.
+
+Usage: python scripts/benchmark_upload.py [--image photo.jpg] [--iterations 20]
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import tracemalloc
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from flask import request
+
+from benchmark_preprocess import make_synthetic_jpeg
+
+def measure(app, body, content_type, extract, iterations):
+    """Time request parsing + preprocessing and record peak traced Python memory."""
+    from ml_utils import preprocess_image
+
+    def handle():
+        with app.test_request_context('/analyze_crop', method='POST', data=body, content_type=content_type):
+            return preprocess_image(extract())
+
+    handle()  # warm-up
+    timings, peaks = [], []
+    for _ in range(iterations):
+        tracemalloc.start()
+        start = time.perf_counter()
+        handle()
+        timings.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        'request_body_bytes': len(body),
+        'mean_ms': 1000 * float(np.mean(timings)),
+        'p95_ms': 1000 * float(np.percentile(timings, 95)),
+        'peak_python_alloc_mb': float(np.max(peaks)) / 1024 / 1024
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help='JPEG to upload (default: synthetic 12 MP photo)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    import main_production
+    from main_production import app, read_raw_image_body
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = make_synthetic_jpeg()
+
+    json_body = json.dumps({'image': base64.b64encode(image_bytes).decode('ascii')}).encode()
+    print(f"📷 Image: {len(image_bytes) / 1024 / 1024:.2f} MB raw, {len(json_body) / 1024 / 1024:.2f} MB as base64 JSON")
+
+    results = {
+        'json_base64': measure(app, json_body, 'application/json', lambda: request.get_json()['image'], args.iterations),
+        'raw_body': measure(app, image_bytes, 'image/jpeg', read_raw_image_body, args.iterations),
+    }
+    saved = {
+        'request_body_bytes': results['json_base64']['request_body_bytes'] - results['raw_body']['request_body_bytes'],
+        'latency_ms': results['json_base64']['mean_ms'] - results['raw_body']['mean_ms'],
+        'peak_python_alloc_mb': results['json_base64']['peak_python_alloc_mb'] - results['raw_body']['peak_python_alloc_mb']
+    }
+    for name, stats in results.items():
+        print(f"  {name:12s} body={stats['request_body_bytes'] / 1024 / 1024:6.2f}MB mean={stats['mean_ms']:7.2f}ms "
+              f"p95={stats['p95_ms']:7.2f}ms peak_alloc={stats['peak_python_alloc_mb']:6.2f}MB")
+    print(f"⚡ Raw body saves {saved['latency_ms']:.2f}ms and {saved['peak_python_alloc_mb']:.2f}MB per request")
+
+    report = {'iterations': args.iterations, 'results': results, 'saved_per_request': saved}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Merge the crop detector and the per-crop disease models into one multi-head graph.
+
+All six models are MobileNetV2 + GlobalAveragePooling + Dense(512) + Dense
+(create_model in the training scripts), so the cascade computes a backbone twice per
+image. The layers frozen during fine-tuning (FINE_TUNE_AT) still hold the same
+ImageNet weights in every model, so that prefix is computed once and the rest of
+each model becomes a named head:
+
+    image -> shared backbone prefix -> crop, disease_corn, disease_potato, ...
+
+The shared prefix is found by comparing weights and checked numerically, so the
+merged graph reproduces every original model. With --heads-only, the crop detector's
+whole backbone is shared and each disease model keeps only its Dense head. That is
+the cheapest graph, but the disease heads then see features they were not fine-tuned
+on; check the agreement reported by scripts/benchmark_shared_backbone.py before
+serving it.
+
+Writes <output-dir>/crop_disease_multihead.{keras,tflite,json}. With
+CASCADE_SHARED_BACKBONE=true the cascade engine (INFERENCE_MODE=cascade) loads them in
+place of the separate models; enable it only once the benchmark shows the merged graph
+is faster, which the exact-prefix graph often is not.
+
+Usage: python scripts/export_shared_backbone.py [--model-dir saved_models] [--heads-only]
+"""
+
+import os
+import sys
+import json
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import tensorflow as tf
+
+from config import CROP_LABEL_PATHS, DISEASE_LABELS_PATTERN
+from ml_utils import load_labels, compute_model_version
+from cascade import DETECTOR_MODEL_NAME, DISEASE_MODEL_PATTERN, SHARED_BACKBONE_MODEL_NAME, head_output_name
+
+def find_keras_model(model_dir, name):
+    for extension in ('.h5', '.keras'):
+        path = os.path.join(model_dir, name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+def weights_equal(layers):
+    """True if every layer in ``layers`` (same position in each model) holds identical weights."""
+    reference = layers[0].get_weights()
+    for layer in layers[1:]:
+        weights = layer.get_weights()
+        if len(weights) != len(reference) or not all(np.array_equal(a, b) for a, b in zip(reference, weights)):
+            return False
+    return True
+
+def find_shared_prefix_end(models):
+    """Index of the first layer whose weights differ between the models."""
+    reference = models[0]
+    for index, layer in enumerate(reference.layers):
+        layers = [model.layers[index] for model in models]
+        if any(type(other) is not type(layer) for other in layers) or not weights_equal(layers):
+            return index
+    return len(reference.layers)
+
+def split_model(model, cut_index):
+    """Tail of ``model`` from the output of layer ``cut_index`` to the model output."""
+    return tf.keras.Model(model.layers[cut_index].output, model.output)
+
+def find_cut(models, shared_end, sample):
+    """Deepest layer before ``shared_end`` whose output alone determines the rest of every model.
+
+    Cuts inside a residual block either fail to build or change the output, so each
+    candidate is verified against the original models on ``sample``.
+    """
+    expected = [model.predict(sample, verbose=0) for model in models]
+    for cut_index in range(min(shared_end, len(models[0].layers) - 1) - 1, 0, -1):
+        try:
+            prefix = tf.keras.Model(models[0].input, models[0].layers[cut_index].output)
+            features = prefix.predict(sample, verbose=0)
+            tails = [split_model(model, cut_index) for model in models]
+        except Exception:
+            continue
+        if all(np.allclose(tail.predict(features, verbose=0), output, atol=1e-4) for tail, output in zip(tails, expected)):
+            return cut_index, prefix, tails
+    raise RuntimeError("No layer cleanly splits the models; are they all create_model() architectures?")
+
+def find_backbone_output(model):
+    """Index of the last backbone layer (the input of GlobalAveragePooling2D)."""
+    for index, layer in enumerate(model.layers):
+        if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D):
+            return index - 1
+    raise RuntimeError(f"{model.name} has no GlobalAveragePooling2D layer")
+
+def build_multihead(prefix, heads):
+    """One graph: image -> prefix -> {output name: head}."""
+    inputs = tf.keras.Input(shape=prefix.input_shape[1:], name='image')
+    features = tf.keras.Model(prefix.input, prefix.output, name='shared_backbone')(inputs)
+    outputs = {name: tf.keras.Model(head.input, head.output, name=name)(features) for name, head in heads.items()}
+    return tf.keras.Model(inputs, outputs, name=SHARED_BACKBONE_MODEL_NAME)
+
+def map_tflite_outputs(tflite_model, keras_model, sample):
+    """TFLite output index for each named Keras output, matched on the same input."""
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    input_details = interpreter.get_input_details()
+    interpreter.resize_tensor_input(input_details[0]['index'], list(sample.shape))
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(input_details[0]['index'], sample)
+    interpreter.invoke()
+    tflite_outputs = [interpreter.get_tensor(output['index']) for output in interpreter.get_output_details()]
+
+    mapping = {}
+    for name, expected in keras_model.predict(sample, verbose=0).items():
+        for index, output in enumerate(tflite_outputs):
+            if index not in mapping.values() and output.shape == expected.shape and np.allclose(output, expected, atol=1e-3):
+                mapping[name] = index
+                break
+        else:
+            raise RuntimeError(f"Could not find the TFLite output for '{name}'")
+    return mapping
+
+def count_params(model):
+    return int(sum(np.prod(weight.shape) for weight in model.weights))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', default='saved_models', help='Directory with crop_detector_model.h5 and <crop>_disease_detector_model.h5')
+    parser.add_argument('--output-dir', help='Where to write the merged model (default: --model-dir)')
+    parser.add_argument('--heads-only', action='store_true', help="Share the crop detector's whole backbone; keep only the disease models' Dense heads")
+    parser.add_argument('--skip-tflite', action='store_true', help='Only write the Keras model')
+    args = parser.parse_args()
+    output_dir = args.output_dir or args.model_dir
+    os.makedirs(output_dir, exist_ok=True)
+
+    crop_labels = load_labels(CROP_LABEL_PATHS)
+    detector_path = find_keras_model(args.model_dir, DETECTOR_MODEL_NAME)
+    if not crop_labels or detector_path is None:
+        sys.exit(f"❌ Need {DETECTOR_MODEL_NAME}.h5 in {args.model_dir} and crop labels in {CROP_LABEL_PATHS}")
+
+    sources = {'crop': detector_path}
+    disease_labels = {}
+    for crop in crop_labels:
+        path = find_keras_model(args.model_dir, DISEASE_MODEL_PATTERN.format(crop=crop.lower()))
+        labels = load_labels([DISEASE_LABELS_PATTERN.format(crop=crop.lower())])
+        if path is None or not labels:
+            print(f"⚠️ No disease model for {crop}; the merged model will only report the crop")
+            disease_labels[crop] = None
+            continue
+        sources[head_output_name(crop)] = path
+        disease_labels[crop] = labels
+
+    print(f"📦 Loading {len(sources)} models from {args.model_dir}")
+    models = {name: tf.keras.models.load_model(path, compile=False) for name, path in sources.items()}
+    model_list = list(models.values())
+    input_shape = model_list[0].input_shape
+    if any(model.input_shape != input_shape for model in model_list):
+        sys.exit("❌ All models must have the same input shape")
+    sample = np.random.RandomState(0).rand(2, *input_shape[1:]).astype(np.float32)
+
+    shared_end = find_shared_prefix_end(model_list)
+    if args.heads_only:
+        cut_index = find_backbone_output(models['crop'])
+        prefix = tf.keras.Model(models['crop'].input, models['crop'].layers[cut_index].output)
+        heads = {name: split_model(model, cut_index) for name, model in models.items()}
+        print(f"✂️ Heads only: sharing all {cut_index + 1} backbone layers of the crop detector "
+              f"(weights are identical for the first {shared_end} layers)")
+    else:
+        cut_index, prefix, tails = find_cut(model_list, shared_end, sample)
+        heads = dict(zip(models.keys(), tails))
+        print(f"✂️ Weights identical for the first {shared_end} layers; sharing up to "
+              f"'{model_list[0].layers[cut_index].name}' (layer {cut_index})")
+
+    multihead = build_multihead(prefix, heads)
+    shared_params = count_params(prefix)
+    head_params = {name: count_params(head) for name, head in heads.items()}
+    print(f"🧮 Shared backbone: {shared_params:,} params; per head: "
+          + ", ".join(f"{name}={params:,}" for name, params in head_params.items()))
+    if not args.heads_only and max(head_params.values()) > shared_params:
+        print("⚠️ Most of each model lies past the shared prefix, and the merged graph runs every head for every "
+              "image, so it can be slower than the two-model cascade. --heads-only shares the whole backbone; "
+              "check its agreement on real photos with scripts/benchmark_shared_backbone.py --images <dir>.")
+
+    base_path = os.path.join(output_dir, SHARED_BACKBONE_MODEL_NAME)
+    multihead.save(base_path + '.keras')
+    print(f"✅ Keras model saved to {base_path}.keras")
+
+    description = {
+        'crop_labels': crop_labels,
+        'disease_labels': disease_labels,
+        'input_shape': list(input_shape[1:]),
+        'heads_only': args.heads_only,
+        'shared_layers': cut_index + 1,
+        'identical_layers': shared_end,
+        'shared_params': shared_params,
+        'head_params': head_params,
+        'sources': {name: compute_model_version(path) for name, path in sources.items()},
+        'outputs': {}
+    }
+    if not args.skip_tflite:
+        tflite_model = tf.lite.TFLiteConverter.from_keras_model(multihead).convert()
+        with open(base_path + '.tflite', 'wb') as f:
+            f.write(tflite_model)
+        description['outputs'] = map_tflite_outputs(tflite_model, multihead, sample)
+        print(f"✅ TFLite model saved to {base_path}.tflite ({len(tflite_model) / 1024 / 1024:.1f} MB)")
+
+    with open(base_path + '.json', 'w', encoding='utf-8') as f:
+        json.dump(description, f, indent=2, ensure_ascii=False)
+    print(f"📁 Output description written to {base_path}.json")
+    print("⏱️ Compare against the two-model cascade with: python scripts/benchmark_shared_backbone.py "
+          f"--model-dir {args.model_dir} --shared-dir {output_dir}")
+    print("🔧 The server keeps the separate models until CASCADE_SHARED_BACKBONE=true is set")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Load-test the ML server by replaying a request trace.
+
+Targets --url, or starts main_production:app locally under gunicorn (with this
+directory's gunicorn.conf.py) and waits until /health reports the model as loaded.
+
+A trace is a JSONL file with one request per line:
+    {"image": "photos/leaf1.jpg", "delay": 0.12, "user_id": "farmer-17"}
+- image: path relative to the trace file
+- delay: seconds since the previous request (or "at": seconds since the start)
+- user_id: sent as X-User-ID, which is the rate-limit key (optional)
+Without --trace, a Poisson trace of --count requests at --rate requests/second is
+generated over --images (or synthetic JPEGs); --save-trace writes it out for reuse.
+
+Requests are sent open-loop on schedule, at --speed times the trace speed, over up
+to --concurrency connections. Latency is measured from the scheduled send time, so
+time spent waiting for a free connection counts (no coordinated omission); the
+service time from the actual send is reported as well. The report has latency
+percentiles, status counts, error/429/503 rates and offered vs achieved throughput.
+
+Usage: python scripts/load_test.py [--url http://host:5000] [--trace trace.jsonl] [--speed 2] [--concurrency 64]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+def load_trace(path):
+    """[(offset seconds, image path, user id)] from a JSONL trace."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries = []
+    offset = 0.0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            offset = float(entry['at']) if 'at' in entry else offset + float(entry.get('delay', 0.0))
+            entries.append((offset, os.path.join(base_dir, entry['image']), entry.get('user_id')))
+    return sorted(entries, key=lambda entry: entry[0])
+
+def make_trace(image_paths, count, rate, users, seed=0):
+    """Poisson arrivals at ``rate`` requests/second, cycling through ``image_paths``."""
+    rng = random.Random(seed)
+    offset = 0.0
+    trace = []
+    for index in range(count):
+        offset += rng.expovariate(rate)
+        trace.append((offset, image_paths[index % len(image_paths)], f"load-test-{rng.randrange(users)}"))
+    return trace
+
+def save_trace(trace, path):
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, 'w', encoding='utf-8') as f:
+        for offset, image_path, user_id in trace:
+            f.write(json.dumps({'image': os.path.relpath(image_path, base_dir), 'at': round(offset, 6), 'user_id': user_id}) + '\n')
+
+def write_synthetic_images(directory, count, seed=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        pixels = rng.random((480, 640, 3)) * 60 + rng.random(3) * 190
+        path = os.path.join(directory, f"synthetic_{index}.jpg")
+        Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(path, format='JPEG', quality=90)
+        paths.append(path)
+    return paths
+
+def find_images(image_dir):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(image_dir) for name in files if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+def start_local_server(port, workers, threads, env_overrides):
+    """Start main_production:app under gunicorn and wait until the model is loaded."""
+    env = dict(os.environ, **env_overrides)
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}',
+               '-w', str(workers), '-k', 'gthread', '--threads', str(threads), '-t', '120', 'main_production:app']
+    # Server logs go to a file: an unread pipe would block the server once it fills up
+    log_file = tempfile.NamedTemporaryFile(prefix='load_test_server_', suffix='.log', delete=False)
+    process = subprocess.Popen(command, cwd=SERVER_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if process.poll() is not None:
+            with open(log_file.name, 'r', errors='replace') as f:
+                raise RuntimeError(f"Server exited with code {process.returncode}; log {log_file.name}:\n{f.read()[-2000:]}")
+        try:
+            if requests.get(f'{url}/health', timeout=2).json().get('model_loaded'):
+                print(f"📄 Server log: {log_file.name}")
+                return process, url
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not load its model within 300 seconds")
+
+class LoadRunner:
+    """Open-loop replay: each request is submitted at its scheduled time, whether or not earlier ones finished."""
+
+    def __init__(self, url, concurrency, timeout, upload):
+        self.url = url.rstrip('/') + '/analyze_crop'
+        self.timeout = timeout
+        self.upload = upload
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load')
+        self.local = threading.local()
+        self.image_cache = {}
+        self.lock = threading.Lock()
+        self.results = []
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def image_bytes(self, path):
+        if path not in self.image_cache:
+            with open(path, 'rb') as f:
+                self.image_cache[path] = f.read()
+        return self.image_cache[path]
+
+    def send(self, scheduled, image_path, user_id):
+        started = time.perf_counter()
+        headers = {'X-User-ID': user_id} if user_id else {}
+        image_bytes = self.image_bytes(image_path)
+        try:
+            if self.upload == 'raw':
+                headers['Content-Type'] = 'image/jpeg'
+                response = self.session().post(self.url, data=image_bytes, headers=headers, timeout=self.timeout)
+            else:
+                files = {'image': (os.path.basename(image_path), image_bytes, 'image/jpeg')}
+                response = self.session().post(self.url, files=files, headers=headers, timeout=self.timeout)
+            status, error = response.status_code, None
+        except requests.RequestException as e:
+            status, error = None, type(e).__name__
+        finished = time.perf_counter()
+        with self.lock:
+            self.results.append({
+                'status': status,
+                'error': error,
+                'latency': finished - scheduled,  # includes waiting for a free connection
+                'service_time': finished - started,
+                'start_lag': started - scheduled,
+                'finished': finished
+            })
+
+    def run(self, trace, speed):
+        self.start = time.perf_counter()
+        futures = []
+        for offset, image_path, user_id in trace:
+            scheduled = self.start + offset / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(self.executor.submit(self.send, scheduled, image_path, user_id))
+        for future in futures:
+            future.result()
+        self.executor.shutdown()
+        return self.results
+
+def percentiles(values):
+    if not values:
+        return None
+    values_ms = np.array(values) * 1000
+    return {
+        'p50_ms': float(np.percentile(values_ms, 50)),
+        'p90_ms': float(np.percentile(values_ms, 90)),
+        'p95_ms': float(np.percentile(values_ms, 95)),
+        'p99_ms': float(np.percentile(values_ms, 99)),
+        'max_ms': float(values_ms.max()),
+        'mean_ms': float(values_ms.mean())
+    }
+
+def summarize(results, trace, speed, start):
+    total = len(results)
+    statuses = {}
+    for result in results:
+        key = str(result['status']) if result['status'] is not None else result['error']
+        statuses[key] = statuses.get(key, 0) + 1
+    ok = [result for result in results if result['status'] == 200]
+    failed = total - len(ok)
+    duration = max(result['finished'] for result in results) - start
+    offered_duration = trace[-1][0] / speed if trace[-1][0] > 0 else duration
+    return {
+        'requests': total,
+        'duration_seconds': duration,
+        'offered_rps': total / offered_duration if offered_duration else None,
+        'achieved_rps': total / duration,
+        'successful_rps': len(ok) / duration,
+        'status_counts': statuses,
+        'error_rate': failed / total,
+        'rate_429': statuses.get('429', 0) / total,
+        'rate_503': statuses.get('503', 0) / total,
+        'latency': percentiles([result['latency'] for result in results]),
+        'latency_successful': percentiles([result['latency'] for result in ok]),
+        'service_time': percentiles([result['service_time'] for result in results]),
+        'start_lag': percentiles([result['start_lag'] for result in results])
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Server to test (default: start main_production:app locally)')
+    parser.add_argument('--trace', help='JSONL request trace (default: generated Poisson trace)')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed multiple of the trace timing')
+    parser.add_argument('--concurrency', type=int, default=32, help='Maximum concurrent connections')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+    parser.add_argument('--upload', choices=['multipart', 'raw'], default='multipart',
+                        help="multipart 'image' field (as the app sends) or a raw image/jpeg body")
+    parser.add_argument('--images', help='Image directory for a generated trace (default: synthetic JPEGs)')
+    parser.add_argument('--count', type=int, default=500, help='Requests in a generated trace')
+    parser.add_argument('--rate', type=float, default=20.0, help='Requests/second of a generated trace')
+    parser.add_argument('--users', type=int, default=50, help='Distinct X-User-ID values in a generated trace')
+    parser.add_argument('--save-trace', help='Write the generated trace to this JSONL file')
+    parser.add_argument('--port', type=int, default=5055, help='Port of the local server')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers of the local server')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker of the local server')
+    parser.add_argument('--server-env', action='append', default=[], metavar='NAME=VALUE',
+                        help='Environment override for the local server, e.g. RATE_LIMIT_REQUESTS=100000')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        # Synthetic images are kept next to a saved trace so it can be replayed later
+        image_dir = os.path.join(os.path.dirname(os.path.abspath(args.save_trace)), 'load_test_images') \
+            if args.save_trace else tempfile.mkdtemp(prefix='load_test_')
+        image_paths = find_images(args.images) if args.images else write_synthetic_images(image_dir, 16)
+        if not image_paths:
+            sys.exit(f"❌ No images found in {args.images}")
+        trace = make_trace(image_paths, args.count, args.rate, args.users)
+        if args.save_trace:
+            save_trace(trace, args.save_trace)
+            print(f"📝 Trace written to {args.save_trace}")
+    if not trace:
+        sys.exit("❌ Empty trace")
+
+    server = None
+    url = args.url
+    if url is None:
+        env_overrides = dict(item.split('=', 1) for item in args.server_env)
+        print(f"🚀 Starting main_production:app on port {args.port} ({args.workers} workers x {args.threads} threads)")
+        server, url = start_local_server(args.port, args.workers, args.threads, env_overrides)
+
+    try:
+        print(f"📈 Replaying {len(trace)} requests over {trace[-1][0] / args.speed:.1f}s ({args.speed}x) "
+              f"with up to {args.concurrency} connections against {url}")
+        runner = LoadRunner(url, args.concurrency, args.timeout, args.upload)
+        results = runner.run(trace, args.speed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = summarize(results, trace, args.speed, runner.start)
+    report.update({'url': url, 'trace': args.trace, 'speed': args.speed, 'concurrency': args.concurrency, 'upload': args.upload})
+    latency = report['latency']
+    print(f"  {report['achieved_rps']:.1f} req/s achieved ({report['offered_rps']:.1f} offered), "
+          f"{report['successful_rps']:.1f} successful/s")
+    print(f"  latency p50={latency['p50_ms']:.1f}ms p95={latency['p95_ms']:.1f}ms p99={latency['p99_ms']:.1f}ms max={latency['max_ms']:.1f}ms")
+    print(f"  errors {report['error_rate']:.1%} (429: {report['rate_429']:.1%}, 503: {report['rate_503']:.1%}); "
+          f"status counts {report['status_counts']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Accuracy and latency of the TFLite quantization modes against the float model.
+
+Converts one Keras model in float32 (the reference) and in each requested mode of
+tflite_conversion (float16, dynamic, int8 full-integer calibrated on the training
+split), runs every converted model over a labelled evaluation split one image at a
+time, and reports per mode:
+- model size
+- top-1 accuracy against the class directories, and the delta to float32
+- top-1 agreement with float32 and the mean absolute change of the class probabilities
+  (and of the health score for multitask models)
+- single-image latency (mean, p50, p95) with the server's TFLite runtime
+- the op histogram, including any Flex/custom ops that need the full TensorFlow runtime
+
+Usage: python scripts/quantization_report.py [--model saved_models/multitask_model.h5] [--eval-dir SplitData/test]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from config import LABEL_PATHS
+from ml_utils import load_labels, preprocess_image, get_tflite_interpreter_class, invoke_tflite
+from tflite_conversion import (
+    MODULE_DIR, CONVERSION_MODES, convert_keras_model, find_class_images, sample_representative_images,
+    REPRESENTATIVE_SAMPLES, get_keras_input_size, analyze_ops
+)
+
+EVAL_DATA_DIRS = [os.path.join(MODULE_DIR, 'SplitData', 'test'), os.path.join(MODULE_DIR, 'SplitData', 'val')]
+
+def load_image(path, input_size):
+    with open(path, 'rb') as f:
+        image_array = preprocess_image(f.read(), draft=False, size=input_size)
+    return image_array.copy() if image_array is not None else None
+
+def load_eval_images(eval_dirs, labels, max_images, input_size):
+    """(preprocessed images, label index or -1) from a split with one directory per class."""
+    label_index = {label.lower(): index for index, label in enumerate(labels)}
+    class_images = find_class_images(eval_dirs)
+    images, targets = [], []
+    queues = [(os.path.basename(class_dir), list(paths)) for class_dir, paths in sorted(class_images.items())]
+    while len(images) < max_images and any(paths for _, paths in queues):
+        for class_name, paths in queues:
+            if paths and len(images) < max_images:
+                image_array = load_image(paths.pop(0), input_size)
+                if image_array is not None:
+                    images.append(image_array)
+                    targets.append(label_index.get(class_name.lower(), -1))
+    return images, np.array(targets, dtype=np.int64)
+
+def run_tflite_model(tflite_model, images, num_threads):
+    """Outputs for every image (one invoke per image) and the per-image latencies in ms."""
+    interpreter = get_tflite_interpreter_class()(model_content=tflite_model, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    invoke_tflite(interpreter, images[0])  # warm-up
+
+    outputs, timings = [], []
+    for image in images:
+        start = time.perf_counter()
+        result = invoke_tflite(interpreter, image)
+        timings.append((time.perf_counter() - start) * 1000)
+        outputs.append(result)
+    # outputs[i][j] is output j of image i; stack to one (N, ...) array per output
+    return [np.concatenate([result[j] for result in outputs]) for j in range(len(outputs[0]))], np.array(timings)
+
+def split_outputs(outputs):
+    """(class probabilities, health scores or None): the widest output is the classification head."""
+    class_index = max(range(len(outputs)), key=lambda j: outputs[j].shape[-1])
+    others = [output for j, output in enumerate(outputs) if j != class_index]
+    return outputs[class_index], others[0] if others else None
+
+def evaluate_mode(tflite_model, images, targets, reference, num_threads):
+    outputs, timings = run_tflite_model(tflite_model, images, num_threads)
+    class_scores, health_scores = split_outputs(outputs)
+    predictions = np.argmax(class_scores, axis=1)
+    labelled = targets >= 0
+    stats = {
+        'size_mb': len(tflite_model) / (1024 * 1024),
+        'accuracy': float(np.mean(predictions[labelled] == targets[labelled])) if labelled.any() else None,
+        'latency_ms': {
+            'mean': float(timings.mean()),
+            'p50': float(np.percentile(timings, 50)),
+            'p95': float(np.percentile(timings, 95))
+        }
+    }
+    if reference is not None:
+        reference_scores, reference_health = reference
+        stats['top1_agreement'] = float(np.mean(predictions == np.argmax(reference_scores, axis=1)))
+        stats['mean_abs_probability_delta'] = float(np.mean(np.abs(class_scores - reference_scores)))
+        if health_scores is not None and reference_health is not None:
+            stats['mean_abs_health_score_delta'] = float(np.mean(np.abs(health_scores - reference_health)))
+    return stats, (class_scores, health_scores)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='saved_models/multitask_model.h5', help='Keras model to convert')
+    parser.add_argument('--modes', nargs='+', choices=CONVERSION_MODES[1:], default=['float16', 'dynamic', 'int8'],
+                        help='Modes to compare against float32')
+    parser.add_argument('--eval-dir', action='append',
+                        help='Labelled split with one directory per class (default: SplitData/test, then SplitData/val)')
+    parser.add_argument('--labels', help='Label file in model output order (default: labels.txt)')
+    parser.add_argument('--max-images', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=1, help='Interpreter threads for the latency runs')
+    parser.add_argument('--save-dir', help='Also write every converted model here as <name>_<mode>.tflite')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--representative-dir', action='append', help='int8 calibration split (default: SplitData/train, then Data)')
+    parser.add_argument('--num-samples', type=int, default=REPRESENTATIVE_SAMPLES, help='Number of int8 calibration images')
+    parser.add_argument('--int8-io', action='store_true', help='int8 mode: use int8 input/output tensors')
+    parser.add_argument('--builtins-only', action='store_true', help='Convert every mode without Flex ops (see tflite_conversion)')
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    model = tf.keras.models.load_model(args.model, compile=False)
+    input_size = get_keras_input_size(model)
+    labels = load_labels([args.labels] if args.labels else LABEL_PATHS)
+
+    images, targets = load_eval_images(args.eval_dir or EVAL_DATA_DIRS, labels, args.max_images, input_size)
+    eval_source = 'eval split'
+    if not images:
+        # No held-out split: agreement with float32 on training images is still meaningful
+        paths = sample_representative_images(args.representative_dir, args.max_images)
+        images = [image for image in (load_image(path, input_size) for path in paths) if image is not None]
+        targets = np.full(len(images), -1, dtype=np.int64)
+        eval_source = 'training split (no labelled eval split found; accuracy not reported)'
+    if not images:
+        sys.exit("❌ No images found; pass --eval-dir or --representative-dir")
+    print(f"📷 {len(images)} images from the {eval_source}, input size {input_size}")
+
+    options = {'data_dirs': args.representative_dir, 'num_samples': args.num_samples, 'int8_io': args.int8_io,
+               'builtins_only': args.builtins_only}
+    report = {'model': args.model, 'images': len(images), 'image_source': eval_source, 'threads': args.threads, 'modes': {}}
+    reference = None
+    for mode in ['float32'] + [mode for mode in args.modes if mode != 'float32']:
+        options['mode'] = mode
+        print(f"🔄 Converting ({mode})...")
+        tflite_model = convert_keras_model(model, **options)
+        if args.save_dir:
+            os.makedirs(args.save_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(args.model))[0]
+            with open(os.path.join(args.save_dir, f"{name}_{mode}.tflite"), 'wb') as f:
+                f.write(tflite_model)
+
+        stats, scores = evaluate_mode(tflite_model, images, targets, reference, args.threads)
+        stats['ops'] = analyze_ops(tflite_model)
+        if reference is None:
+            reference = scores
+        report['modes'][mode] = stats
+
+    baseline = report['modes']['float32']
+    for mode, stats in report['modes'].items():
+        stats['speedup'] = baseline['latency_ms']['mean'] / stats['latency_ms']['mean']
+        if stats['accuracy'] is not None:
+            stats['accuracy_delta'] = stats['accuracy'] - baseline['accuracy']
+        accuracy = f"acc {stats['accuracy']:.1%}" if stats['accuracy'] is not None else "acc n/a"
+        agreement = f"agree {stats['top1_agreement']:.1%}" if 'top1_agreement' in stats else "reference"
+        print(f"  {mode:8s} {stats['size_mb']:6.2f} MB  {accuracy:10s}  {agreement:12s}  "
+              f"p50 {stats['latency_ms']['p50']:6.2f} ms  p95 {stats['latency_ms']['p95']:6.2f} ms  {stats['speedup']:.2f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
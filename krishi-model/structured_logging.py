@@ -0,0 +1,141 @@
+"""
+Logging setup for the Krishi Sahayak ML servers.
+
+- Records go through a bounded in-process queue: the request thread only enqueues the
+  record, and a QueueListener thread formats it and writes it to stderr. When the
+  queue is full, records are dropped (and counted) instead of blocking requests.
+- LOG_FORMAT=json writes one JSON object per line; the default text format is unchanged.
+- log_event() writes a record with structured fields, e.g. the one summary record per
+  request; in text mode the fields are rendered as key=value pairs.
+- Per-request verbose diagnostics (image sizes, class scores) are only logged for a
+  LOG_SAMPLE_RATE fraction of requests, and for every traced request, see is_verbose().
+
+Formatting happens on the listener thread, so arguments passed to a log call must not
+be mutated afterwards. Threads do not survive a fork, so a forked child (e.g. a gunicorn
+worker forked by a master that configured logging) rebuilds the queue and listener.
+"""
+
+import os
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from config import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+current = threading.local()
+listener = None
+listener_pid = None  # process whose thread runs ``listener``
+settings = None  # configure_logging() arguments, reused after a fork
+
+class Fields(dict):
+    """Structured log fields; str() renders them lazily as key=value pairs."""
+
+    def __str__(self):
+        return ' '.join(f"{key}={value}" for key, value in self.items() if value is not None)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; records from log_event() carry their fields as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        fields = getattr(record, 'fields', None)
+        if fields is not None:
+            entry['event'] = record.event
+            entry.update(fields)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that hands records over unformatted and drops them when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock prepare() formats the message and traceback on the calling thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, queue_size=LOG_QUEUE_SIZE):
+    """Route the root logger through a queue to a stderr handler on a listener thread.
+
+    Repeated calls in the same process return the running listener. A process forked
+    after this call gets its own queue and listener (see restart_after_fork).
+    """
+    global listener, listener_pid, settings
+    if listener is not None and listener_pid == os.getpid():
+        return listener
+
+    settings = (level, log_format, queue_size)
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    log_queue = queue.Queue(maxsize=queue_size)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    listener_pid = os.getpid()
+    return listener
+
+def restart_after_fork():
+    """Replace the listener inherited from the parent, whose thread did not survive the fork."""
+    if settings is not None and listener_pid != os.getpid():
+        configure_logging(*settings)
+
+def stop_logging():
+    """Flush queued records and stop this process's listener."""
+    global listener
+    if listener is not None and listener_pid == os.getpid():
+        listener.stop()
+        listener = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=restart_after_fork)
+atexit.register(stop_logging)  # flush queued records on shutdown
+
+def get_dropped_records():
+    """Records dropped because the log queue was full."""
+    return sum(getattr(handler, 'dropped', 0) for handler in logging.getLogger().handlers)
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """Log ``event`` with structured ``fields``; fields whose value is None are left out."""
+    if logger.isEnabledFor(level):
+        fields = Fields((key, value) for key, value in fields.items() if value is not None)
+        logger.log(level, '%s %s', event, fields, extra={'event': event, 'fields': fields})
+
+def start_request(force_verbose=False, sample_rate=LOG_SAMPLE_RATE):
+    """Decide whether the request handled by this thread logs verbose diagnostics."""
+    current.verbose = force_verbose or (sample_rate > 0 and random.random() < sample_rate)
+    return current.verbose
+
+def end_request():
+    current.verbose = False
+
+def is_verbose():
+    """True if the current request was sampled for verbose diagnostics."""
+    return getattr(current, 'verbose', False)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The server modules are flat files in krishi-model/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
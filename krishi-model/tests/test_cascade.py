@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+
+import pytest
+
+import cascade
+
+@pytest.fixture
+def engines(monkeypatch):
+    shared = SimpleNamespace(is_tflite=True, version='shared@1')
+    separate = SimpleNamespace(is_tflite=True, version='cascade@1')
+    monkeypatch.setattr(cascade, 'load_shared_backbone_model', lambda model_dirs: shared)
+    monkeypatch.setattr(cascade, 'load_separate_models', lambda model_dirs: separate)
+    return shared, separate
+
+def test_separate_models_are_served_unless_the_shared_backbone_is_enabled(engines):
+    shared, separate = engines
+    assert cascade.load_cascade_model(['models'], shared_backbone=False)[0] is separate
+    assert cascade.load_cascade_model(['models'], shared_backbone=True)[0] is shared
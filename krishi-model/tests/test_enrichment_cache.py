@@ -0,0 +1,101 @@
+import time
+import threading
+
+import pytest
+
+from ml_utils import EnrichmentCache
+
+class FailingSource:
+    def __init__(self):
+        self.calls = 0
+        self.failing = True
+
+    def __call__(self, label, language):
+        self.calls += 1
+        if self.failing:
+            raise RuntimeError('source unavailable')
+        return f'{label}/{language}'
+
+def test_failed_load_is_not_retried_within_the_backoff():
+    source = FailingSource()
+    cache = EnrichmentCache(source, ttl=60, stale_ttl=60, failure_backoff=0.2)
+    for _ in range(10):
+        with pytest.raises(RuntimeError):
+            cache.get('Rice_Blast', 'en', timeout=1)
+    assert source.calls == 1
+    assert cache.get('Rice_Blast', 'en', wait=False) is None
+    assert source.calls == 1
+
+    time.sleep(0.25)
+    source.failing = False
+    assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en'
+    assert source.calls == 2
+
+def test_stale_value_is_served_while_backing_off():
+    source = FailingSource()
+    source.failing = False
+    cache = EnrichmentCache(source, ttl=0.05, stale_ttl=0.05, failure_backoff=10)
+    assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en'
+    time.sleep(0.1)
+    source.failing = True
+    # The expired value is returned when the refresh fails, and again without a new load
+    for _ in range(5):
+        assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en'
+    assert source.calls == 2
+
+class SlowSource:
+    """Returns a new version of the text on every load; loads block until released."""
+
+    def __init__(self):
+        self.version = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, label, language):
+        self.release.wait(timeout=2)
+        self.version += 1
+        return f'{label}/{language}/v{self.version}'
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_fresh_entries_are_served_without_reloading():
+    source = SlowSource()
+    cache = EnrichmentCache(source, ttl=60, stale_ttl=120)
+    assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en/v1'
+    assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en/v1'
+    assert source.version == 1
+    assert cache.get_stats()['hits'] == 1
+
+def test_stale_entry_is_served_while_it_refreshes_in_the_background():
+    source = SlowSource()
+    cache = EnrichmentCache(source, ttl=0.05, stale_ttl=60)
+    assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en/v1'
+    time.sleep(0.1)
+
+    source.release.clear()
+    # Served at once although the refresh is blocked
+    assert cache.get('Rice_Blast', 'en', timeout=0.5) == 'Rice_Blast/en/v1'
+    assert cache.get('Rice_Blast', 'en', timeout=0.5) == 'Rice_Blast/en/v1'
+    assert cache.get_stats()['stale_hits'] == 2
+    assert cache.get_stats()['refreshing'] == 1  # both requests share one refresh
+
+    source.release.set()
+    assert wait_until(lambda: cache.peek('Rice_Blast', 'en') == 'Rice_Blast/en/v2')
+    assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en/v2'
+
+def test_fully_expired_entry_waits_for_the_reload():
+    source = SlowSource()
+    cache = EnrichmentCache(source, ttl=0.05, stale_ttl=0.05)
+    assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en/v1'
+    time.sleep(0.1)
+    assert cache.get('Rice_Blast', 'en', timeout=1) == 'Rice_Blast/en/v2'
+
+def test_missing_entry_without_wait_returns_none_and_loads_in_the_background():
+    source = SlowSource()
+    cache = EnrichmentCache(source, ttl=60, stale_ttl=60)
+    assert cache.get('Rice_Blast', 'hi', wait=False) is None
+    assert wait_until(lambda: cache.peek('Rice_Blast', 'hi') == 'Rice_Blast/hi/v1')
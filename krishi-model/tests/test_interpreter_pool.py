@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import ml_utils
+from ml_utils import InterpreterPool, run_model_outputs
+
+class FakeInterpreter:
+    """Echoes its input; counts tensor allocations."""
+    allocations = 0
+
+    def __init__(self, model_content, num_threads):
+        self.shape = [1, 4, 4, 3]
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': np.array(self.shape), 'dtype': np.float32, 'quantization': (0.0, 0)}]
+
+    def get_output_details(self):
+        return [{'index': 1, 'shape': np.array(self.shape), 'dtype': np.float32, 'quantization': (0.0, 0)}]
+
+    def resize_tensor_input(self, index, shape):
+        self.shape = list(shape)
+
+    def allocate_tensors(self):
+        FakeInterpreter.allocations += 1
+
+    def set_tensor(self, index, value):
+        assert list(value.shape) == self.shape
+        self.value = value
+
+    def invoke(self):
+        pass
+
+    def get_tensor(self, index):
+        return self.value
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ml_utils, 'get_tflite_interpreter_class', lambda: FakeInterpreter)
+    FakeInterpreter.allocations = 0
+    return InterpreterPool(b'model', pool_size=1, batch_sizes=[1, 4, 8])
+
+def test_batches_are_padded_to_the_allocated_sizes(pool):
+    for size in [1, 3, 8, 3, 1, 2, 5, 8, 7, 4]:
+        batch = np.random.rand(size, 4, 4, 3).astype(np.float32)
+        outputs = run_model_outputs(pool, batch, is_tflite_model=True)
+        np.testing.assert_array_equal(outputs[0], batch)
+    # The model's own batch size 1, then 4 and 8 once each
+    assert FakeInterpreter.allocations == 3
+    assert pool.get_stats()['tensor_allocations'] == 3
+
+def test_batches_larger_than_the_largest_size_run_in_chunks(pool):
+    batch = np.random.rand(19, 4, 4, 3).astype(np.float32)
+    np.testing.assert_array_equal(run_model_outputs(pool, batch, is_tflite_model=True)[0], batch)
+    assert FakeInterpreter.allocations == 3
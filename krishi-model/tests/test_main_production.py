@@ -0,0 +1,106 @@
+import io
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip('flask')
+import main_production
+import ml_utils
+from ml_utils import QueueFullError
+
+def jpeg_bytes(color, size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client with a stub model version active; nothing is actually inferred."""
+    monkeypatch.setattr(main_production.model_registry, 'loader_fn',
+                        lambda paths: (SimpleNamespace(input_size=(32, 32)), True, False, 'stub@1'))
+    main_production.model_registry.load()
+    return main_production.app.test_client()
+
+def test_queued_image_is_not_the_reusable_thread_buffer(client, monkeypatch):
+    submitted = []
+
+    def submit(item, lane=None):
+        submitted.append(item[1])
+        future = Future()
+        future.set_exception(QueueFullError('full', retry_after=1))
+        return future
+
+    monkeypatch.setattr(main_production.ml_queue_manager, 'submit', submit)
+    client.post('/analyze_crop', data=jpeg_bytes((255, 0, 0)), content_type='image/jpeg',
+                headers={'X-User-ID': 'buffer-test'})
+    queued = submitted[0].copy()
+    # The request thread's next preprocessing must not overwrite the queued tensor
+    ml_utils.preprocess_image(jpeg_bytes((0, 0, 255)), size=(32, 32))
+    assert submitted[0] is not ml_utils.get_input_buffer(np.float32, (32, 32))
+    np.testing.assert_array_equal(submitted[0], queued)
+
+@pytest.mark.parametrize('route', ['/analyze_crop', '/analyze_crop/background'])
+def test_truncated_image_is_a_bad_request(client, route):
+    image = jpeg_bytes((0, 128, 0), size=(640, 480))
+    response = client.post(route, data=image[:len(image) // 2], content_type='image/jpeg',
+                           headers={'X-User-ID': 'truncated-test'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid image file'
+
+def test_decompression_bomb_is_a_bad_request(client, monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 100)  # 64x48 is over twice the limit
+    response = client.post('/analyze_crop', data=jpeg_bytes((0, 0, 128)), content_type='image/jpeg',
+                           headers={'X-User-ID': 'bomb-test'})
+    assert response.status_code == 400
+
+def test_queue_full_is_a_503_with_retry_after(client, monkeypatch):
+    def enter(lane=None):
+        raise QueueFullError('full', retry_after=2.3)
+
+    monkeypatch.setattr(main_production.ml_queue_manager, 'enter', enter)
+    response = client.post('/analyze_crop', data=jpeg_bytes((255, 255, 0)), content_type='image/jpeg',
+                           headers={'X-User-ID': 'queue-full-test'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert response.get_json()['retry_after'] == 3
+
+def test_traced_request_reports_its_stages(client, monkeypatch):
+    def predict_batch(model, image_arrays, labels, is_tflite, is_multitask, stage_timer):
+        with stage_timer('invoke'):
+            pass
+        with stage_timer('postprocess'):
+            return [{'crop_type': 'Rice___healthy', 'confidence': 0.9} for _ in image_arrays]
+
+    queue = ml_utils.MLQueueManager(batch_window=0.001)
+    queue.start(main_production.run_prediction_batch)
+    monkeypatch.setattr(main_production, 'ml_queue_manager', queue)
+    monkeypatch.setattr(main_production, 'predict_batch', predict_batch)
+    response = client.post('/analyze_crop', data=jpeg_bytes((12, 34, 56)), content_type='image/jpeg',
+                           headers={'X-User-ID': 'trace-test', main_production.REQUEST_TRACE_HEADER: '1'})
+
+    assert response.status_code == 200
+    trace = response.get_json()['trace']
+    assert trace['batch_size'] == 1 and trace['lane'] == 'interactive'
+    # Stages of the request thread nest; the batch worker's are recorded under batch_wait
+    for stage in ['decode', 'preprocess', 'preprocess.pil_decode', 'preprocess.resize',
+                  'batch_wait', 'batch_wait.invoke', 'batch_wait.postprocess', 'enrichment']:
+        assert stage in trace['stages_ms']
+    timings = [entry.split(';')[0] for entry in response.headers['Server-Timing'].split(', ')]
+    assert sorted(timings) == sorted(list(trace['stages_ms']) + ['total'])
+
+def test_untraced_request_has_no_trace(client, monkeypatch):
+    def submit(item, lane=None):
+        assert item[2] is None
+        future = Future()
+        future.set_result({'crop_type': 'Rice___healthy', 'confidence': 0.9})
+        return future
+
+    monkeypatch.setattr(main_production.ml_queue_manager, 'submit', submit)
+    response = client.post('/analyze_crop', data=jpeg_bytes((65, 43, 21)), content_type='image/jpeg',
+                           headers={'X-User-ID': 'untraced-test'})
+    assert response.status_code == 200
+    assert 'trace' not in response.get_json()
+    assert 'Server-Timing' not in response.headers
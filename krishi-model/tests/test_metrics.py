@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import ServerMetrics
+
+def test_cascade_stages_are_exported_from_the_metrics_registry(monkeypatch):
+    pytest.importorskip('prometheus_client')
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    server_metrics = ServerMetrics()
+    server_metrics.start()
+    detector = SimpleNamespace(name='crop_detector', crop=None)
+    disease = SimpleNamespace(name='disease', crop='Rice')
+
+    server_metrics.observe_cascade_stage(detector, 4, 0.02)
+    server_metrics.observe_cascade_stage(detector, 2, 0.01)
+    server_metrics.observe_cascade_stage(disease, 3, 0.005)
+
+    exposition = server_metrics.generate()
+    assert 'ml_server_cascade_stage_seconds_count{crop="",stage="crop_detector"} 2.0' in exposition
+    assert 'ml_server_cascade_stage_images_total{crop="",stage="crop_detector"} 6.0' in exposition
+    assert 'ml_server_cascade_stage_images_total{crop="Rice",stage="disease"} 3.0' in exposition
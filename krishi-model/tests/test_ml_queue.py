@@ -0,0 +1,110 @@
+import time
+from collections import Counter
+
+import pytest
+
+from ml_utils import MLQueueManager, QueueFullError
+
+def wait_for_workers(manager, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and sum(worker.is_alive() for worker in manager.workers) != count:
+        time.sleep(0.01)
+    return sum(worker.is_alive() for worker in manager.workers)
+
+def test_set_workers_grows_and_shrinks_the_scheduler():
+    manager = MLQueueManager(batch_window=0.001)
+    manager.start(lambda items: [item * 2 for item in items], num_workers=1)
+    assert wait_for_workers(manager, 1) == 1
+
+    manager.set_workers(4)
+    assert wait_for_workers(manager, 4) == 4
+    manager.set_workers(2)
+    assert wait_for_workers(manager, 2) == 2
+    assert [manager.submit(item).result(timeout=2) for item in range(5)] == [0, 2, 4, 6, 8]
+
+def test_batch_with_missing_results_fails_every_request():
+    manager = MLQueueManager(batch_window=0.05)
+    manager.start(lambda items: [item * 2 for item in items][:-1])
+    futures = [manager.submit(item) for item in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match='results for'):
+            future.result(timeout=2)
+
+def test_in_flight_cap_applies_only_while_other_lanes_are_busy():
+    manager = MLQueueManager(lane_weights={'interactive': 8.0, 'background': 1.0},
+                             max_in_flight={'background': 2})
+    # Idle server: background requests are not capped
+    for _ in range(5):
+        manager.enter('background')
+    manager.enter('interactive')
+    with pytest.raises(QueueFullError):
+        manager.enter('background')
+    manager.leave('interactive')
+    manager.enter('background')
+    assert manager.get_admission_stats()['lanes']['background']['in_flight'] == 6
+
+def test_full_lane_rejects_with_a_guess_before_the_first_batch():
+    manager = MLQueueManager(max_queue_size=2, max_wait=0)  # not started: requests stay queued
+    manager.submit('a')
+    manager.submit('b')
+    with pytest.raises(QueueFullError) as rejected:
+        manager.submit('c')
+    assert rejected.value.retry_after == 1.0
+    assert manager.get_admission_stats()['lanes']['interactive']['rejected'] == 1
+
+def test_retry_after_is_the_estimated_wait_of_the_lane():
+    manager = MLQueueManager(max_queue_size=0, max_wait=1.5, lane_weights={'interactive': 3.0, 'background': 1.0})
+    manager.item_seconds = 0.5  # as if measured from earlier batches
+    for item in range(3):
+        manager.submit(item)
+    # A fourth request would wait 4 * 0.5s, over max_wait
+    with pytest.raises(QueueFullError) as rejected:
+        manager.submit(3)
+    assert rejected.value.retry_after == pytest.approx(2.0)
+
+    # Behind the backlogged interactive lane, background gets a quarter of the rate
+    with pytest.raises(QueueFullError) as rejected:
+        manager.submit('bulk', lane='background')
+    assert rejected.value.retry_after == pytest.approx(0.5 / 0.25)
+    assert manager.get_admission_stats()['lanes']['background']['rejected'] == 1
+
+def next_batch_lanes(manager):
+    entries, _ = manager._next_batch()
+    return [lane for _, _, _, lane, _ in entries]
+
+def test_backlogged_lanes_share_batches_by_weight():
+    manager = MLQueueManager(max_batch_size=9, batch_window=0, max_queue_size=0, max_wait=0,
+                             lane_weights={'interactive': 8.0, 'background': 1.0})
+    for item in range(4):
+        manager.submit(item, lane='background')
+    for item in range(24):
+        manager.submit(item, lane='interactive')
+
+    # 8 interactive requests per background one, although background queued first
+    assert next_batch_lanes(manager) == ['interactive', 'background'] + ['interactive'] * 7
+    for _ in range(2):
+        assert Counter(next_batch_lanes(manager)) == {'interactive': 8, 'background': 1}
+
+def test_lane_alone_gets_every_batch_slot():
+    manager = MLQueueManager(max_batch_size=4, batch_window=0, max_queue_size=0, max_wait=0,
+                             lane_weights={'interactive': 8.0, 'background': 1.0})
+    for item in range(6):
+        manager.submit(item, lane='background')
+    assert next_batch_lanes(manager) == ['background'] * 4
+
+    # A request arriving later is not owed the lane's backlog
+    manager.submit('photo', lane='interactive')
+    assert next_batch_lanes(manager) == ['interactive', 'background', 'background']
+
+def test_in_flight_cap_is_released_by_leave():
+    manager = MLQueueManager(lane_weights={'interactive': 8.0, 'background': 1.0},
+                             max_in_flight={'background': 1})
+    manager.enter('interactive')
+    manager.enter('background')
+    with pytest.raises(QueueFullError):
+        manager.enter('background')
+    manager.leave('background')
+    manager.enter('background')
+    # Interactive requests are never capped
+    for _ in range(10):
+        manager.enter('interactive')
@@ -0,0 +1,38 @@
+import threading
+
+from model_registry import ModelRegistry
+
+class StubModel:
+    input_size = (32, 32)
+
+def stub_loader(paths):
+    version = paths[0] if paths else 'default'
+    return StubModel(), True, False, version
+
+def test_hot_reload_with_one_version_swaps_in_the_new_one():
+    registry = ModelRegistry(loader=stub_loader, max_versions=1)
+    registry.load('v1')
+    handle = registry.load('v2')
+    assert registry.get_active() is handle
+    assert [info['version'] for info in registry.get_stats()['versions']] == ['v2']
+
+def test_older_versions_are_evicted_after_activation():
+    registry = ModelRegistry(loader=stub_loader, max_versions=2)
+    for version in ('v1', 'v2', 'v3'):
+        registry.load(version)
+    assert registry.get_active().version == 'v3'
+    assert [info['version'] for info in registry.get_stats()['versions']] == ['v2', 'v3']
+
+def test_only_one_background_load_runs_at_a_time():
+    release = threading.Event()
+
+    def slow_loader(paths):
+        release.wait(timeout=2)
+        return stub_loader(paths)
+
+    registry = ModelRegistry(loader=slow_loader, max_versions=2)
+    first = registry.load_async('v1')
+    assert registry.load_async('v2') is None
+    release.set()
+    assert first.result(timeout=2).version == 'v1'
+    assert registry.load_async('v2').result(timeout=2).version == 'v2'
@@ -0,0 +1,72 @@
+import time
+import threading
+
+import pytest
+
+from ml_utils import PredictionCache
+
+def test_concurrent_requests_for_one_image_share_a_single_inference():
+    cache = PredictionCache(max_entries=16, cache_dir=None)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(timeout=2)
+        return {'crop_type': 'Rice_Blast', 'confidence': 0.9}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute, timeout=2)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while cache.get_stats()['coalesced'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ['coalesced'] * 4 + ['model']
+    assert all(result == {'crop_type': 'Rice_Blast', 'confidence': 0.9} for result, _ in results)
+    assert cache.get_or_compute('key', compute) == ({'crop_type': 'Rice_Blast', 'confidence': 0.9}, 'memory')
+
+def test_a_failed_inference_is_not_cached():
+    cache = PredictionCache(max_entries=16, cache_dir=None)
+
+    def fail():
+        raise RuntimeError('model failed')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('key', fail)
+    assert cache.get_or_compute('key', lambda: {'crop_type': 'Healthy'}) == ({'crop_type': 'Healthy'}, 'model')
+
+def test_returned_results_are_copies():
+    cache = PredictionCache(max_entries=16, cache_dir=None)
+    result, _ = cache.get_or_compute('key', lambda: {'crop_type': 'Healthy'})
+    result['model_version'] = 'v1'
+    assert cache.get_or_compute('key', lambda: None)[0] == {'crop_type': 'Healthy'}
+
+def test_disk_tier_survives_a_new_cache_instance(tmp_path):
+    first = PredictionCache(max_entries=16, cache_dir=str(tmp_path))
+    first.get_or_compute('key', lambda: {'crop_type': 'Potato_Late_Blight', 'confidence': 0.8})
+
+    # A recycled worker starts with an empty memory tier but the same directory
+    second = PredictionCache(max_entries=16, cache_dir=str(tmp_path))
+    result, source = second.get_or_compute('key', lambda: pytest.fail('recomputed a cached prediction'))
+    assert (result, source) == ({'crop_type': 'Potato_Late_Blight', 'confidence': 0.8}, 'disk')
+    assert second.get_or_compute('key', lambda: None)[1] == 'memory'
+
+def test_keys_depend_on_the_model_version():
+    assert PredictionCache.make_key(b'image', 'v1') != PredictionCache.make_key(b'image', 'v2')
+    assert PredictionCache.make_key(b'image', 'v1') == PredictionCache.make_key(b'image', 'v1')
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = PredictionCache(max_entries=2, cache_dir=None)
+    for key in ('a', 'b'):
+        cache.get_or_compute(key, lambda key=key: {'key': key})
+    cache.get_or_compute('a', lambda: None)  # 'a' is now the most recent
+    cache.get_or_compute('c', lambda: {'key': 'c'})
+    assert cache.get_or_compute('a', lambda: None)[1] == 'memory'
+    assert cache.get_or_compute('b', lambda: {'key': 'b'})[1] == 'model'
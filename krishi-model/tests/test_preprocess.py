@@ -0,0 +1,42 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ml_utils import preprocess_image
+
+def encode(size, format):
+    # A gradient rather than a flat colour, so reduced decoding has detail to lose
+    x = np.linspace(0, 255, size[0], dtype=np.uint8)
+    y = np.linspace(0, 255, size[1], dtype=np.uint8)
+    pixels = np.dstack(np.broadcast_arrays(x[None, :], y[:, None], np.full((size[1], size[0]), 96, np.uint8)))
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format)
+    return buffer.getvalue()
+
+@pytest.fixture
+def decoded_sizes(monkeypatch):
+    """Sizes images have when preprocess_image resizes them, i.e. as decoded."""
+    sizes = []
+    resize = Image.Image.resize
+
+    def record(self, *args, **kwargs):
+        sizes.append(self.size)
+        return resize(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, 'resize', record)
+    return sizes
+
+def test_draft_mode_decodes_jpegs_at_the_smallest_scale_covering_the_input(decoded_sizes):
+    image = encode((1600, 1200), 'JPEG')
+    draft = preprocess_image(image, draft=True, size=(224, 224)).copy()
+    full = preprocess_image(image, draft=False, size=(224, 224))
+
+    # 1/8 would be 200x150, below 224x224, so the decoder scales by 1/4
+    assert decoded_sizes == [(400, 300), (1600, 1200)]
+    assert np.abs(draft - full).mean() < 0.02
+
+def test_draft_mode_leaves_other_formats_at_full_size(decoded_sizes):
+    preprocess_image(encode((1600, 1200), 'PNG'), draft=True, size=(224, 224))
+    assert decoded_sizes == [(1600, 1200)]
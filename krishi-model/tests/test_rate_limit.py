@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from rate_limit import RateLimiter, RedisRateLimiter, SharedMemoryRateLimiter
+
+# Pairs where window / limit is not exact in floating point
+LIMIT_WINDOWS = [(7, 3600), (9, 60), (17, 60), (3, 10), (11, 7), (100, 3600), (1, 1)]
+
+def make_local(limit, window, tmp_path):
+    return RateLimiter(limit, window, evict_interval=None)
+
+def make_shared_memory(limit, window, tmp_path):
+    return SharedMemoryRateLimiter(limit, window, path=str(tmp_path / 'rate_limit'), slots=4096)
+
+def make_redis(limit, window, tmp_path):
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # fakeredis runs EVALSHA through lupa
+    return RedisRateLimiter(limit, window, client=fakeredis.FakeStrictRedis(), fail_open=False)
+
+@pytest.mark.parametrize('now', [0.0, 1700000000.123456])
+@pytest.mark.parametrize('limit, window', LIMIT_WINDOWS)
+@pytest.mark.parametrize('make_limiter', [make_local, make_shared_memory, make_redis])
+def test_allows_exactly_limit_requests_in_a_burst(make_limiter, limit, window, now, tmp_path, monkeypatch):
+    # Frozen clock, so the burst is simultaneous for fakeredis's TIME as well
+    monkeypatch.setattr(time, 'time', lambda: now)
+    limiter = make_limiter(limit, window, tmp_path)
+    decisions = [limiter.check('farmer') for _ in range(limit + 1)]
+    assert [decision.allowed for decision in decisions] == [True] * limit + [False]
+    assert decisions[limit - 1].remaining == 0
+    assert decisions[limit].retry_after > 0
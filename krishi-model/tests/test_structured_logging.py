@@ -0,0 +1,29 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Configures logging, then forks like a gunicorn master; the child logs and exits normally
+FORK_SCRIPT = """
+import os, logging
+import structured_logging
+structured_logging.configure_logging(level='INFO', log_format='text')
+logging.getLogger('parent').info('parent record')
+pid = os.fork()
+if pid == 0:
+    logging.getLogger('child').info('child record %d', os.getpid())
+    raise SystemExit(0)
+_, status = os.waitpid(pid, 0)
+print(os.waitstatus_to_exitcode(status))
+"""
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_records_are_written():
+    completed = subprocess.run([sys.executable, '-c', FORK_SCRIPT], cwd=MODEL_DIR, capture_output=True,
+                               text=True, timeout=30)
+    assert completed.stdout.strip() == '0'
+    assert 'parent record' in completed.stderr
+    assert 'child record' in completed.stderr
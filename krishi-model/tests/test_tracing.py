@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+import tracing
+from tracing import RequestTrace, SamplingProfiler
+
+def test_spans_nest_and_repeated_stages_add_up():
+    trace = RequestTrace()
+    with trace.span('preprocess'):
+        with trace.span('resize'):
+            time.sleep(0.002)
+    trace.record('invoke', 0.010)
+    trace.record('invoke', 0.005)
+
+    assert list(trace.stages) == ['preprocess.resize', 'preprocess', 'invoke']
+    assert trace.stages['preprocess'] >= trace.stages['preprocess.resize'] >= 0.002
+    assert trace.stages['invoke'] == pytest.approx(0.015)
+    assert trace.server_timing().startswith('preprocess.resize;dur=')
+    assert 'invoke;dur=15.000' in trace.server_timing()
+
+def test_span_is_a_no_op_without_a_trace_on_the_thread():
+    tracing.end_trace()
+    with tracing.span('decode'):
+        pass
+    trace = tracing.start_trace()
+    try:
+        with tracing.span('decode'):
+            pass
+        assert list(trace.stages) == ['decode']
+        # The trace is bound to this thread only
+        seen = []
+        worker = threading.Thread(target=lambda: seen.append(tracing.current_trace()))
+        worker.start()
+        worker.join()
+        assert seen == [None]
+    finally:
+        tracing.end_trace()
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_profiler_finds_the_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), daemon=True)
+    worker.start()
+    try:
+        report = SamplingProfiler(interval=0.002).profile(0.2)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert report['samples'] > 0
+    assert 'test_tracing.py:spin' in [entry['function'] for entry in report['functions_total']]
+
+def test_only_one_profile_runs_at_a_time():
+    profiler = SamplingProfiler(interval=0.002)
+    profiler.lock.acquire()
+    try:
+        with pytest.raises(RuntimeError, match='already running'):
+            profiler.profile(0.01)
+    finally:
+        profiler.lock.release()
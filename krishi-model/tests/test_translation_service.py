@@ -0,0 +1,53 @@
+from translation_service import TranslationService
+
+class FakePipeline:
+    """Stands in for the transformers pipeline and records every batch it is given"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, sentences, batch_size=None, truncation=False):
+        self.batches.append(list(sentences))
+        return [{'translation_text': sentence.upper()} for sentence in sentences]
+
+def make_service(**kwargs):
+    service = TranslationService(model_name='fake', **kwargs)
+    service.pipeline = FakePipeline()
+    return service
+
+def test_repeated_sentences_are_translated_once():
+    service = make_service(cache_size=16, batch_size=8)
+    text = 'Water daily. Remove infected leaves.\n- Water daily.'
+
+    assert service.translate(text) == 'WATER DAILY. REMOVE INFECTED LEAVES.\n- WATER DAILY.'
+    assert service.pipeline.batches == [['Water daily.', 'Remove infected leaves.']]
+
+    assert service.translate('Remove infected leaves. Spray neem oil.') == 'REMOVE INFECTED LEAVES. SPRAY NEEM OIL.'
+    assert service.pipeline.batches[-1] == ['Spray neem oil.']
+    stats = service.get_stats()
+    assert (stats['cache_hits'], stats['cache_misses'], stats['batches']) == (1, 3, 2)
+
+def test_uncached_sentences_are_sent_in_batches():
+    service = make_service(cache_size=16, batch_size=2)
+    sentences = [f'Step {n} done.' for n in range(5)]
+
+    assert service.translate(' '.join(sentences)) == ' '.join(s.upper() for s in sentences)
+    assert service.pipeline.batches == [sentences[0:2], sentences[2:4], sentences[4:5]]
+
+def test_cache_evicts_least_recently_used_sentence():
+    service = make_service(cache_size=2, batch_size=8)
+    service.translate('One. Two.')
+    service.translate('One.')  # refresh "One." so "Two." is the oldest
+    service.translate('Three.')
+
+    assert list(service.cache) == ['One.', 'Three.']
+    service.translate('Two.')
+    assert service.pipeline.batches[-1] == ['Two.']
+
+def test_zero_cache_size_disables_caching():
+    service = make_service(cache_size=0, batch_size=8)
+    service.translate('Water daily.')
+    service.translate('Water daily.')
+
+    assert service.pipeline.batches == [['Water daily.'], ['Water daily.']]
+    assert service.get_stats()['cache_entries'] == 0
@@ -0,0 +1,256 @@
+"""
+Shared Keras -> TFLite conversion for the Krishi Sahayak converters.
+
+Modes:
+- float32: no quantization (the reference for scripts/quantization_report.py)
+- float16: float16 weights, the previous behaviour of every converter; runs as float32 on x86 CPUs
+- dynamic: int8 weights with float activations (dynamic-range quantization)
+- int8: full-integer post-training quantization. Activations are calibrated on a
+  representative dataset sampled from the training split, so every kernel runs in int8.
+  The input/output tensors stay float32 unless ``int8_io`` is set; ml_utils.invoke_tflite
+  quantizes inputs and dequantizes outputs for int8 I/O models.
+
+With ``builtins_only`` (implied by int8), Lambda layers are replaced by equivalent
+builtin layers, SELECT_TF_OPS is not enabled and the conversion fails if any Flex or
+custom op remains, so the model runs on the interpreter-only runtimes with XNNPACK.
+"""
+
+import os
+import random
+import logging
+from collections import Counter
+
+import numpy as np # type: ignore
+
+from ml_utils import preprocess_image
+
+logger = logging.getLogger(__name__)
+
+CONVERSION_MODES = ('float32', 'float16', 'dynamic', 'int8')
+DEFAULT_CONVERSION_MODE = 'float16'
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Training splits used by the training scripts (scripts/train_*.py and train_multitask_model.py)
+REPRESENTATIVE_DATA_DIRS = [os.path.join(MODULE_DIR, 'SplitData', 'train'), os.path.join(MODULE_DIR, 'Data')]
+REPRESENTATIVE_SAMPLES = 200
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+def find_class_images(data_dirs):
+    """{class directory: [image paths]} from the first of ``data_dirs`` that exists."""
+    for data_dir in data_dirs:
+        if not os.path.isdir(data_dir):
+            continue
+        class_images = {}
+        for root, _, files in os.walk(data_dir):
+            images = sorted(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+            if images:
+                class_images[os.path.relpath(root, data_dir)] = images
+        if class_images:
+            return class_images
+    return {}
+
+def sample_representative_images(data_dirs=None, num_samples=REPRESENTATIVE_SAMPLES, seed=0):
+    """Up to ``num_samples`` image paths, taken round-robin across classes so every class is calibrated."""
+    class_images = find_class_images(data_dirs or REPRESENTATIVE_DATA_DIRS)
+    rng = random.Random(seed)
+    for images in class_images.values():
+        rng.shuffle(images)
+
+    samples = []
+    queues = [list(images) for _, images in sorted(class_images.items())]
+    while len(samples) < num_samples and any(queues):
+        for images in queues:
+            if images and len(samples) < num_samples:
+                samples.append(images.pop())
+    return samples
+
+def representative_dataset(image_paths, input_size):
+    """Representative dataset callable for the TFLite converter.
+
+    Images go through the server's preprocess_image (RGB, resized to ``input_size``,
+    scaled to [0, 1]), so the calibrated ranges match what the model sees in production.
+    """
+    def generator():
+        for path in image_paths:
+            with open(path, 'rb') as f:
+                image_array = preprocess_image(f.read(), draft=False, size=input_size)
+            if image_array is not None:
+                yield [image_array.copy()]
+    return generator
+
+def get_keras_input_size(model):
+    """(width, height) of a Keras model's image input."""
+    _, height, width, _ = model.input_shape
+    return (int(width), int(height))
+
+# Functions a Lambda layer is matched against: y = scale * f(x) + offset
+LAMBDA_ACTIVATIONS = {
+    'linear': lambda x: x,
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    'tanh': np.tanh,
+    'relu': lambda x: np.maximum(x, 0.0),
+}
+
+def fit_lambda_replacement(layer):
+    """Builtin layers computing the same function as a Lambda layer, or None.
+
+    The Lambda is probed numerically and matched against ``scale * f(x) + offset`` for
+    each of LAMBDA_ACTIVATIONS, which covers the health-score heads (sigmoid * 100, t * 100).
+    """
+    import tensorflow as tf # type: ignore
+
+    feature_shape = tuple(layer.input.shape[1:])
+    if not all(feature_shape):
+        return None
+    x = np.linspace(-8.0, 8.0, 256 * int(np.prod(feature_shape)), dtype=np.float32).reshape((256,) + feature_shape)
+    try:
+        y = np.asarray(layer(tf.constant(x)), dtype=np.float64)
+    except Exception:
+        return None
+    if y.shape != x.shape:
+        return None
+
+    for activation, function in LAMBDA_ACTIVATIONS.items():
+        f = function(x.astype(np.float64)).ravel()
+        (scale, offset), *_ = np.linalg.lstsq(np.stack([f, np.ones_like(f)], axis=1), y.ravel(), rcond=None)
+        if np.allclose(scale * f + offset, y.ravel(), rtol=1e-4, atol=1e-4 * max(1.0, np.abs(y).max())):
+            layers = [] if activation == 'linear' else [tf.keras.layers.Activation(activation)]
+            layers.append(tf.keras.layers.Rescaling(float(scale), offset=float(offset)))
+            logger.info(f"Replacing Lambda layer '{layer.name}' with {activation} * {scale:g} + {offset:g}")
+            return tf.keras.Sequential(layers, name=layer.name)
+    return None
+
+def replace_lambda_layers(model):
+    """Copy of ``model`` with every Lambda layer replaced by builtin layers (weights are shared).
+
+    Raises ValueError for a Lambda that fit_lambda_replacement cannot express; rewrite
+    it with builtin layers in the model definition instead.
+    """
+    import tensorflow as tf # type: ignore
+
+    lambda_layers = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.Lambda)]
+    if not lambda_layers:
+        return model
+
+    replacements = {}
+    for layer in lambda_layers:
+        replacement = fit_lambda_replacement(layer)
+        if replacement is None:
+            raise ValueError(f"Lambda layer '{layer.name}' has no builtin equivalent; replace it in the model definition")
+        replacements[layer.name] = replacement
+    return tf.keras.models.clone_model(model, clone_function=lambda layer: replacements.get(layer.name, layer))
+
+def analyze_ops(tflite_model):
+    """Op histogram of a TFLite flatbuffer: {'ops': {name: count}, 'non_builtin': [Flex/custom op names]}."""
+    from tensorflow.lite.python import schema_py_generated as schema # type: ignore
+
+    builtin_names = {code: name for name, code in vars(schema.BuiltinOperator).items() if not name.startswith('_')}
+    model = schema.Model.GetRootAsModel(tflite_model, 0)
+    op_names = []
+    for index in range(model.OperatorCodesLength()):
+        operator_code = model.OperatorCodes(index)
+        code = max(operator_code.BuiltinCode(), operator_code.DeprecatedBuiltinCode())
+        if code == schema.BuiltinOperator.CUSTOM:
+            op_names.append(operator_code.CustomCode().decode())
+        else:
+            op_names.append(builtin_names.get(code, str(code)))
+
+    histogram = Counter()
+    for subgraph_index in range(model.SubgraphsLength()):
+        subgraph = model.Subgraphs(subgraph_index)
+        for op_index in range(subgraph.OperatorsLength()):
+            histogram[op_names[subgraph.Operators(op_index).OpcodeIndex()]] += 1
+    builtin = set(builtin_names.values())
+    return {
+        'ops': dict(histogram.most_common()),
+        'non_builtin': sorted(name for name in histogram if name not in builtin)
+    }
+
+def describe_ops(tflite_model):
+    """One-line op histogram for converter output, with Flex/custom ops flagged."""
+    analysis = analyze_ops(tflite_model)
+    summary = ", ".join(f"{name} x{count}" for name, count in analysis['ops'].items())
+    if analysis['non_builtin']:
+        summary += f" (non-builtin: {', '.join(analysis['non_builtin'])})"
+    return summary
+
+def convert_keras_model(model, mode=DEFAULT_CONVERSION_MODE, data_dirs=None, num_samples=REPRESENTATIVE_SAMPLES,
+                        int8_io=False, builtins_only=False):
+    """Convert a Keras model to a TFLite flatbuffer in one of CONVERSION_MODES.
+
+    ``int8`` mode raises ValueError if no training images are found in ``data_dirs``
+    (default REPRESENTATIVE_DATA_DIRS) and RuntimeError if an op has no int8 kernel.
+    ``builtins_only`` raises RuntimeError if the result still contains Flex or custom ops.
+    """
+    import tensorflow as tf # type: ignore
+
+    if mode not in CONVERSION_MODES:
+        raise ValueError(f"Unknown conversion mode '{mode}'; expected one of {CONVERSION_MODES}")
+
+    builtins_only = builtins_only or mode == 'int8'
+    if builtins_only:
+        model = replace_lambda_layers(model)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+    if mode == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif mode == 'int8':
+        image_paths = sample_representative_images(data_dirs, num_samples)
+        if not image_paths:
+            raise ValueError(f"No training images found in {data_dirs or REPRESENTATIVE_DATA_DIRS} for int8 calibration")
+        logger.info(f"Calibrating int8 quantization on {len(image_paths)} training images")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(image_paths, get_keras_input_size(model))
+        # Full integer: no float fallback kernels and no Flex ops
+        supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        if int8_io:
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+    if not builtins_only:
+        supported_ops.append(tf.lite.OpsSet.SELECT_TF_OPS)
+    converter.target_spec.supported_ops = supported_ops
+
+    try:
+        tflite_model = converter.convert()
+    except Exception as e:
+        if mode == 'int8':
+            raise RuntimeError(f"Full-integer conversion failed; the model has ops without int8 kernels: {e}") from e
+        if builtins_only:
+            raise RuntimeError(f"Builtins-only conversion failed; the model needs TensorFlow (Flex) ops: {e}") from e
+        raise
+
+    non_builtin = analyze_ops(tflite_model)['non_builtin']
+    if non_builtin and builtins_only:
+        raise RuntimeError(f"Converted model still contains non-builtin ops: {non_builtin}")
+    if non_builtin:
+        logger.warning(f"Converted model needs the full TensorFlow runtime for {non_builtin}; try builtins_only")
+    return tflite_model
+
+def add_conversion_arguments(parser):
+    """--mode/--representative-dir/--num-samples/--int8-io/--builtins-only for converter command lines."""
+    parser.add_argument('--mode', choices=CONVERSION_MODES, default=DEFAULT_CONVERSION_MODE,
+                        help=f'Quantization mode (default: {DEFAULT_CONVERSION_MODE})')
+    parser.add_argument('--representative-dir', action='append',
+                        help='Training split with one directory per class, for int8 calibration (repeatable; '
+                             'default: SplitData/train, then Data)')
+    parser.add_argument('--num-samples', type=int, default=REPRESENTATIVE_SAMPLES,
+                        help='Number of calibration images for int8 mode')
+    parser.add_argument('--int8-io', action='store_true',
+                        help='int8 mode: use int8 input/output tensors instead of float32')
+    parser.add_argument('--builtins-only', action='store_true',
+                        help='Replace Lambda layers, disable SELECT_TF_OPS and fail if any Flex op remains (implied by int8)')
+    return parser
+
+def conversion_options(args):
+    """convert_keras_model keyword arguments from the options parsed by add_conversion_arguments."""
+    return {
+        'mode': args.mode,
+        'data_dirs': args.representative_dir,
+        'num_samples': args.num_samples,
+        'int8_io': args.int8_io,
+        'builtins_only': args.builtins_only
+    }
@@ -0,0 +1,197 @@
+"""
+Request tracing and an on-demand sampling profiler for the Krishi Sahayak ML servers.
+
+A RequestTrace collects the wall time of the named stages of one request. It is only
+created for requests that carry the REQUEST_TRACE_HEADER, and is bound to the request
+thread, so span() costs a thread-local lookup when tracing is off. Stages
+are keyed by their nesting, e.g. 'preprocess.resize'. Stages that run on a batch
+worker thread (invoke, postprocess) are recorded into the traces of the batched
+requests explicitly, see main_production.run_prediction_batch.
+
+SamplingProfiler samples the Python stacks of every thread of the process at a fixed
+interval and aggregates identical stacks, to find where CPU time goes under real load.
+"""
+
+import os
+import sys
+import time
+import threading
+import logging
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+current = threading.local()
+
+class RequestTrace:
+    """Per-stage wall times of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.stack = []
+        self.attributes = {}  # e.g. the size of the batch the request ran in
+
+    def record(self, name, seconds):
+        """Add ``seconds`` to ``name``, nested under the spans currently open on this trace."""
+        key = '.'.join(self.stack + [name])
+        self.stages[key] = self.stages.get(key, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name):
+        """Record the duration of the ``with`` block as stage ``name``."""
+        start = time.perf_counter()
+        self.stack.append(name)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            self.record(name, time.perf_counter() - start)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def to_dict(self):
+        """{'total_ms': ..., 'stages_ms': {stage: ms}, **attributes}, stages in the order they finished."""
+        return {
+            'total_ms': round(self.elapsed() * 1000, 3),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            **self.attributes
+        }
+
+    def server_timing(self):
+        """Server-Timing header value, shown per request in browser developer tools."""
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.3f}")
+        return ', '.join(entries)
+
+def start_trace():
+    """Start tracing the request handled by this thread and return its trace."""
+    current.trace = RequestTrace()
+    return current.trace
+
+def end_trace():
+    current.trace = None
+
+def current_trace():
+    return getattr(current, 'trace', None)
+
+def span(name):
+    """RequestTrace.span on this thread's trace, or a no-op context when the request is not traced."""
+    trace = current_trace()
+    return trace.span(name) if trace is not None else nullcontext()
+
+# Leaf frames of threads that are blocked rather than running (thread pool and queue
+# workers, the request thread waiting for its batch, the gunicorn/werkzeug accept loops)
+IDLE_FRAMES = {
+    ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'), ('queue.py', 'get'), ('thread.py', '_worker'),
+    ('selectors.py', 'select'), ('socket.py', 'accept'), ('socket.py', 'readinto'),
+    ('socketserver.py', 'serve_forever'), ('_base.py', 'result'),
+}
+
+def thread_cpu_time(thread_id):
+    """CPU seconds used by a thread of this process, or None where the platform cannot tell."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError):
+        return None
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+class SamplingProfiler:
+    """Aggregated Python stacks of all threads, sampled every ``interval`` seconds.
+
+    A sample is idle when its thread is blocked in one of IDLE_FRAMES or used no CPU
+    since the previous sample, which also catches other blocking C calls. Only one profile runs at a time per process. Under gunicorn each worker is a
+    separate process, so a profile covers the worker that served the admin request.
+    """
+
+    def __init__(self, interval=0.005, max_depth=40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.lock = threading.Lock()
+
+    def stack_of(self, frame):
+        """(outermost, ..., innermost) frame labels, truncated to the ``max_depth`` innermost."""
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(frame_label(frame))
+            frame = frame.f_back
+        return tuple(reversed(labels))
+
+    def is_idle(self, frame, cpu_time, last_cpu_time):
+        if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+            return True
+        return cpu_time is not None and last_cpu_time is not None and cpu_time <= last_cpu_time
+
+    def profile(self, seconds, include_idle=False, top=25):
+        """Sample for ``seconds`` and return the hottest stacks and functions.
+
+        Raises RuntimeError if a profile is already running.
+        """
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            stacks = Counter()
+            samples = idle = 0
+            # The sampling thread's own frames and the caller's (waiting on join) are skipped
+            skip = {threading.get_ident()}
+            sampler = threading.Thread(target=self._sample, args=(seconds, stacks, skip), daemon=True,
+                                       name='sampling-profiler')
+            started = time.perf_counter()
+            sampler.start()
+            sampler.join()
+            duration = time.perf_counter() - started
+
+            functions_self = Counter()
+            functions_total = Counter()
+            filtered = Counter()
+            for (stack, is_idle), count in stacks.items():
+                samples += count
+                if is_idle:
+                    idle += count
+                    if not include_idle:
+                        continue
+                filtered[stack] += count
+                functions_self[stack[-1].rsplit(':', 1)[0]] += count
+                for function in {label.rsplit(':', 1)[0] for label in stack}:
+                    functions_total[function] += count
+            busy = sum(filtered.values())
+        finally:
+            self.lock.release()
+
+        logger.info(f"🔬 Profiled {duration:.1f}s: {samples} thread samples, {idle} idle")
+        return {
+            'duration_seconds': round(duration, 3),
+            'interval_ms': self.interval * 1000,
+            'samples': samples,
+            'idle_samples': idle,
+            'stacks': [
+                {'samples': count, 'share': round(count / busy, 4), 'stack': list(stack)}
+                for stack, count in filtered.most_common(top)
+            ],
+            'functions_self': [
+                {'function': function, 'samples': count, 'share': round(count / busy, 4)}
+                for function, count in functions_self.most_common(top)
+            ],
+            'functions_total': [
+                {'function': function, 'samples': count, 'share': round(count / busy, 4)}
+                for function, count in functions_total.most_common(top)
+            ]
+        }
+
+    def _sample(self, seconds, stacks, skip):
+        skip = skip | {threading.get_ident()}
+        cpu_times = {thread_id: thread_cpu_time(thread_id) for thread_id in sys._current_frames()}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            time.sleep(self.interval)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in skip:
+                    continue
+                cpu_time = thread_cpu_time(thread_id)
+                stacks[(self.stack_of(frame), self.is_idle(frame, cpu_time, cpu_times.get(thread_id)))] += 1
+                cpu_times[thread_id] = cpu_time
@@ -6,6 +6,7 @@ This script trains a multitask model with classification and regression heads
 
 import os
 import sys
+import argparse
 import numpy as np
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau
@@ -17,8 +18,9 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'model'))
 from multitask_model import build_multitask_model
 from utils.dataloader import get_generators
 from config import IMAGE_SIZE
+from tflite_conversion import DEFAULT_CONVERSION_MODE, convert_keras_model, add_conversion_arguments, conversion_options, describe_ops
 
-def train_multitask_model():
+def train_multitask_model(**conversion_kwargs):
     """Train the multitask model and save it"""
     print("🚀 Starting multitask model training...")
     
@@ -96,11 +98,11 @@ def train_multitask_model():
     
     # Convert to TFLite
     print("🔄 Converting to TFLite...")
-    convert_to_tflite()
+    convert_to_tflite(**conversion_kwargs)
     
     return model
 
-def convert_to_tflite():
+def convert_to_tflite(**conversion_kwargs):
     """Convert the trained multitask model to TFLite format"""
     try:
         # Load the trained model
@@ -112,20 +114,9 @@ def convert_to_tflite():
         print(f"📥 Loading model from {model_path}...")
         model = tf.keras.models.load_model(model_path)
         
-        # Create TFLite converter
-        converter = tf.lite.TFLiteConverter.from_keras_model(model)
-        
-        # Add optimizations for mobile
-        converter.optimizations = [tf.lite.Optimize.DEFAULT]
-        converter.target_spec.supported_types = [tf.float16]
-        converter.target_spec.supported_ops = [
-            tf.lite.OpsSet.TFLITE_BUILTINS,
-            tf.lite.OpsSet.SELECT_TF_OPS
-        ]
-        
         # Convert
-        print("🔄 Converting to TFLite...")
-        tflite_model = converter.convert()
+        print(f"🔄 Converting to TFLite ({conversion_kwargs.get('mode', DEFAULT_CONVERSION_MODE)})...")
+        tflite_model = convert_keras_model(model, **conversion_kwargs)
         
         # Save TFLite model
         tflite_path = 'saved_models/multitask_model.tflite'
@@ -137,6 +128,7 @@ def convert_to_tflite():
         print(f"✅ TFLite conversion successful!")
         print(f"📁 TFLite model saved to: {tflite_path}")
         print(f"📊 Size: {file_size:.2f} MB")
+        print(f"🧮 Ops: {describe_ops(tflite_model)}")
         
         return True
         
@@ -145,6 +137,13 @@ def convert_to_tflite():
         return False
 
 if __name__ == "__main__":
+    parser = add_conversion_arguments(argparse.ArgumentParser(description=__doc__))
+    parser.add_argument('--convert-only', action='store_true', help='Only convert saved_models/multitask_model.h5 to TFLite')
+    args = parser.parse_args()
+
+    if args.convert_only:
+        sys.exit(0 if convert_to_tflite(**conversion_options(args)) else 1)
+
     print("🌾 Krishi Sahayak Multitask Model Training")
     print("=" * 50)
     
@@ -155,7 +154,7 @@ if __name__ == "__main__":
         sys.exit(1)
     
     try:
-        model = train_multitask_model()
+        model = train_multitask_model(**conversion_options(args))
         print("\n🎉 Multitask model training and conversion completed successfully!")
         print("You can now use the model in your server and Flutter app.")
     except Exception as e:
@@ -0,0 +1,128 @@
+"""
+Translation service for Krishi Sahayak.
+
+Wraps the Helsinki-NLP opus-mt pipeline used by main.py. Text is split into sentences,
+only sentences not already in the LRU cache are translated, and those are sent to the
+model in batches. Sentence-sized inputs also stay under the model's maximum length,
+which a multi-paragraph answer translated in one call does not. The model is loaded
+lazily on first use, or ahead of time by a background warm-up thread.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from config import TRANSLATION_MODEL, TRANSLATION_CACHE_SIZE, TRANSLATION_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Sentence boundary: ., ! or ? (including the Devanagari danda) followed by whitespace,
+# but not after a list number such as "1."
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?।])(?<!\d\.)\s+')
+# Bullet or numbered-list prefix kept as-is in front of the translated line
+LIST_PREFIX = re.compile(r'^(\s*(?:(?:[-*•]|\d+[.)])\s+)?)')
+
+class TranslationService:
+    """Sentence-level, batched and cached translation with lazy model loading"""
+
+    def __init__(self, model_name=TRANSLATION_MODEL, cache_size=TRANSLATION_CACHE_SIZE, batch_size=TRANSLATION_BATCH_SIZE):
+        self.model_name = model_name
+        self.cache_size = max(0, cache_size)
+        self.batch_size = max(1, batch_size)
+        self.pipeline = None
+        self.load_lock = threading.Lock()
+        self.load_seconds = None
+        self.cache = OrderedDict()  # sentence -> translation
+        self.cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batch_latencies = deque(maxlen=200)  # seconds, most recent batches
+
+    def start_warm_up(self):
+        """Load the model on a background thread so the first request does not pay for it"""
+        threading.Thread(target=self.get_pipeline, name='translation-warm-up', daemon=True).start()
+
+    def get_pipeline(self):
+        if self.pipeline is None:
+            with self.load_lock:
+                if self.pipeline is None:
+                    start = time.perf_counter()
+                    from transformers import pipeline  # heavy import, only when translation is needed
+                    self.pipeline = pipeline("translation", model=self.model_name)
+                    self.load_seconds = time.perf_counter() - start
+                    logger.info(f"Translation model {self.model_name} loaded in {self.load_seconds:.1f}s")
+        return self.pipeline
+
+    @staticmethod
+    def split_sentences(line):
+        return [sentence for sentence in SENTENCE_BOUNDARY.split(line.strip()) if sentence]
+
+    def translate(self, text):
+        """Translate text sentence by sentence, preserving line breaks and list markers"""
+        if not text or not text.strip():
+            return text
+
+        # Break the text into lines -> (prefix, sentences) and collect the sentences to translate
+        lines = []
+        for line in text.split('\n'):
+            prefix = LIST_PREFIX.match(line).group(1)
+            lines.append((prefix, self.split_sentences(line[len(prefix):])))
+
+        translations = {}
+        pending = []
+        with self.cache_lock:
+            for _, sentences in lines:
+                for sentence in sentences:
+                    if sentence in translations or sentence in pending:
+                        continue
+                    if sentence in self.cache:
+                        self.cache.move_to_end(sentence)
+                        translations[sentence] = self.cache[sentence]
+                        self.hits += 1
+                    else:
+                        pending.append(sentence)
+                        self.misses += 1
+
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            translations.update(zip(batch, self._translate_batch(batch)))
+
+        return '\n'.join(prefix + ' '.join(translations[s] for s in sentences) for prefix, sentences in lines)
+
+    def _translate_batch(self, sentences):
+        pipe = self.get_pipeline()
+        start = time.perf_counter()
+        outputs = pipe(sentences, batch_size=len(sentences), truncation=True)
+        elapsed = time.perf_counter() - start
+        results = [output['translation_text'] for output in outputs]
+
+        with self.cache_lock:
+            self.batches += 1
+            self.batch_latencies.append(elapsed)
+            if self.cache_size:
+                for sentence, translation in zip(sentences, results):
+                    self.cache[sentence] = translation
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        logger.info(f"Translated batch of {len(sentences)} sentences in {elapsed * 1000:.0f}ms")
+        return results
+
+    def get_stats(self):
+        with self.cache_lock:
+            latencies = sorted(self.batch_latencies)
+            lookups = self.hits + self.misses
+            return {
+                'model': self.model_name,
+                'loaded': self.pipeline is not None,
+                'load_seconds': self.load_seconds,
+                'cache_entries': len(self.cache),
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'cache_hit_rate': self.hits / lookups if lookups else 0.0,
+                'batches': self.batches,
+                'batch_latency_ms_avg': 1000 * sum(latencies) / len(latencies) if latencies else None,
+                'batch_latency_ms_p95': 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else None
+            }
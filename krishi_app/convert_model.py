@@ -7,8 +7,13 @@ This script converts the Keras model to TFLite format
 import tensorflow as tf
 import os
 import sys
+import argparse
 
-def convert_h5_to_tflite():
+# Shared conversion modes (float16, dynamic, full-integer int8) live next to the server
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'krishi-model'))
+from tflite_conversion import DEFAULT_CONVERSION_MODE, convert_keras_model, add_conversion_arguments, conversion_options, describe_ops
+
+def convert_h5_to_tflite(**conversion_kwargs):
     print("🔄 Converting best_model.h5 to TFLite...")
     
     # Paths
@@ -29,24 +34,10 @@ def convert_h5_to_tflite():
         print(f"📊 Model summary:")
         model.summary()
         
-        # Create TFLite converter
-        print("🔄 Creating TFLite converter...")
-        converter = tf.lite.TFLiteConverter.from_keras_model(model)
-        
-        # Optional: Add optimizations for mobile
-        print("⚡ Adding mobile optimizations...")
-        converter.optimizations = [tf.lite.Optimize.DEFAULT]
-        
-        # Optional: Set target specs for mobile
-        converter.target_spec.supported_types = [tf.float16]
-        converter.target_spec.supported_ops = [
-            tf.lite.OpsSet.TFLITE_BUILTINS,
-            tf.lite.OpsSet.SELECT_TF_OPS
-        ]
-        
         # Convert the model
-        print("🔄 Converting to TFLite...")
-        tflite_model = converter.convert()
+        mode = conversion_kwargs.get('mode', DEFAULT_CONVERSION_MODE)
+        print(f"🔄 Converting to TFLite ({mode})...")
+        tflite_model = convert_keras_model(model, **conversion_kwargs)
         
         # Save the TFLite model
         print(f"💾 Saving TFLite model to {tflite_output_path}...")
@@ -60,6 +51,7 @@ def convert_h5_to_tflite():
         print(f"✅ Conversion successful!")
         print(f"📁 Output: {tflite_output_path}")
         print(f"📊 Size: {file_size:.2f} MB")
+        print(f"🧮 Ops: {describe_ops(tflite_model)}")
         
         return True
         
@@ -68,7 +60,8 @@ def convert_h5_to_tflite():
         return False
 
 if __name__ == "__main__":
-    success = convert_h5_to_tflite()
+    args = add_conversion_arguments(argparse.ArgumentParser(description=__doc__)).parse_args()
+    success = convert_h5_to_tflite(**conversion_options(args))
     if success:
         print("\n🎉 Model conversion completed successfully!")
         print("You can now use the TFLite model in your Flutter app.")
@@ -7,8 +7,13 @@ This script converts the multitask Keras model to TFLite format
 import tensorflow as tf
 import os
 import sys
+import argparse
 
-def convert_multitask_to_tflite():
+# Shared conversion modes (float16, dynamic, full-integer int8) live next to the server
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'krishi-model'))
+from tflite_conversion import DEFAULT_CONVERSION_MODE, convert_keras_model, add_conversion_arguments, conversion_options, describe_ops
+
+def convert_multitask_to_tflite(**conversion_kwargs):
     print("🔄 Converting multitask model to TFLite...")
     
     # Paths
@@ -37,22 +42,10 @@ def convert_multitask_to_tflite():
         
         print(f"✅ Multitask model confirmed: {model.output_names}")
         
-        # Create TFLite converter
-        print("🔄 Creating TFLite converter...")
-        converter = tf.lite.TFLiteConverter.from_keras_model(model)
-        
-        # Add optimizations for mobile
-        print("⚡ Adding mobile optimizations...")
-        converter.optimizations = [tf.lite.Optimize.DEFAULT]
-        converter.target_spec.supported_types = [tf.float16]
-        converter.target_spec.supported_ops = [
-            tf.lite.OpsSet.TFLITE_BUILTINS,
-            tf.lite.OpsSet.SELECT_TF_OPS
-        ]
-        
         # Convert the model
-        print("🔄 Converting to TFLite...")
-        tflite_model = converter.convert()
+        mode = conversion_kwargs.get('mode', DEFAULT_CONVERSION_MODE)
+        print(f"🔄 Converting to TFLite ({mode})...")
+        tflite_model = convert_keras_model(model, **conversion_kwargs)
         
         # Save the TFLite model
         print(f"💾 Saving TFLite model to {tflite_output_path}...")
@@ -66,6 +59,7 @@ def convert_multitask_to_tflite():
         print(f"✅ Conversion successful!")
         print(f"📁 Output: {tflite_output_path}")
         print(f"📊 Size: {file_size:.2f} MB")
+        print(f"🧮 Ops: {describe_ops(tflite_model)}")
         
         # Test the converted model
         print("🧪 Testing converted model...")
@@ -95,7 +89,7 @@ def test_tflite_model(tflite_path):
         
         # Test with dummy input
         input_shape = input_details[0]['shape']
-        dummy_input = tf.random.normal(input_shape, dtype=tf.float32)
+        dummy_input = tf.cast(tf.random.uniform(input_shape), input_details[0]['dtype'])  # int8 for --int8-io models
         
         interpreter.set_tensor(input_details[0]['index'], dummy_input)
         interpreter.invoke()
@@ -114,7 +108,8 @@ def test_tflite_model(tflite_path):
         print(f"❌ Error testing TFLite model: {e}")
 
 if __name__ == "__main__":
-    success = convert_multitask_to_tflite()
+    args = add_conversion_arguments(argparse.ArgumentParser(description=__doc__)).parse_args()
+    success = convert_multitask_to_tflite(**conversion_options(args))
     if success:
         print("\n🎉 Multitask model conversion completed successfully!")
         print("You can now use the TFLite model in your Flutter app.")
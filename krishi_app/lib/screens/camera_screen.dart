@@ -1,5 +1,6 @@
 import 'package:flutter/material.dart';
 import 'package:image_picker/image_picker.dart';
+import '../services/background_sync_service.dart';
 import '../services/ml_service.dart';
 import '../widgets/crop_analysis_result.dart';
 
@@ -90,6 +91,11 @@ class _CameraScreenState extends State<CameraScreen> {
         '✅ [CameraScreen] ML analysis completed in ${mlAnalysisStart.elapsedMilliseconds}ms',
       );
 
+      // Analysed on the device: background sync re-analyses it on the server
+      if (result['analysis_mode'] != 'online') {
+        await BackgroundSyncService().queueImageForAnalysis(imageFile);
+      }
+
       setState(() {
         _analysisResult = result;
         _isAnalyzing = false;
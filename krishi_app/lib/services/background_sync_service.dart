@@ -1,6 +1,8 @@
 import 'dart:async';
 import 'package:flutter/material.dart';
+import 'package:image_picker/image_picker.dart';
 import 'connectivity_service.dart';
+import 'ml_service.dart';
 import 'preferences_service.dart';
 
 class BackgroundSyncService {
@@ -50,6 +52,9 @@ class BackgroundSyncService {
       // Sync user preferences
       await _syncUserPreferences();
 
+      // Re-analyse photos that were analysed offline
+      await _syncQueuedAnalyses();
+
       debugPrint('Background sync completed successfully');
     } catch (e) {
       debugPrint('Background sync failed: $e');
@@ -98,6 +103,50 @@ class BackgroundSyncService {
     }
   }
 
+  /// Queues a photo analysed with the local model so the next sync
+  /// re-analyses it with the server model.
+  Future<void> queueImageForAnalysis(XFile imageFile) async {
+    final queued = PreferencesService().getQueuedAnalysisImages();
+    if (!queued.contains(imageFile.path)) {
+      await PreferencesService().setQueuedAnalysisImages([
+        ...queued,
+        imageFile.path,
+      ]);
+    }
+  }
+
+  Future<void> _syncQueuedAnalyses() async {
+    final queued = PreferencesService().getQueuedAnalysisImages();
+    if (queued.isEmpty) return;
+    debugPrint('Syncing ${queued.length} queued analyses...');
+
+    final remaining = <String>[];
+    for (final path in queued) {
+      final imageFile = XFile(path);
+      try {
+        await imageFile.length();
+      } catch (e) {
+        debugPrint('Dropping queued image $path: $e');
+        continue;
+      }
+      try {
+        final result = await analyzeQueuedImage(imageFile);
+        // Still analysed on the device (server unreachable or busy): retry next sync
+        if (result['analysis_mode'] != 'online') remaining.add(path);
+      } catch (e) {
+        debugPrint('Error analyzing queued image $path: $e');
+        remaining.add(path);
+      }
+    }
+    await PreferencesService().setQueuedAnalysisImages(remaining);
+  }
+
+  /// Analyzes an image queued while offline. Sent in the server's background
+  /// lane so bulk sync does not slow down analyses a farmer is waiting for.
+  Future<Map<String, dynamic>> analyzeQueuedImage(XFile imageFile) async {
+    return MLService().analyzeCropHealth(imageFile, background: true);
+  }
+
   Future<void> forceSync() async {
     await _performSync();
   }
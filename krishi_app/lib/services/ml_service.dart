@@ -53,7 +53,12 @@ class MLService {
     debugPrint('✅ [MLService] ML service initialization completed');
   }
 
-  Future<Map<String, dynamic>> analyzeCropHealth(XFile imageFile) async {
+  /// Set [background] for uploads nobody is waiting on (e.g. background sync):
+  /// the server queues them behind interactive analyses.
+  Future<Map<String, dynamic>> analyzeCropHealth(
+    XFile imageFile, {
+    bool background = false,
+  }) async {
     final stopwatch = Stopwatch()..start();
     debugPrint('🚀 [MLService] Starting crop health analysis...');
 
@@ -75,7 +80,10 @@ class MLService {
         if (serverHealthy) {
           // Use server model for best accuracy
           debugPrint('🌐 [MLService] Using server ML model (online mode)...');
-          final result = await _analyzeWithServer(imageFile);
+          final result = await _analyzeWithServer(
+            imageFile,
+            background: background,
+          );
           result['model_type'] = 'server';
           result['processing_time'] = '${stopwatch.elapsedMilliseconds}ms';
           result['analysis_mode'] = 'online';
@@ -196,7 +204,10 @@ class MLService {
     }
   }
 
-  Future<Map<String, dynamic>> _analyzeWithServer(XFile imageFile) async {
+  Future<Map<String, dynamic>> _analyzeWithServer(
+    XFile imageFile, {
+    bool background = false,
+  }) async {
     debugPrint('🌐 [MLService] Starting server analysis...');
 
     // Track image compression
@@ -239,7 +250,11 @@ class MLService {
     // Prepare request
     final response = await _client.post(
       Uri.parse('$baseUrl/analyze_crop'),
-      headers: {'Content-Type': 'application/json'},
+      headers: {
+        'Content-Type': 'application/json',
+        // Priority lane on the server; interactive is the default
+        if (background) 'X-Priority': 'background',
+      },
       body: jsonEncode({'image': imageData}),
     );
 
@@ -119,6 +119,15 @@ class PreferencesService {
     return _prefs?.getString('offline_map_status_$mapName') ?? 'idle';
   }
 
+  // Photos analysed on the device, re-analysed on the server by background sync
+  Future<void> setQueuedAnalysisImages(List<String> paths) async {
+    await _prefs?.setStringList('queued_analysis_images', paths);
+  }
+
+  List<String> getQueuedAnalysisImages() {
+    return _prefs?.getStringList('queued_analysis_images') ?? [];
+  }
+
   // Clear all preferences
   Future<void> clearAll() async {
     await _prefs?.clear();